@@ -23,3 +23,7 @@
 __author__ = """Stefan Braun"""
 __email__ = 'sb@stbraun.com'
 __version__ = '1.2.3'
+
+from .api import iter_matches  # noqa: E402,F401
+from .matches import Match  # noqa: E402,F401
+from .aio import aiter_matches  # noqa: E402,F401
@@ -0,0 +1,190 @@
+# coding=utf-8
+"""asyncio interface."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import asyncio
+import ctypes
+import os
+import struct
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+from .api import POLL_INTERVAL, _Source
+from .matches import Match
+from .reader import MAX_LINE_LENGTH
+from .matchers import compile_predicate
+
+CHUNK_SIZE = 64 * 1024  # bytes read from a logfile at once.
+
+LINES_PER_TURN = 1000  # lines read from a logfile before the next one's turn.
+
+IN_MODIFY = 0x00000002
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class _Tail(_Source):
+    """Read complete lines appended to a logfile without blocking the loop."""
+
+    def __init__(self, logfile: Path, *args, history: bool = True, **kwargs):
+        """Open logfile. Other parameters see api._Source."""
+        super().__init__(logfile, *args, **kwargs)
+        self.f_in = logfile.open("rb", buffering=0)
+        self.open(self.f_in, 0 if history else None, CHUNK_SIZE)
+
+    def close(self):
+        """Close the logfile."""
+        self.f_in.close()
+
+
+class _Notifier:
+    """Wait for changes of logfiles.
+
+    Uses inotify if available, otherwise reports all logfiles as changed
+    after the poll interval.
+    """
+
+    def __init__(self, tails: List[_Tail], poll_interval: float):
+        self.tails = tails
+        self.poll_interval = poll_interval
+        self.changed: Set[int] = set()
+        self.event = asyncio.Event()
+        self.watches: Dict[int, int] = {}
+        self.fd = self._init_inotify()
+
+    def _init_inotify(self) -> Optional[int]:
+        """Watch all logfiles with inotify. None if not available."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (AttributeError, OSError):
+            return None
+        if fd < 0:
+            return None
+        for num, tail in enumerate(self.tails):
+            wd = libc.inotify_add_watch(fd, os.fsencode(tail.logfile), IN_MODIFY)
+            if wd < 0:
+                os.close(fd)
+                return None
+            self.watches[wd] = num
+        asyncio.get_running_loop().add_reader(fd, self._on_events)
+        logger.trace("Watching {} logfiles with inotify", len(self.tails))
+        return fd
+
+    def _on_events(self):
+        """Collect modified logfiles from inotify events."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos < len(data):
+            wd, _, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size + length
+            if wd in self.watches:
+                self.changed.add(self.watches[wd])
+        self.event.set()
+
+    async def wait(self) -> List[_Tail]:
+        """Wait for modified logfiles."""
+        if self.fd is None:
+            await asyncio.sleep(self.poll_interval)
+            return self.tails
+        try:
+            await asyncio.wait_for(self.event.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+        changed, self.changed = self.changed, set()
+        return [self.tails[num] for num in sorted(changed)]
+
+    def close(self):
+        """Stop watching."""
+        if self.fd is not None:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+
+
+# pylint: disable=too-many-arguments
+async def aiter_matches(
+    files: List[Path],
+    triggers: List[str] = (),
+    excludes: List[str] = (),
+    expressions: List[str] = (),
+    json_filters: Dict[Path, Callable[[str], bool]] = None,
+    filtered: bool = True,
+    history: bool = True,
+    follow: bool = True,
+    encoding: str = "utf-8",
+    poll_interval: float = POLL_INTERVAL,
+    max_line_length: int = MAX_LINE_LENGTH,
+) -> AsyncIterator[Match]:
+    """Yield lines of logfiles matching the triggers inside an event loop.
+
+    All logfiles are served by the running event loop, without threads.
+    On Linux changes are detected with inotify, elsewhere the logfiles are
+    polled every poll_interval seconds. Lines are read in batches and long
+    lines are truncated, so a big logfile neither blocks the loop nor fills
+    the memory. Cancel the consuming task or close the
+    iterator to stop and close the logfiles.
+
+    >>> async for match in aiter_matches(["app.log"], ["ERROR"]):  # doctest: +SKIP
+    ...     print(match.logfile, match.offset, match.line)
+
+    Parameters see iter_matches(). follow defaults to True here.
+
+    :return: async iterator over matching lines with logfile and byte offset.
+    :rtype: AsyncIterator[Match]
+    :raise ValueError: if an expression is malformed.
+    """
+    predicate = compile_predicate(triggers, excludes, expressions)
+    json_filters = {Path(log): flt for log, flt in (json_filters or {}).items()}
+    tails = []
+    notifier = None
+    try:
+        for logfile in map(Path, files):
+            tails.append(_Tail(logfile, predicate, json_filters.get(logfile), filtered,
+                               encoding, max_line_length, history=history))
+        notifier = _Notifier(tails, poll_interval) if follow else None
+        ready = list(tails)
+        while True:
+            while ready:
+                busy = []
+                for tail in ready:
+                    matches, more = tail.read(not follow, LINES_PER_TURN)
+                    for match in matches:
+                        yield match
+                    if more:
+                        busy.append(tail)
+                ready = busy
+                await asyncio.sleep(0)
+            if not follow:
+                return
+            ready = await notifier.wait()
+    finally:
+        if notifier is not None:
+            notifier.close()
+        for tail in tails:
+            tail.close()
@@ -0,0 +1,188 @@
+# coding=utf-8
+"""Library interface."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Tuple
+
+from .matchers import compile_predicate
+from .matches import Match
+from .reader import BATCH_SIZE, CHUNK_SIZE, MAX_LINE_LENGTH, LineReader, LongLine
+
+POLL_INTERVAL = 1.0  # seconds to wait for new data when following.
+
+
+def _acceptor(
+    predicate: Callable[[str], bool],
+    json_filter: Callable[[str], bool] = None,
+    filtered: bool = True,
+) -> Callable[[str], bool]:
+    """Provide the predicate of a logfile. A JSON filter replaces the triggers."""
+    if not filtered:
+        return lambda line: True
+    return predicate if json_filter is None else json_filter
+
+
+class _Source:
+    """A logfile read in batches of lines, with the predicate of its lines.
+
+    Lines longer than max_line_length bytes are truncated like by the
+    processors, so memory stays bounded.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, logfile: Path, predicate: Callable[[str], bool],
+                 json_filter: Callable[[str], bool] = None, filtered: bool = True,
+                 encoding: str = "utf-8", max_line_length: int = MAX_LINE_LENGTH):
+        self.logfile = logfile
+        self.predicate = predicate
+        self.accept = _acceptor(predicate, json_filter, filtered)
+        # Truncated JSON cannot be parsed and never matches a JSON filter.
+        self.accept_long = not filtered or json_filter is None
+        self.filtered = filtered
+        self.encoding = encoding
+        self.max_line_length = max_line_length
+        self.reader = None
+
+    def open(self, f_in: BinaryIO, start: int = None, chunk_size: int = CHUNK_SIZE):
+        """Read f_in from start, from its end if start is None."""
+        self.reader = LineReader(f_in, self.encoding, chunk_size, self.max_line_length)
+        if start is None:
+            self.reader.skip_to_end()
+        else:
+            self.reader.seek(start)
+
+    def read(self, final: bool = False,
+             max_lines: int = BATCH_SIZE) -> Tuple[List[Match], bool]:
+        """Read a batch of lines and return its matches.
+
+        :param final: return an incomplete last line at eof.
+        :type final: bool
+        :param max_lines: maximum number of lines read.
+        :type max_lines: int
+        :return: matches and whether more lines are available.
+        :rtype: Tuple[List[Match], bool]
+        """
+        reader = self.reader
+        lines = reader.read_lines(max_lines, self.predicate)
+        more = len(lines) == max_lines
+        if final and not more:
+            lines.extend(reader.flush())
+        matches = []
+        for line, offset in zip(lines, reader.offsets):
+            if isinstance(line, LongLine):
+                matched = self.accept_long and (line.matched or not self.filtered)
+            else:
+                line = line.strip()
+                matched = self.accept(line)
+            if matched:
+                matches.append(Match(line, self.logfile, offset))
+        return matches, more
+
+    def matches(self, final: bool = False) -> Iterator[Match]:
+        """Yield the matching lines up to the current end of the logfile.
+
+        An incomplete last line is held back unless final.
+        """
+        more = True
+        while more:
+            matches, more = self.read(final)
+            yield from matches
+
+
+# pylint: disable=too-many-arguments
+def iter_matches(
+    files: List[Path],
+    triggers: List[str] = (),
+    excludes: List[str] = (),
+    expressions: List[str] = (),
+    json_filters: Dict[Path, Callable[[str], bool]] = None,
+    filtered: bool = True,
+    history: bool = True,
+    follow: bool = False,
+    encoding: str = "utf-8",
+    poll_interval: float = POLL_INTERVAL,
+    max_line_length: int = MAX_LINE_LENGTH,
+) -> Iterator[Match]:
+    """Yield lines of logfiles matching the triggers.
+
+    The logfiles are read lazily in the calling thread, in batches of
+    lines. They are opened by the first next() and closed when the
+    iterator is closed or exhausted.
+
+    >>> for match in iter_matches(["app.log"], ["ERROR"]):  # doctest: +SKIP
+    ...     print(match.logfile, match.offset, match.line)
+
+    :param files: logfiles to read.
+    :type files: List[Path]
+    :param triggers: search the logfiles for these triggers.
+    :type triggers: List[str]
+    :param excludes: drop lines containing one of these strings.
+    :type excludes: List[str]
+    :param expressions: trigger expressions combining terms with AND, OR, NOT.
+    :type expressions: List[str]
+    :param json_filters: field filters for logfiles written as JSON lines.
+    :type json_filters: Dict[Path, Callable[[str], bool]]
+    :param filtered: False to yield all lines.
+    :type filtered: bool
+    :param history: read lines written before the call.
+    :type history: bool
+    :param follow: keep waiting for new lines at the end of the logfiles.
+    :type follow: bool
+    :param encoding: encoding of the logfiles.
+    :type encoding: str
+    :param poll_interval: seconds to wait for new lines when following.
+    :type poll_interval: float
+    :param max_line_length: truncate lines longer than this many bytes.
+    :type max_line_length: int
+    :return: iterator over matching lines with logfile and byte offset.
+    :rtype: Iterator[Match]
+    :raise ValueError: if an expression is malformed.
+    :raise OSError: if a logfile cannot be accessed.
+    """
+    predicate = compile_predicate(triggers, excludes, expressions)
+    json_filters = {Path(log): flt for log, flt in (json_filters or {}).items()}
+    sources = []
+    for logfile in map(Path, files):
+        # The end is taken now, lines written before the first next() count.
+        size = os.stat(logfile).st_size
+        source = _Source(logfile, predicate, json_filters.get(logfile), filtered,
+                         encoding, max_line_length)
+        sources.append((source, 0 if history else size))
+    return _iterate(sources, follow, poll_interval)
+
+
+def _iterate(sources: List[Tuple[_Source, int]], follow: bool,
+             poll_interval: float) -> Iterator[Match]:
+    """Yield matches of all sources. Close the logfiles when done."""
+    with ExitStack() as stack:
+        for source, start in sources:
+            source.open(stack.enter_context(source.logfile.open("rb")), start)
+        while True:
+            for source, _ in sources:
+                yield from source.matches(final=not follow)
+            if not follow:
+                return
+            time.sleep(poll_interval)
@@ -0,0 +1,223 @@
+# coding=utf-8
+"""Block index over logfiles for fast history searches."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import sqlite3
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+BLOCK_SIZE = 64 * 1024  # bytes of a logfile per index entry.
+
+BLOOM_BYTES = 2048  # size of the trigram filter per block.
+
+HEAD_SIZE = 256  # bytes compared to detect rotated or replaced logfiles.
+
+# Multipliers of the hash functions of the trigram filter.
+HASHES = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D)
+
+_SHIFT = 32 - (BLOOM_BYTES * 8 - 1).bit_length()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    head BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    file INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    bloom BLOB NOT NULL,
+    PRIMARY KEY (file, start)
+) WITHOUT ROWID;
+"""
+
+
+def trigrams(data: bytes) -> Set[bytes]:
+    """Trigrams of the whitespace separated words in data.
+
+    Trigrams spanning whitespace are left out. Each distinct word is only
+    split once, which keeps indexing fast for the repetitive text of logs.
+    """
+    grams = set()
+    for word in set(data.split()):
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def _bloom(grams: Iterable[bytes]) -> int:
+    """Bloom filter of trigrams as integer bit set."""
+    bits = 0
+    for gram in grams:
+        value = int.from_bytes(gram, "little")
+        for factor in HASHES:
+            bits |= 1 << (((value * factor) & 0xFFFFFFFF) >> _SHIFT)
+    return bits
+
+
+class BlockIndex:
+    """Persistent index of the blocks of logfiles which may contain a string.
+
+    Logfiles are split at line ends into blocks of about BLOCK_SIZE bytes.
+    For each block the trigrams of its words are recorded in a Bloom
+    filter. A block can only contain a trigger if it contains all trigrams
+    of the trigger's words, so blocks lacking one of them are skipped.
+
+    update() indexes only data appended since the last update. Logfiles
+    which were truncated or replaced, e.g. by rotation, are indexed anew.
+    """
+
+    def __init__(self, path: Path):
+        """Initialize instance.
+
+        :param path: the index database. It is created if it does not exist.
+        :type path: Path
+        """
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.path))
+        connection.executescript(SCHEMA)
+        return connection
+
+    @staticmethod
+    def _key(logfile: Path) -> str:
+        return str(Path(logfile).resolve())
+
+    def update(self, logfile: Path) -> int:
+        """Index the data appended to logfile since the last update.
+
+        An incomplete last line is left for the next update.
+
+        :param logfile: the logfile.
+        :type logfile: Path
+        :return: number of bytes indexed.
+        :rtype: int
+        """
+        key = self._key(logfile)
+        with self._connect() as connection, open(str(logfile), "rb") as f_in:
+            head = f_in.read(HEAD_SIZE)
+            row = connection.execute(
+                "SELECT id, size, head FROM files WHERE path = ?", (key,)
+            ).fetchone()
+            if row is not None and (
+                head[:len(row[2])] != row[2] or f_in.seek(0, 2) < row[1]
+            ):
+                logger.info("{} was replaced, rebuilding its index", logfile)
+                connection.execute("DELETE FROM blocks WHERE file = ?", (row[0],))
+                connection.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                row = None
+            if row is None:
+                file_id = connection.execute(
+                    "INSERT INTO files (path, size, head) VALUES (?, 0, ?)", (key, head)
+                ).lastrowid
+                start = 0
+            else:
+                file_id, start = row[0], row[1]
+            indexed = start
+            f_in.seek(start)
+            while True:
+                end, bloom = self._index_block(f_in, start)
+                if end == start:
+                    break
+                connection.execute(
+                    "INSERT INTO blocks (file, start, end, bloom) VALUES (?, ?, ?, ?)",
+                    (file_id, start, end, bloom.to_bytes(BLOOM_BYTES, "little")),
+                )
+                start = end
+            connection.execute(
+                "UPDATE files SET size = ?, head = ? WHERE id = ?", (start, head, file_id)
+            )
+        return start - indexed
+
+    @staticmethod
+    def _index_block(f_in, start: int) -> Tuple[int, int]:
+        """Index the complete lines of the next block.
+
+        :return: end of the block and its Bloom filter. The end equals start
+        if no complete line is available.
+        """
+        grams = set()
+        end = start
+        data = f_in.read(BLOCK_SIZE)
+        while data:
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                grams.update(trigrams(data[:cut]))
+                end += cut
+                break
+            # A line longer than a block: the block ends with the line.
+            grams.update(trigrams(data))
+            end += len(data)
+            tail = data[-2:]
+            data = f_in.read(BLOCK_SIZE)
+            if data:
+                data = tail + data
+                end -= len(tail)
+        else:
+            end = start
+        f_in.seek(end)
+        return end, _bloom(grams)
+
+    def candidates(
+        self, logfile: Path, triggers: List[str], encoding: str
+    ) -> Optional[Tuple[List[Tuple[int, int]], int]]:
+        """Find the blocks of logfile which may contain one of the triggers.
+
+        :param logfile: the logfile.
+        :type logfile: Path
+        :param triggers: the triggers.
+        :type triggers: List[str]
+        :param encoding: encoding of the logfile.
+        :type encoding: str
+        :return: byte ranges to read and the end of the indexed data, or None
+        if the index cannot be used, e.g. because a trigger is too short or
+        logfile is not indexed.
+        :rtype: Tuple[List[Tuple[int, int]], int]
+        """
+        masks = [_bloom(trigrams(str(trigger).encode(encoding, "replace")))
+                 for trigger in triggers]
+        if not masks or not all(masks):
+            return None
+        with self._connect() as connection, open(str(logfile), "rb") as f_in:
+            row = connection.execute(
+                "SELECT id, size, head FROM files WHERE path = ?", (self._key(logfile),)
+            ).fetchone()
+            head = f_in.read(HEAD_SIZE)
+            if row is None or head[:len(row[2])] != row[2] or f_in.seek(0, 2) < row[1]:
+                return None
+            ranges = []
+            for start, end, bloom in connection.execute(
+                "SELECT start, end, bloom FROM blocks WHERE file = ? ORDER BY start",
+                (row[0],),
+            ):
+                bits = int.from_bytes(bloom, "little")
+                if not any(bits & mask == mask for mask in masks):
+                    continue
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((start, end))
+            return ranges, row[1]
@@ -20,21 +20,41 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import functools
+import re
+import signal
+import sqlite3
 import sys
 import time
 from configparser import MissingSectionHeaderError
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List
 import concurrent.futures
+from contextlib import ExitStack
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
+from queue import Queue, Empty
 from threading import Event
 
 from loguru import logger
 import click
 from confloader import ConfDict
 
+from .merge import MergingProcessor, REORDER_WINDOW, TIMESTAMP_PATTERN
+from .index import BlockIndex
+from .reader import BATCH_SIZE, MAX_LINE_LENGTH, STDIN, is_stream
+from .profiling import Sampler, StageProfiler
+from .matches import Match
+from .passthrough import PassthroughProcessor
+from .profiles import PROFILE_KEYS, Profile, ProfileRouter, union
+from .records import RecordAssembler, MAX_RECORD_LINES, RECORD_TIMEOUT
+from .scheduler import FairQueue
+from .store import MatchStore
+from .reload import ConfigWatcher
+from .output import TraceWriter, COMPRESSIONS, COMPRESSION_NONE
+from .matchers import JsonFilter, load_json_parser, parse_expression, JSON_PARSER_AUTO
 from .processors import SerialProcessor, ParallelProcessor
+from .server import PublishingProcessor, TailServer, render_subscription
+from .summary import TriggerCounter, render_summary
 
 
 # Version number. Managed by bumpversion, do not edit!
@@ -46,13 +66,24 @@ INI_LOGFILES = "logfiles"
 INI_GENERAL = "general"
 INI_OUTPUT = "output"
 INI_TRIGGERS = "triggers"
+INI_JSON = "json"
+INI_JSON_PARSER = "json_parser"
+INI_RECORDS = "records"
+INI_PROFILE = "profile"
+INI_PRIORITIES = "priorities"
 
 DEFAULT_TRACE = "./trace.txt"
+DEFAULT_BACKUPS = 5  # rotated trace files to keep.
+DEFAULT_INTERVAL = 60  # seconds per bucket in summary mode.
 
 MAX_QUEUE_SIZE = 1000
 
 TIMEOUT = 30  # timeout for thread completion.
 
+DRAIN_TIMEOUT = 5.0  # seconds to write pending output at shutdown.
+
+DEFAULT_INDEX = ".logtailor.idx"
+
 
 L_TIME = "{time:YYYY.MM.DD HH:mm:ss.SSSSS}"
 L_FORMAT = L_TIME + " - {level:8s} - {file}{function}:{line} - {message}"
@@ -72,13 +103,36 @@ logger.configure(**L_CONFIG)
 logger.enable("logtailor")
 
 
+def _as_list(value) -> list:
+    """Configuration values with a single line are not parsed into a list."""
+    if isinstance(value, list):
+        return value
+    return [] if value in (None, "") else [value]
+
+
 class Configuration:
     """Manages configuration file access to items.
 
     Provides:
     logs: Dict[str, str] - mapping of keys to logfiles.
     triggers: List[str] - list of triggers.
+    excludes: List[str] - drop lines containing one of these strings.
+    expressions: List[str] - trigger expressions.
     output: Path - trace file.
+    json_filters: Dict[str, List[str]] - JSON field filters per log key.
+    json_parser: str - JSON library used for JSON filters.
+    compression: str - compression of the trace file.
+    max_size: int - rotate trace file at this size in bytes, 0 disables.
+    rotate_interval: int - rotate trace file after seconds, 0 disables.
+    backups: int - number of rotated trace files to keep.
+    timestamp_pattern: str - regular expression matching timestamps.
+    records: Dict[str, str] - record start patterns per log key.
+    record_max_lines: int - maximum number of lines per record.
+    record_timeout: float - seconds to wait for more lines of a record.
+    database: str - SQLite database storing the matches, empty to disable.
+    index: Path - block index of the logfiles.
+    profiles: Dict[str, Dict[str, str]] - settings per trigger profile.
+    priorities: Dict[str, int] - weights of the logfiles per log key.
     """
 
     def __init__(self, path: str):
@@ -89,7 +143,22 @@ class Configuration:
         """
         try:
             cfg = ConfDict.from_file(
-                path, defaults={"triggers": [], "output": DEFAULT_TRACE}
+                path, defaults={
+                    "triggers": [],
+                    "excludes": [],
+                    "expressions": [],
+                    "output": DEFAULT_TRACE,
+                    "json_parser": JSON_PARSER_AUTO,
+                    "compression": COMPRESSION_NONE,
+                    "max_size": 0,
+                    "rotate_interval": 0,
+                    "backups": DEFAULT_BACKUPS,
+                    "timestamp_pattern": TIMESTAMP_PATTERN,
+                    "record_max_lines": MAX_RECORD_LINES,
+                    "record_timeout": RECORD_TIMEOUT,
+                    "database": "",
+                    "index": DEFAULT_INDEX,
+                }
             )
             ofs = len("logfiles.")
             self.logs_ = {
@@ -99,6 +168,42 @@ class Configuration:
             }
             self.output_ = Path(cfg["output"])
             self.triggers_ = cfg["triggers"]
+            self.excludes_ = _as_list(cfg["excludes"])
+            self.expressions_ = _as_list(cfg["expressions"])
+            ofs = len("json.")
+            self.json_filters_ = {
+                k[ofs:].strip(): v
+                for k, v in cfg.items()
+                if k.startswith("json.")
+            }
+            self.json_parser_ = cfg["json_parser"]
+            self.compression_ = cfg["compression"]
+            self.max_size_ = int(cfg["max_size"])
+            self.rotate_interval_ = int(cfg["rotate_interval"])
+            self.backups_ = int(cfg["backups"])
+            self.timestamp_pattern_ = cfg["timestamp_pattern"]
+            ofs = len("records.")
+            self.records_ = {
+                k[ofs:].strip(): str(v)
+                for k, v in cfg.items()
+                if k.startswith("records.")
+            }
+            self.record_max_lines_ = int(cfg["record_max_lines"])
+            self.record_timeout_ = float(cfg["record_timeout"])
+            self.database_ = cfg["database"]
+            self.index_ = Path(cfg["index"])
+            ofs = len(INI_PROFILE) + 1
+            self.profiles_ = {}
+            for k, v in cfg.items():
+                if k.startswith(INI_PROFILE + "."):
+                    name, _, key = k[ofs:].rpartition(".")
+                    self.profiles_.setdefault(name.strip(), {})[key.strip()] = v
+            ofs = len(INI_PRIORITIES) + 1
+            self.priorities_ = {
+                k[ofs:].strip(): v
+                for k, v in cfg.items()
+                if k.startswith(INI_PRIORITIES + ".")
+            }
         except MissingSectionHeaderError as msh:
             sys.stderr.write(str(msh) + "\n")
             sys.exit(1)
@@ -109,7 +214,23 @@ class Configuration:
             )
             self.logs_ = {}
             self.triggers_ = []
+            self.excludes_ = []
+            self.expressions_ = []
             self.output_ = Path(DEFAULT_TRACE)
+            self.json_filters_ = {}
+            self.json_parser_ = JSON_PARSER_AUTO
+            self.compression_ = COMPRESSION_NONE
+            self.max_size_ = 0
+            self.rotate_interval_ = 0
+            self.backups_ = DEFAULT_BACKUPS
+            self.timestamp_pattern_ = TIMESTAMP_PATTERN
+            self.records_ = {}
+            self.record_max_lines_ = MAX_RECORD_LINES
+            self.record_timeout_ = RECORD_TIMEOUT
+            self.database_ = ""
+            self.index_ = Path(DEFAULT_INDEX)
+            self.profiles_ = {}
+            self.priorities_ = {}
 
     @property
     def logs(self):
@@ -138,25 +259,250 @@ class Configuration:
         """
         return self.triggers_
 
+    @property
+    def excludes(self):
+        """Configured excludes.
+
+        :return: list of strings dropping a line.
+        :rtype: List[str]
+        """
+        return self.excludes_
+
+    @property
+    def expressions(self):
+        """Configured trigger expressions.
+
+        :return: list of expressions.
+        :rtype: List[str]
+        """
+        return self.expressions_
+
+    @property
+    def json_filters(self):
+        """Configured JSON field filters with their log keys.
+
+        :return: dictionary of key: list of 'field=value' entries.
+        :rtype: Dict[str, List[str]]
+        """
+        return self.json_filters_
+
+    @property
+    def json_parser(self):
+        """Configured JSON library.
+
+        :return: module name of the JSON library or 'auto'.
+        :rtype: str
+        """
+        return self.json_parser_
+
+    @property
+    def compression(self):
+        """Configured compression of the trace file.
+
+        :return: one of 'none', 'gzip' or 'zstd'.
+        :rtype: str
+        """
+        return self.compression_
+
+    @property
+    def max_size(self):
+        """Configured maximum size of the trace file before rotation.
+
+        :return: size in bytes, 0 if rotation by size is disabled.
+        :rtype: int
+        """
+        return self.max_size_
+
+    @property
+    def rotate_interval(self):
+        """Configured interval for rotation of the trace file.
+
+        :return: interval in seconds, 0 if rotation by time is disabled.
+        :rtype: int
+        """
+        return self.rotate_interval_
+
+    @property
+    def backups(self):
+        """Configured number of rotated trace files to keep.
+
+        :return: number of backups.
+        :rtype: int
+        """
+        return self.backups_
+
+    @property
+    def timestamp_pattern(self):
+        """Configured regular expression matching timestamps of log lines.
+
+        :return: pattern with named groups Y, m, d, H, M, S and optionally f.
+        :rtype: str
+        """
+        return self.timestamp_pattern_
+
+    @property
+    def records(self):
+        """Configured record start patterns with their log keys.
+
+        :return: dictionary of key: regular expression pairs.
+        :rtype: Dict[str, str]
+        """
+        return self.records_
+
+    @property
+    def record_max_lines(self):
+        """Configured maximum number of lines per record.
+
+        :return: number of lines.
+        :rtype: int
+        """
+        return self.record_max_lines_
+
+    @property
+    def record_timeout(self):
+        """Configured time to wait for more lines of the last record.
+
+        :return: timeout in seconds.
+        :rtype: float
+        """
+        return self.record_timeout_
+
+    @property
+    def database(self):
+        """Configured SQLite database storing the matches.
+
+        :return: path to the database, empty if matches are not stored.
+        :rtype: str
+        """
+        return self.database_
+
+    @property
+    def index(self):
+        """Configured block index of the logfiles.
+
+        :return: path to the index. It is used if it exists.
+        :rtype: Path
+        """
+        return self.index_
+
+    @property
+    def profiles(self):
+        """Configured trigger profiles with their names.
+
+        :return: dictionary of name: settings of the profile.
+        :rtype: Dict[str, Dict[str, str]]
+        """
+        return self.profiles_
+
+    @property
+    def priorities(self):
+        """Configured priorities of the logfiles with their log keys.
+
+        :return: dictionary of key: weight pairs.
+        :rtype: Dict[str, int]
+        """
+        return self.priorities_
+
 
 @logger.catch
-def render_log(log_queue: Queue, f_out, cancel: Event):
-    """Render lines read from queue."""
+def render_log(log_queue: Queue, f_out, cancel: Event, abort: Event = None,
+               write: Callable = None, finished: Event = None):
+    """Render lines read from queue.
+
+    The processors deliver the lines as Match carrying their origin.
+    After cancel, lines still in the queue are rendered unless abort is set.
+    If given, rendering continues until finished is set, i.e. the processors
+    delivered their last lines. Lines are written with write, default is out().
+    """
+    write = write or out
     logger.trace("render_log() started")
     while True:
-        if cancel.is_set() and log_queue.empty():
+        done = finished is None or finished.is_set()
+        if cancel.is_set() and done and log_queue.empty():
             logger.trace("render_log() -->  canceled")
             return
+        if abort is not None and abort.is_set():
+            logger.trace("render_log() -->  aborted")
+            return
         time.sleep(0.1)
         while not log_queue.empty():
             line = log_queue.get()
-            out(f_out, line)
+            write(f_out, line)
             log_queue.task_done()
 
 
-def out(f_out, line: str):
-    """Write line to output."""
-    ln_out = line.strip() + "\n\r"
+def wait_for_stop(duration: float = None, future: concurrent.futures.Future = None):
+    """Block until SIGTERM or SIGINT is received or duration has elapsed.
+
+    Must be called from the main thread.
+
+    :param duration: maximum seconds to wait. Default is to wait for a signal.
+    :type duration: float
+    :param future: stop waiting when this future is done as well.
+    :type future: concurrent.futures.Future
+    """
+    stop = Event()
+    if future is not None:
+        future.add_done_callback(lambda _: stop.set())
+
+    def handler(signum, _frame):
+        logger.info("Received signal {}", signum)
+        stop.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handler)
+    stop.wait(duration)
+
+
+def shutdown(cancel: Event, abort: Event, futures: List[concurrent.futures.Future],
+             log_queue: Queue, timeout: float = DRAIN_TIMEOUT) -> int:
+    """Stop processing and write pending output within a deadline.
+
+    If output is still pending after timeout seconds, rendering is aborted
+    and the remaining lines are dropped.
+
+    :param cancel: signals processors and renderers to stop.
+    :type cancel: Event
+    :param abort: signals renderers to stop without writing pending lines.
+    :type abort: Event
+    :param futures: processor and renderer futures.
+    :type futures: List[Future]
+    :param log_queue: queue of pending lines.
+    :type log_queue: Queue
+    :param timeout: seconds to write pending output.
+    :type timeout: float
+    :return: number of lines not written.
+    :rtype: int
+    """
+    cancel.set()
+    _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+    if not not_done:
+        # Lines delivered after the renderer stopped are not written.
+        return log_queue.qsize()
+    abort.set()
+    dropped = 0
+    deadline = time.monotonic() + TIMEOUT
+    while True:
+        try:
+            log_queue.get(timeout=0.1)
+            log_queue.task_done()
+            dropped += 1
+        except Empty:
+            if all(future.done() for future in futures) or time.monotonic() > deadline:
+                break
+    if not all(future.done() for future in futures):
+        logger.warning("Timeout waiting for processing threads to complete.")
+    return dropped + log_queue.qsize()
+
+
+def out(f_out, line, labels: Dict[Path, str] = None):
+    """Write line to output.
+
+    With labels, a Match is prefixed with the label of its logfile.
+    """
+    ln_out = str(line).strip() + "\n\r"
+    if labels is not None and isinstance(line, Match):
+        ln_out = "[{}] {}".format(line.label(labels), ln_out)
     f_out.write(ln_out)
     sys.stdout.write(ln_out)
 
@@ -182,6 +528,8 @@ def validate_log(parse_all: bool, log: str, logs: Dict[str, Path]):
             "information.\n|n"
         )
         sys.exit(1)
+    if log == STDIN:
+        return [Path(STDIN)]
     if log in logs:
         return [Path(logs[log])]
     path = Path(log)
@@ -194,9 +542,329 @@ def validate_log(parse_all: bool, log: str, logs: Dict[str, Path]):
     sys.exit(1)
 
 
-def mode(is_append: bool):
-    """Write mode dependend on is_append."""
-    return "a" if is_append else "w"
+def build_json_filters(cfg: Configuration):
+    """Create JSON filters for configured logfiles.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to their JSON filters.
+    :rtype: Dict[Path, JsonFilter]
+    :raise ValueError: if a filter is malformed.
+    """
+    parser = load_json_parser(cfg.json_parser)
+    filters = {}
+    for key, entries in cfg.json_filters.items():
+        if key not in cfg.logs:
+            sys.stderr.write(
+                "JSON filter for unknown log key {} ignored.\n".format(key)
+            )
+            continue
+        filters[Path(cfg.logs[key])] = JsonFilter.from_config(entries, parser)
+    return filters
+
+
+@logger.catch
+def create_json_filters(cfg: Configuration):
+    """Create JSON filters for configured logfiles. Exit on malformed filters.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to their JSON filters.
+    :rtype: Dict[Path, JsonFilter]
+    """
+    try:
+        return build_json_filters(cfg)
+    except ValueError as exc:
+        sys.stderr.write("{}\n".format(exc))
+        sys.exit(1)
+
+
+def build_records(cfg: Configuration):
+    """Create record assembler factories for configured logfiles.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to factories of their record assemblers.
+    :rtype: Dict[Path, Callable[[], RecordAssembler]]
+    :raise ValueError: if a start pattern is malformed.
+    """
+    records = {}
+    for key, start in cfg.records.items():
+        if key not in cfg.logs:
+            sys.stderr.write(
+                "Record pattern for unknown log key {} ignored.\n".format(key)
+            )
+            continue
+        try:
+            pattern = re.compile(start)
+        except re.error as exc:
+            raise ValueError(
+                "Invalid record pattern '{}' for {}: {}".format(start, key, exc)
+            )
+        records[Path(cfg.logs[key])] = functools.partial(
+            RecordAssembler, pattern, cfg.record_max_lines, cfg.record_timeout
+        )
+    return records
+
+
+def build_priorities(cfg: Configuration):
+    """Create the weights of configured logfiles for fair scheduling.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to their weights.
+    :rtype: Dict[Path, int]
+    :raise ValueError: if a weight is not a positive integer.
+    """
+    weights = {}
+    for key, entry in cfg.priorities.items():
+        if key not in cfg.logs:
+            sys.stderr.write(
+                "Priority for unknown log key {} ignored.\n".format(key)
+            )
+            continue
+        try:
+            weight = int(entry)
+        except (TypeError, ValueError):
+            weight = 0
+        if weight < 1:
+            raise ValueError(
+                "Invalid priority '{}' for {}. Use a positive integer.".format(entry, key)
+            )
+        weights[Path(cfg.logs[key])] = weight
+    return weights
+
+
+@logger.catch
+def create_priorities(cfg: Configuration):
+    """Create the weights of configured logfiles. Exit on malformed weights.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to their weights.
+    :rtype: Dict[Path, int]
+    """
+    try:
+        return build_priorities(cfg)
+    except ValueError as exc:
+        sys.stderr.write("{}\n".format(exc))
+        sys.exit(1)
+
+
+def create_log_queue(cfg: Configuration, parallel: bool) -> Queue:
+    """Create the queue of matching lines.
+
+    Lines of logfiles processed in parallel are scheduled fairly, other lines
+    are delivered in the order they were read.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :param parallel: the logfiles are processed in parallel.
+    :type parallel: bool
+    :return: the queue.
+    :rtype: Queue
+    """
+    if parallel:
+        return FairQueue(MAX_QUEUE_SIZE, create_priorities(cfg))
+    return Queue(MAX_QUEUE_SIZE)
+
+
+def build_profiles(cfg: Configuration):
+    """Create the configured trigger profiles.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: the profiles ordered by name.
+    :rtype: List[Profile]
+    :raise ValueError: if a profile is malformed.
+    """
+    profiles = []
+    for name, settings in sorted(cfg.profiles.items()):
+        unknown = set(settings) - set(PROFILE_KEYS)
+        if not name or unknown:
+            raise ValueError(
+                "Invalid profile '{}'. Use the keys {} in [{}.<name>].".format(
+                    name, ", ".join(PROFILE_KEYS), INI_PROFILE
+                )
+            )
+        profile = Profile(
+            name,
+            _as_list(settings.get("triggers")),
+            _as_list(settings.get("excludes")),
+            _as_list(settings.get("expressions")),
+            settings.get("output"),
+        )
+        if not profile.expression:
+            raise ValueError("Profile '{}' has no triggers or expressions.".format(name))
+        profiles.append(profile)
+    return profiles
+
+
+@logger.catch
+def create_profiles(cfg: Configuration):
+    """Create the configured trigger profiles. Exit on malformed profiles.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: the profiles ordered by name.
+    :rtype: List[Profile]
+    """
+    try:
+        return build_profiles(cfg)
+    except ValueError as exc:
+        sys.stderr.write("{}\n".format(exc))
+        sys.exit(1)
+
+
+@logger.catch
+def create_records(cfg: Configuration):
+    """Create record assembler factories. Exit on malformed patterns.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to factories of their record assemblers.
+    :rtype: Dict[Path, Callable[[], RecordAssembler]]
+    """
+    try:
+        return build_records(cfg)
+    except ValueError as exc:
+        sys.stderr.write("{}\n".format(exc))
+        sys.exit(1)
+
+
+# pylint: disable=too-many-arguments
+def reload_configuration(
+    processor,
+    counter: TriggerCounter,
+    add_triggers: List[str],
+    add_excludes: List[str],
+    add_expressions: List[str],
+    use_triggers: bool,
+    parse_all: bool,
+):
+    """Apply the configuration file to a running processor.
+
+    Triggers given on the command line are kept. Logfiles are only updated
+    if all configured logfiles are processed. On errors the running
+    configuration is kept.
+
+    :param processor: the running processor.
+    :type processor: LogProcessor
+    :param counter: the counter in summary mode or None.
+    :type counter: TriggerCounter
+    :param add_triggers: triggers given on the command line.
+    :type add_triggers: List[str]
+    :param add_excludes: excludes given on the command line.
+    :type add_excludes: List[str]
+    :param add_expressions: expressions given on the command line.
+    :type add_expressions: List[str]
+    :param use_triggers: triggers shall be applied.
+    :type use_triggers: bool
+    :param parse_all: all configured logfiles are processed.
+    :type parse_all: bool
+    """
+    cfg = Configuration(INI_FILE)
+    triggers = determine_triggers(cfg.triggers, add_triggers, use_triggers)
+    excludes = determine_triggers(cfg.excludes, add_excludes, use_triggers)
+    expressions = determine_triggers(cfg.expressions, add_expressions, use_triggers)
+    try:
+        json_filters = build_json_filters(cfg) if use_triggers else {}
+        processor.update_triggers(triggers, excludes, expressions, json_filters)
+        if counter is not None:
+            counter.update_triggers(triggers, excludes, expressions)
+        if processor.store is not None:
+            processor.store.update_triggers(triggers, excludes, expressions)
+    except ValueError as exc:
+        logger.error("Reload failed, keeping configuration: {}", exc)
+        return
+    if parse_all:
+        processor.update_logfiles([Path(log) for log in cfg.logs.values()])
+
+
+def log_labels(cfg: Configuration) -> Dict[Path, str]:
+    """Labels of the configured logfiles.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :return: map of logfiles to their keys.
+    :rtype: Dict[Path, str]
+    """
+    return {Path(log): key for key, log in cfg.logs.items()}
+
+
+def open_store(cfg: Configuration, path: str, triggers: List[str],
+               excludes: List[str], expressions: List[str]) -> MatchStore:
+    """Open the database storing the matches. Exit if it cannot be opened.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :param path: path to the database.
+    :type path: str
+    :param triggers: triggers recorded for the matches.
+    :type triggers: List[str]
+    :param excludes: excludes of the triggers.
+    :type excludes: List[str]
+    :param expressions: expressions recorded for the matches.
+    :type expressions: List[str]
+    :return: the store.
+    :rtype: MatchStore
+    """
+    sources = log_labels(cfg)
+    try:
+        return MatchStore(
+            Path(path), sources, triggers, excludes, expressions, cfg.timestamp_pattern
+        )
+    except sqlite3.Error as exc:
+        sys.stderr.write("Cannot open database {}: {}\n".format(path, exc))
+        sys.exit(1)
+
+
+def open_server(path: str, log_queue: Queue, cancel: Event) -> TailServer:
+    """Create the server publishing matches. Exit if path is in use.
+
+    :param path: path of the Unix domain socket.
+    :type path: str
+    :param log_queue: queue of matches to publish.
+    :type log_queue: Queue
+    :param cancel: stop serving.
+    :type cancel: Event
+    :return: the server.
+    :rtype: TailServer
+    """
+    try:
+        return TailServer(path, log_queue, cancel)
+    except ValueError as exc:
+        sys.stderr.write("Cannot serve on {}: {}\n".format(path, exc))
+        sys.exit(1)
+
+
+def open_trace(cfg: Configuration, append: bool, compression: str = None,
+               output: Path = None):
+    """Open the trace file.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :param append: append to existing trace file.
+    :type append: bool
+    :param compression: compression overriding the configuration.
+    :type compression: str
+    :param output: path overriding the configured trace file.
+    :type output: Path
+    :return: the trace file.
+    :rtype: TraceWriter
+    """
+    try:
+        return TraceWriter(
+            output or cfg.output,
+            append,
+            compression or cfg.compression,
+            cfg.max_size,
+            cfg.rotate_interval,
+            cfg.backups,
+        )
+    except ValueError as exc:
+        sys.stderr.write("{}\n".format(exc))
+        sys.exit(1)
 
 
 def processor_factory(
@@ -206,7 +874,19 @@ def processor_factory(
     cancel_event: Event,
     tailing: bool,
     history: bool,
-    encoding: str
+    encoding: str,
+    json_filters: Dict[Path, JsonFilter] = None,
+    excludes: List[str] = (),
+    expressions: List[str] = (),
+    counter: TriggerCounter = None,
+    merge: bool = False,
+    reorder_window: float = REORDER_WINDOW,
+    timestamp_pattern: str = TIMESTAMP_PATTERN,
+    batch_size: int = BATCH_SIZE,
+    max_line_length: int = MAX_LINE_LENGTH,
+    records: Dict[Path, Callable[[], RecordAssembler]] = None,
+    store: MatchStore = None,
+    index: BlockIndex = None
 ):
     """Create a processor instance.
 
@@ -224,14 +904,58 @@ def processor_factory(
     :type history: bool
     :param encoding: encoding of the log file.
     :type encoding: str
+    :param json_filters: field filters for logfiles written as JSON lines.
+    :type json_filters: Dict[Path, JsonFilter]
+    :param excludes: drop lines containing one of these strings.
+    :type excludes: List[str]
+    :param expressions: trigger expressions.
+    :type expressions: List[str]
+    :param counter: count matching lines instead of delivering them.
+    :type counter: TriggerCounter
+    :param merge: deliver lines of all logfiles ordered by timestamp.
+    :type merge: bool
+    :param reorder_window: seconds to hold back new lines for merging.
+    :type reorder_window: float
+    :param timestamp_pattern: regular expression matching timestamps.
+    :type timestamp_pattern: str
+    :param batch_size: maximum number of lines read at once.
+    :type batch_size: int
+    :param max_line_length: truncate lines longer than this many bytes.
+    :type max_line_length: int
+    :param records: factories of record assemblers for logfiles with
+    multi-line records.
+    :type records: Dict[Path, Callable[[], RecordAssembler]]
+    :param store: also store matches in this database.
+    :type store: MatchStore
+    :param index: index of the logfiles used to read the history.
+    :type index: BlockIndex
     :return: a log processor instance.
     :rtype: LogProcessor
     """
+    if merge:
+        return MergingProcessor(log_files, triggers, log_queue,
+                                cancel_event, history, encoding, tailing,
+                                json_filters=json_filters, excludes=excludes,
+                                expressions=expressions, counter=counter,
+                                reorder_window=reorder_window,
+                                timestamp_pattern=timestamp_pattern,
+                                batch_size=batch_size,
+                                max_line_length=max_line_length, store=store)
     if tailing:
         return ParallelProcessor(log_files, triggers, log_queue,
-                                 cancel_event, history, encoding, tailing)
+                                 cancel_event, history, encoding, tailing,
+                                 json_filters=json_filters, excludes=excludes,
+                                 expressions=expressions, counter=counter,
+                                 batch_size=batch_size,
+                                 max_line_length=max_line_length,
+                                 records=records, store=store, index=index)
     return SerialProcessor(log_files, triggers, log_queue,
-                           cancel_event, history, encoding)
+                           cancel_event, history, encoding,
+                           json_filters=json_filters, excludes=excludes,
+                           expressions=expressions, counter=counter,
+                           batch_size=batch_size,
+                           max_line_length=max_line_length,
+                           records=records, store=store, index=index)
 
 
 def determine_triggers(triggers, add_triggers, use_triggers):
@@ -254,13 +978,31 @@ def determine_triggers(triggers, add_triggers, use_triggers):
     return triggers_
 
 
-def verbose_info(log_files, triggers):
+def validate_expressions(expressions: List[str]):
+    """Validate trigger expressions. Exit on malformed expressions.
+
+    :param expressions: list of trigger expressions.
+    :type expressions: List[str]
+    """
+    for expression in expressions:
+        try:
+            parse_expression(expression)
+        except ValueError as exc:
+            sys.stderr.write("{}\n".format(exc))
+            sys.exit(1)
+
+
+def verbose_info(log_files, triggers, excludes=(), expressions=()):
     """Print verbose information to stderr.
 
     :param log_files: list of log files.
     :type log_files: List[Path]
     :param triggers: list of triggers.
     :type triggers: List[str]
+    :param excludes: list of excludes.
+    :type excludes: List[str]
+    :param expressions: list of trigger expressions.
+    :type expressions: List[str]
     """
     sys.stderr.write("{}\n".format("-" * 80))
     sys.stderr.write(
@@ -269,12 +1011,257 @@ def verbose_info(log_files, triggers):
     sys.stderr.write("Triggers:\n")
     for trigger in triggers:
         sys.stderr.write("\t{}\n".format(trigger))
+    if expressions:
+        sys.stderr.write("Expressions:\n")
+        for expression in expressions:
+            sys.stderr.write("\t{}\n".format(expression))
+    if excludes:
+        sys.stderr.write("Excludes:\n")
+        for exclude in excludes:
+            sys.stderr.write("\t{}\n".format(exclude))
     sys.stderr.write("Log files:\n")
     for log in log_files:
         sys.stderr.write("\t{}\n".format(log))
     sys.stderr.write("{}\n".format("-" * 80))
 
 
+def report_profile(profiler: StageProfiler, sampler: Sampler = None,
+                   samples: str = None):
+    """Write the profiling report to stderr.
+
+    :param profiler: the stage profiler.
+    :type profiler: StageProfiler
+    :param sampler: the sampling profiler, if any.
+    :type sampler: Sampler
+    :param samples: write the sampled call stacks to this file.
+    :type samples: str
+    """
+    sys.stderr.write(profiler.report())
+    if sampler is not None:
+        sampler.stop()
+        sys.stderr.write(sampler.report())
+        sampler.write(Path(samples))
+        sys.stderr.write("Sampled call stacks written to {}\n".format(samples))
+
+
+def build_index_and_exit(path: Path, log_files: List[Path]):
+    """Index the data appended to the logfiles since the last run and exit.
+
+    :param path: path to the index.
+    :type path: Path
+    :param log_files: logfiles to index.
+    :type log_files: List[Path]
+    """
+    index = BlockIndex(path)
+    for logfile in log_files:
+        if is_stream(logfile):
+            sys.stderr.write("{} is a stream and cannot be indexed.\n".format(logfile))
+            continue
+        try:
+            size = index.update(logfile)
+        except (OSError, sqlite3.Error) as exc:
+            sys.stderr.write("Cannot index {}: {}\n".format(logfile, exc))
+            sys.exit(1)
+        sys.stderr.write("{}: {} bytes indexed\n".format(logfile, size))
+    sys.exit(0)
+
+
+def select_profiles(cfg: Configuration, use_profiles: bool,
+                    exclusive: bool) -> List[Profile]:
+    """Trigger profiles of the run.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :param use_profiles: route the matches of the profiles.
+    :type use_profiles: bool
+    :param exclusive: a mode is active which does not support profiles.
+    :type exclusive: bool
+    :return: the profiles to route.
+    :rtype: List[Profile]
+    """
+    profiles = create_profiles(cfg) if use_profiles else []
+    if profiles and exclusive:
+        logger.warning("Trigger profiles are not used with --count, --serve or --connect")
+        return []
+    return profiles
+
+
+def match_criteria(regular: Profile, profiles: List[Profile]):
+    """Triggers, excludes and expressions matched by the processors.
+
+    :param regular: the triggers of the regular output.
+    :type regular: Profile
+    :param profiles: the trigger profiles.
+    :type profiles: List[Profile]
+    :return: triggers, excludes and expressions.
+    :rtype: Tuple[List[str], List[str], List[str]]
+    """
+    if not profiles:
+        return regular.triggers, regular.excludes, regular.expressions
+    # The processors match the union, the router sorts the lines out.
+    return [], [], union([regular] + profiles)
+
+
+def create_writer(cfg: Configuration, label: bool, profiler: StageProfiler = None):
+    """Function writing a line to the output.
+
+    :param cfg: the configuration.
+    :type cfg: Configuration
+    :param label: prefix lines with the label of their logfile.
+    :type label: bool
+    :param profiler: measure the time spent writing.
+    :type profiler: StageProfiler
+    :return: the write function.
+    :rtype: Callable
+    """
+    write = functools.partial(out, labels=log_labels(cfg)) if label else out
+    if profiler is not None:
+        write = profiler.wrap("write", write, key="output")
+    return write
+
+
+def route_profiles(write, regular: Profile, profiles: List[Profile],
+                   outputs: ExitStack, open_output: Callable):
+    """Route the matches of the profiles to their outputs.
+
+    :param write: function writing lines to the regular output.
+    :type write: Callable
+    :param regular: the triggers of the regular output.
+    :type regular: Profile
+    :param profiles: the trigger profiles.
+    :type profiles: List[Profile]
+    :param outputs: closes the outputs of the profiles.
+    :type outputs: ExitStack
+    :param open_output: opens the output of a profile.
+    :type open_output: Callable
+    :return: the write function.
+    :rtype: Callable
+    """
+    if not profiles:
+        return write
+    routes = [
+        (profile.predicate, outputs.enter_context(open_output(profile.output)))
+        for profile in profiles
+    ]
+    return ProfileRouter(regular.predicate, routes, write)
+
+
+def can_pass_through(log_files: List[Path], transforms: bool) -> bool:
+    """Check if the logfiles may be copied unchanged to the output.
+
+    :param log_files: the logfiles.
+    :type log_files: List[Path]
+    :param transforms: lines are filtered, counted, merged, published or stored.
+    :type transforms: bool
+    :return: True if the logfiles may be copied.
+    :rtype: bool
+    """
+    if transforms:
+        return False
+    return not any(is_stream(log) for log in log_files)
+
+
+# pylint: disable=too-many-arguments
+def create_renderer(log_queue: Queue, f_out, write, cancel: Event, abort: Event,
+                    finished: Event, connect: str = None,
+                    request: Dict[str, List[str]] = None,
+                    server: TailServer = None, counter: TriggerCounter = None):
+    """Task rendering the output.
+
+    :param log_queue: queue of matching lines.
+    :type log_queue: Queue
+    :param f_out: the output.
+    :type f_out: TraceWriter
+    :param write: function writing a line to the output.
+    :type write: Callable
+    :param cancel: stop rendering.
+    :type cancel: Event
+    :param abort: stop writing lines still queued.
+    :type abort: Event
+    :param finished: the processors have finished.
+    :type finished: Event
+    :param connect: render the lines published by the server at this path.
+    :type connect: str
+    :param request: triggers requested from the server.
+    :type request: Dict[str, List[str]]
+    :param server: publish matching lines instead of rendering them.
+    :type server: TailServer
+    :param counter: render summaries of this counter.
+    :type counter: TriggerCounter
+    :return: the task.
+    :rtype: Callable[[], None]
+    """
+    if connect:
+        return functools.partial(
+            render_subscription, connect, request, f_out, cancel, write
+        )
+    if server is not None:
+        return server.run
+    if counter is not None:
+        return functools.partial(render_summary, counter, f_out, cancel, write)
+    return functools.partial(
+        render_log, log_queue, f_out, cancel, abort, write, finished
+    )
+
+
+def install_reload(tp_ex: ThreadPoolExecutor, cancel: Event, reload):
+    """Reload the configuration on change or SIGHUP.
+
+    :param tp_ex: runs the watcher.
+    :type tp_ex: ThreadPoolExecutor
+    :param cancel: stop watching.
+    :type cancel: Event
+    :param reload: applies the changed configuration.
+    :type reload: Callable[[], None]
+    """
+    watcher = ConfigWatcher(INI_FILE, reload, cancel)
+    watcher.install_signal_handler()
+    tp_ex.submit(watcher.run)
+
+
+def wait_for_user(log_files: List[Path], daemon: bool, duration: float,
+                  future: concurrent.futures.Future):
+    """Wait until the user stops the run.
+
+    :param log_files: the processed logfiles.
+    :type log_files: List[Path]
+    :param daemon: run without terminal until SIGTERM.
+    :type daemon: bool
+    :param duration: stop after so many seconds.
+    :type duration: float
+    :param future: future of the processor.
+    :type future: concurrent.futures.Future
+    """
+    if Path(STDIN) in log_files:
+        # The terminal is not available, stop at the end of the input.
+        wait_for_stop(duration, future)
+    elif daemon or duration is not None:
+        wait_for_stop(duration)
+    else:
+        click.pause()
+
+
+def close_store(store: MatchStore, future: concurrent.futures.Future,
+                timeout: float, db: str):
+    """Close the store and wait for pending matches to be stored.
+
+    :param store: the store, if any.
+    :type store: MatchStore
+    :param future: future of the store.
+    :type future: concurrent.futures.Future
+    :param timeout: seconds to wait.
+    :type timeout: float
+    :param db: path to the database.
+    :type db: str
+    """
+    if store is None:
+        return
+    store.close()
+    _, not_done = concurrent.futures.wait([future], timeout)
+    if not_done:
+        logger.warning("Waiting for matches to be stored in {}", db)
+
+
 def print_version_and_exit():
     """Print version and copyright info to stderr and exit with 0."""
     sys.stderr.write(
@@ -289,7 +1276,8 @@ def print_version_and_exit():
     "--log",
     type=str,
     help="Logfile to stream. Path to a file or a key to a logfile "
-    "in the configuration.",
+    "in the configuration. Use - to read standard input. Named pipes are "
+    "read until the writer closes them.",
 )
 @click.option(
     "--tail/--no-tail",
@@ -315,6 +1303,36 @@ def print_version_and_exit():
     multiple=True,
     help="Add a new trigger. May be used multiple times.",
 )
+@click.option(
+    "--exclude",
+    "-x",
+    type=str,
+    multiple=True,
+    help="Drop lines containing this string. May be used multiple times.",
+)
+@click.option(
+    "--expr",
+    "-e",
+    type=str,
+    multiple=True,
+    help="Add a trigger expression, e.g. 'ERROR AND NOT \"health check\"'. "
+    "May be used multiple times.",
+)
+@click.option(
+    "--profiles/--no-profiles",
+    "use_profiles",
+    default=True,
+    help="Write the matches of each trigger profile configured in the "
+    "[profile.<name>] sections to its own output. All profiles are matched "
+    "in one pass over the logfiles.",
+)
+@click.option(
+    "--label",
+    is_flag=True,
+    default=False,
+    help="Prefix each line with the key of its logfile in the configuration "
+    "or the name of the logfile.",
+)
 @click.option(
     "--verbose/--no-verbose",
     "-v/-nv",
@@ -332,6 +1350,118 @@ def print_version_and_exit():
 @click.option(
     "--append/--no-append", "-a", default=False, help="Append to Target file."
 )
+@click.option(
+    "--compress",
+    type=click.Choice(COMPRESSIONS),
+    default=None,
+    help="Compress the trace file. Overrides the configuration.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=BATCH_SIZE,
+    help="Maximum number of lines read from a logfile at once. Bounds memory "
+    "when catching up with large logfiles. Default is 1000.",
+)
+@click.option(
+    "--max-line-length",
+    type=click.IntRange(min=1),
+    default=MAX_LINE_LENGTH,
+    help="Truncate lines longer than this many bytes. Longer lines are still "
+    "matched completely without being kept in memory. Default is 1 MiB.",
+)
+@click.option(
+    "--db",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Also store the matches in this SQLite database. Overrides the "
+    "configuration.",
+)
+@click.option(
+    "--count",
+    is_flag=True,
+    default=False,
+    help="Summary mode. Output the number of matches per logfile and trigger "
+    "periodically instead of the lines.",
+)
+@click.option(
+    "--interval",
+    type=click.IntRange(min=1),
+    default=DEFAULT_INTERVAL,
+    help="Interval of the summaries in seconds. Default is 60.",
+)
+@click.option(
+    "--merge",
+    is_flag=True,
+    default=False,
+    help="Merge the lines of all logfiles ordered by their timestamps.",
+)
+@click.option(
+    "--reorder-window",
+    type=click.FloatRange(min=0),
+    default=REORDER_WINDOW,
+    help="Seconds new lines are held back for ordering when merging while "
+    "tailing. Default is 2.",
+)
+@click.option(
+    "--reload/--no-reload",
+    default=True,
+    help="Reload triggers and logfiles when the configuration file changes "
+    "or on SIGHUP while tailing.",
+)
+@click.option(
+    "--serve",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Publish matches on this Unix domain socket for logtailor clients.",
+)
+@click.option(
+    "--connect",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Subscribe to a logtailor server on this Unix domain socket. "
+    "Triggers given on the command line are evaluated by the server.",
+)
+@click.option(
+    "--daemon",
+    is_flag=True,
+    default=False,
+    help="Run without terminal interaction until SIGTERM or SIGINT.",
+)
+@click.option(
+    "--duration",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Stop after this many seconds. Implies --daemon.",
+)
+@click.option(
+    "--drain-timeout",
+    type=click.FloatRange(min=0),
+    default=DRAIN_TIMEOUT,
+    help="Seconds to write pending output at shutdown. Default is 5.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Measure wall and CPU time per processing stage and logfile. "
+    "A report is written to stderr at exit.",
+)
+@click.option(
+    "--profile-samples",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Sample the call stacks of all threads during the run and write "
+    "them to this file as collapsed stacks. Implies --profile.",
+)
+@click.option(
+    "--build-index",
+    is_flag=True,
+    default=False,
+    help="Update the block index of the logfiles and exit. Searches of the "
+    "history read only the blocks of indexed logfiles which may contain a "
+    "trigger.",
+)
 @click.option(
     "--version",
     "show_version",
@@ -349,11 +1479,32 @@ def tailor(
     history: bool,
     filter_: bool,
     trigger: str,
+    exclude: str,
+    expr: str,
+    use_profiles: bool,
+    label: bool,
     log: str,
     tail: bool,
     verbose: bool,
     parse_all: bool,
     append: bool,
+    compress: str,
+    batch_size: int,
+    max_line_length: int,
+    db: str,
+    count: bool,
+    interval: int,
+    merge: bool,
+    reorder_window: float,
+    reload: bool,
+    serve: str,
+    connect: str,
+    daemon: bool,
+    duration: float,
+    drain_timeout: float,
+    profile: bool,
+    profile_samples: str,
+    build_index: bool,
     show_version: bool,
     encoding: str
 ):
@@ -373,12 +1524,54 @@ def tailor(
     :type filter_: bool
     :param trigger: add a trigger to the filter criteria.
     :type trigger: str
+    :param exclude: drop lines containing this string.
+    :type exclude: str
+    :param expr: add a trigger expression to the filter criteria.
+    :type expr: str
+    :param use_profiles: route matches of the trigger profiles to their outputs.
+    :type use_profiles: bool
+    :param label: prefix lines with the label of their logfile.
+    :type label: bool
     :param verbose: more verbose output.
     :type verbose: bool
     :param parse_all: parse all known log files.
     :type parse_all: bool
     :param append: append to existing target file.
     :type append: bool
+    :param compress: compression of the trace file.
+    :type compress: str
+    :param batch_size: maximum number of lines read at once.
+    :type batch_size: int
+    :param max_line_length: truncate lines longer than this many bytes.
+    :type max_line_length: int
+    :param db: store matches in this SQLite database.
+    :type db: str
+    :param count: output periodic match counts instead of lines.
+    :type count: bool
+    :param interval: interval of the summaries in seconds.
+    :type interval: int
+    :param merge: merge lines of all logfiles ordered by timestamp.
+    :type merge: bool
+    :param reorder_window: seconds to hold back new lines when merging.
+    :type reorder_window: float
+    :param reload: reload the configuration file on change or SIGHUP.
+    :type reload: bool
+    :param serve: publish matches on this Unix domain socket.
+    :type serve: str
+    :param connect: subscribe to the server on this Unix domain socket.
+    :type connect: str
+    :param daemon: run without terminal interaction until SIGTERM or SIGINT.
+    :type daemon: bool
+    :param duration: stop after this many seconds.
+    :type duration: float
+    :param drain_timeout: seconds to write pending output at shutdown.
+    :type drain_timeout: float
+    :param profile: report time spent per processing stage at exit.
+    :type profile: bool
+    :param profile_samples: write sampled call stacks to this file.
+    :type profile_samples: str
+    :param build_index: update the block index of the logfiles and exit.
+    :type build_index: bool
     :param show_version: show version information and exit.
     :type show_version: bool
     :param encoding: encoding of the log file(s), e.g., latin1.
@@ -388,30 +1581,100 @@ def tailor(
         print_version_and_exit()
     cfg = Configuration(INI_FILE)
     triggers = determine_triggers(cfg.triggers, trigger, filter_)
-    log_files = validate_log(parse_all, log, cfg.logs)
+    excludes = determine_triggers(cfg.excludes, exclude, filter_)
+    expressions = determine_triggers(cfg.expressions, expr, filter_)
+    validate_expressions(expressions)
+    profiles = select_profiles(cfg, use_profiles and filter_, count or serve or connect)
+    regular = Profile("", triggers, excludes, expressions, cfg.output)
+    match_triggers, match_excludes, match_expressions = match_criteria(regular, profiles)
+    log_files = [] if connect else validate_log(parse_all, log, cfg.logs)
+    if build_index:
+        build_index_and_exit(cfg.index, log_files)
+    index = BlockIndex(cfg.index) if history and cfg.index.exists() else None
+    json_filters = create_json_filters(cfg) if filter_ else {}
+    records = create_records(cfg)
     if verbose:
-        verbose_info(log_files, triggers)
-    log_queue = Queue(MAX_QUEUE_SIZE)
-    with open(cfg.output, mode(append), buffering=1) as f_out:
-        with ThreadPoolExecutor(max_workers=2) as tp_ex:
+        verbose_info(log_files, triggers, excludes, expressions)
+    # Merged and serially processed lines are already in order.
+    log_queue = create_log_queue(cfg, bool(serve) or (tail and not merge))
+    profiler = StageProfiler() if profile or profile_samples else None
+    sampler = Sampler() if profile_samples else None
+    write = create_writer(cfg, label, profiler)
+    if sampler is not None:
+        sampler.start()
+    db = db or cfg.database
+    store = open_store(cfg, db, triggers, excludes, expressions) if db and not connect else None
+    # Without filter, logfiles are copied unchanged to the output.
+    passthrough = can_pass_through(
+        log_files, filter_ or count or merge or serve or connect or store
+    )
+    with open_trace(cfg, append, compress) as f_out, ExitStack() as outputs:
+        write = route_profiles(
+            write, regular, profiles, outputs,
+            functools.partial(open_trace, cfg, append, compress)
+        )
+        with ThreadPoolExecutor(max_workers=4) as tp_ex:
             cancel_event = Event()
             cancel_event.clear()
-            future_render = tp_ex.submit(render_log, log_queue, f_out, cancel_event)
-            processor = processor_factory(
-                log_files, triggers, log_queue, cancel_event, tail, history, encoding
+            abort_event = Event()
+            finished = Event()
+            counter = (
+                TriggerCounter(triggers, excludes, expressions, interval) if count else None
             )
+            server = open_server(serve, log_queue, cancel_event) if serve and not connect else None
+            request = {
+                "triggers": list(trigger),
+                "excludes": list(exclude),
+                "expressions": list(expr),
+            }
+            future_render = tp_ex.submit(create_renderer(
+                log_queue, f_out, write, cancel_event, abort_event, finished,
+                connect, request, server, counter
+            ))
+            if passthrough:
+                processor = PassthroughProcessor(
+                    log_files, f_out, cancel_event, history, tail,
+                    log_labels(cfg) if label else None, sys.stdout
+                )
+            elif server is not None:
+                processor = PublishingProcessor(
+                    server, log_files, triggers, log_queue, cancel_event, history,
+                    encoding, True, json_filters=json_filters, excludes=excludes,
+                    expressions=expressions, batch_size=batch_size,
+                    max_line_length=max_line_length, records=records,
+                    store=store, index=index
+                )
+            else:
+                processor = processor_factory(
+                    log_files, match_triggers, log_queue, cancel_event, tail, history,
+                    encoding, json_filters, match_excludes, match_expressions, counter,
+                    merge, reorder_window, cfg.timestamp_pattern, batch_size,
+                    max_line_length, records, store, index
+                )
+            processor.filtered = filter_
+            if profiler is not None:
+                profiler.instrument(processor)
             future_processor = tp_ex.submit(processor.run)
+            future_processor.add_done_callback(lambda _: finished.set())
+            future_store = tp_ex.submit(store.run) if store is not None else None
+            if profiles:
+                logger.info("Configuration changes are applied after restart")
+            elif reload and tail and not connect:
+                install_reload(tp_ex, cancel_event, lambda: reload_configuration(
+                    processor, counter, trigger, exclude, expr, filter_, parse_all
+                ))
 
-            click.pause()
-            cancel_event.set()
-            try:
-                future_processor.result(timeout=TIMEOUT)
-                future_render.result(timeout=TIMEOUT)
-            except (concurrent.futures.TimeoutError,
-                    concurrent.futures.CancelledError) as exc:
-                msg = "Timeout waiting for processing threads to complete ({})."
-                logger.warning(msg, exc)
+            wait_for_user(log_files, daemon, duration, future_processor)
+            dropped = shutdown(
+                cancel_event, abort_event, [future_processor, future_render],
+                log_queue, drain_timeout
+            )
+            if dropped:
+                logger.warning("{} lines in flight were not written", dropped)
+            close_store(store, future_store, drain_timeout, db)
             logger.trace("----- stopped -----")
+    if profiler is not None:
+        report_profile(profiler, sampler, profile_samples)
 
 
 if __name__ == "__main__":
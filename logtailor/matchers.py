@@ -0,0 +1,429 @@
+# coding=utf-8
+"""Line matchers."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import re
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+# pylint: disable=too-few-public-methods
+
+JSON_PARSER_AUTO = "auto"
+
+# Parsers tried in this order if no specific parser is requested.
+# The fastest available library wins, the standard library is the fallback.
+JSON_PARSERS = ["orjson", "ujson", "json"]
+
+
+def load_json_parser(name: str = JSON_PARSER_AUTO) -> Callable[[str], object]:
+    """Provide a function parsing a JSON document.
+
+    :param name: module name of the JSON library or 'auto' to pick the
+    fastest installed library.
+    :type name: str
+    :return: function converting a JSON string into a Python object.
+    :rtype: Callable[[str], object]
+    """
+    candidates = JSON_PARSERS if name == JSON_PARSER_AUTO else [name]
+    for candidate in candidates:
+        try:
+            module = __import__(candidate)
+        except ImportError:
+            if name != JSON_PARSER_AUTO:
+                logger.warning("JSON parser {} not available", candidate)
+            continue
+        logger.trace("Using JSON parser {}", candidate)
+        return module.loads
+    return json.loads
+
+
+def _as_text(value) -> str:
+    """Convert a parsed JSON value into its textual representation."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool) or value is None:
+        return json.dumps(value)
+    return str(value)
+
+
+class JsonFilter:
+    """Field based filter for logs written as JSON lines.
+
+    A line matches if all configured fields have the configured values.
+    Nested fields are addressed with dots, e.g. 'http.status=500'.
+
+    Before parsing, the line is checked for the plain text of all filter
+    values. Lines lacking one of them cannot match and are dropped without
+    running the JSON parser.
+    """
+
+    fields: Dict[str, str]
+
+    def __init__(self, fields: Dict[str, str], parser: Callable = json.loads):
+        """Initialize instance.
+
+        :param fields: mapping of field names to expected values.
+        :type fields: Dict[str, str]
+        :param parser: function converting a JSON string into an object.
+        :type parser: Callable[[str], object]
+        """
+        self.fields = {name: str(value) for name, value in fields.items()}
+        self.parser = parser
+        self.paths = [(name.split("."), value) for name, value in self.fields.items()]
+        # Values which JSON would escape cannot be used for the prefilter.
+        # A slash may be escaped, too, e.g. by PHP's json_encode().
+        self.tokens = [
+            value for value in self.fields.values()
+            if value and "/" not in value and json.dumps(value)[1:-1] == value
+        ]
+
+    @classmethod
+    def from_config(cls, entries: List[str], parser: Callable = json.loads):
+        """Create a filter from configuration entries.
+
+        :param entries: entries in the form 'field=value'.
+        :type entries: List[str]
+        :param parser: function converting a JSON string into an object.
+        :type parser: Callable[[str], object]
+        :return: the filter.
+        :rtype: JsonFilter
+        :raise ValueError: if an entry is malformed.
+        """
+        if not isinstance(entries, list):
+            entries = [entries]
+        fields = {}
+        for entry in entries:
+            name, sep, value = str(entry).partition("=")
+            if not sep or not name.strip():
+                raise ValueError("Invalid JSON filter '{}'. Use 'field=value'.".format(entry))
+            fields[name.strip()] = value.strip()
+        return cls(fields, parser)
+
+    def __call__(self, line: str) -> bool:
+        """Check line against the filter.
+
+        :param line: line to check.
+        :type line: str
+        :return: True if all fields match.
+        :rtype: bool
+        """
+        for token in self.tokens:
+            if token not in line:
+                return False
+        try:
+            document = self.parser(line)
+        except ValueError:
+            return False
+        for path, expected in self.paths:
+            value = document
+            for name in path:
+                if not isinstance(value, dict) or name not in value:
+                    return False
+                value = value[name]
+            if _as_text(value) != expected:
+                return False
+        return True
+
+
+class _Term:
+    """Substring term of a trigger expression."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def cost(self) -> int:
+        """Number of substring searches."""
+        return 1
+
+    def source(self, terms: Dict[str, int] = None) -> str:
+        """Python source evaluating the term.
+
+        With terms, the result is looked up in 'found' at the term's index.
+        """
+        if terms is not None:
+            return "found[{}]".format(terms.setdefault(self.text, len(terms)))
+        return "{!r} in line".format(self.text)
+
+
+class _Not:
+    """Negation of a trigger expression."""
+
+    def __init__(self, child):
+        self.child = child
+
+    def cost(self) -> int:
+        """Number of substring searches."""
+        return self.child.cost()
+
+    def source(self, terms: Dict[str, int] = None) -> str:
+        """Python source evaluating the negation."""
+        return "not ({})".format(self.child.source(terms))
+
+
+class _Junction:
+    """Conjunction or disjunction of trigger expressions."""
+
+    operator = ""
+
+    def __init__(self, children: list):
+        self.children = children
+
+    def cost(self) -> int:
+        """Number of substring searches."""
+        return sum(child.cost() for child in self.children)
+
+    def source(self, terms: Dict[str, int] = None) -> str:
+        """Python source evaluating the junction."""
+        if not self.children:
+            return "True" if isinstance(self, _And) else "False"
+        glue = " {} ".format(self.operator)
+        return "(" + glue.join(child.source(terms) for child in self.children) + ")"
+
+
+class _And(_Junction):
+    """All children have to match."""
+
+    operator = "and"
+
+
+class _Or(_Junction):
+    """At least one child has to match."""
+
+    operator = "or"
+
+
+_QUOTED = r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\''
+_QUOTED_RE = re.compile(_QUOTED)
+_TOKEN_RE = re.compile(r'\s*(\(|\)|' + _QUOTED + r'|[^\s()]+)')
+_OPERATORS = ("AND", "OR", "NOT", "(", ")")
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split an expression into tokens."""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        token = match.group(1) if match else ""
+        # An unterminated quote is matched as a bare word.
+        if not token or (token[0] in "\"'" and not _QUOTED_RE.fullmatch(token)):
+            raise ValueError("Invalid trigger expression '{}'.".format(text))
+        tokens.append(token)
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser for trigger expressions.
+
+    Grammar, NOT binds strongest, OR weakest:
+        expr   := term ('OR' term)*
+        term   := factor ('AND' factor)*
+        factor := 'NOT' factor | '(' expr ')' | word | quoted string
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def parse(self):
+        """Parse the expression."""
+        node = self._expr()
+        if self.pos != len(self.tokens):
+            self._fail()
+        return node
+
+    def _fail(self):
+        raise ValueError("Invalid trigger expression '{}'.".format(self.text))
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            self._fail()
+        self.pos += 1
+        return token
+
+    def _expr(self):
+        children = [self._term()]
+        while self._peek() == "OR":
+            self._next()
+            children.append(self._term())
+        return children[0] if len(children) == 1 else _Or(children)
+
+    def _term(self):
+        children = [self._factor()]
+        while self._peek() == "AND":
+            self._next()
+            children.append(self._factor())
+        return children[0] if len(children) == 1 else _And(children)
+
+    def _factor(self):
+        token = self._next()
+        if token == "NOT":
+            return _Not(self._factor())
+        if token == "(":
+            node = self._expr()
+            if self._next() != ")":
+                self._fail()
+            return node
+        if token in _OPERATORS:
+            self._fail()
+        if token[0] in "\"'":
+            return _Term(re.sub(r"\\(.)", r"\1", token[1:-1]))
+        return _Term(token)
+
+
+def parse_expression(text: str):
+    """Parse a trigger expression.
+
+    Terms are words or quoted strings searched as substrings. They are
+    combined with AND, OR, NOT and parentheses, e.g.
+    'ERROR AND NOT "health check"'.
+
+    :param text: the expression.
+    :type text: str
+    :return: the expression tree.
+    :raise ValueError: if the expression is malformed.
+    """
+    return _Parser(str(text)).parse()
+
+
+def _optimize(node):
+    """Simplify an expression tree and order it for early short-circuit.
+
+    Nested junctions of the same kind are flattened and duplicates dropped.
+    Cheap children are evaluated first. Within AND longer terms come first,
+    as they are less likely to match and end the evaluation. Within OR
+    shorter terms come first, as they are more likely to match.
+    """
+    if isinstance(node, _Not):
+        child = _optimize(node.child)
+        if isinstance(child, _Not):
+            return child.child
+        return _Not(child)
+    if not isinstance(node, _Junction):
+        return node
+    children = []
+    seen = set()
+    for child in (_optimize(c) for c in node.children):
+        parts = child.children if type(child) is type(node) else [child]
+        for part in parts:
+            source = part.source()
+            if source not in seen:
+                seen.add(source)
+                children.append(part)
+    sign = -1 if isinstance(node, _And) else 1
+
+    def order(child):
+        length = len(child.text) if isinstance(child, _Term) else 0
+        return child.cost(), sign * length
+
+    children.sort(key=order)
+    if len(children) == 1:
+        return children[0]
+    return type(node)(children)
+
+
+def compile_predicate(
+    triggers: List[str], excludes: List[str] = (), expressions: List[str] = ()
+) -> Callable[[str], bool]:
+    """Compile triggers into a single predicate.
+
+    A line matches if it contains one of the triggers or matches one of the
+    expressions, and contains none of the excludes. Without triggers and
+    expressions no line matches.
+
+    The predicate provides the attributes 'terms', the list of substrings
+    it searches for, and 'evaluate', a function computing the result from
+    a list of flags telling which terms were found. This allows matching
+    text too long to be checked at once.
+
+    :param triggers: substrings to search for.
+    :type triggers: List[str]
+    :param excludes: lines containing one of these substrings are dropped.
+    :type excludes: List[str]
+    :param expressions: trigger expressions, see parse_expression().
+    :type expressions: List[str]
+    :return: the predicate.
+    :rtype: Callable[[str], bool]
+    :raise ValueError: if an expression is malformed.
+    """
+    children = [_Term(str(trigger)) for trigger in triggers]
+    children.extend(parse_expression(expression) for expression in expressions)
+    include = _Or(children)
+    if not include.children:
+        predicate = lambda line: False  # noqa: E731
+        predicate.terms = []
+        predicate.evaluate = lambda found: False
+        return predicate
+    node = include
+    if excludes:
+        exclude = _Or([_Term(str(exclude)) for exclude in excludes])
+        node = _And([include, _Not(exclude)])
+    node = _optimize(node)
+    source = "lambda line: " + node.source()
+    logger.trace("Compiled predicate: {}", source)
+    predicate = eval(compile(source, "<triggers>", "eval"), {})  # pylint: disable=eval-used
+    terms = {}
+    source = "lambda found: " + node.source(terms)
+    predicate.terms = list(terms)
+    predicate.evaluate = eval(compile(source, "<triggers>", "eval"), {})  # pylint: disable=eval-used
+    return predicate
+
+
+def _quote(text: str) -> str:
+    """Quote a substring as a term of a trigger expression."""
+    return '"{}"'.format(re.sub(r'(["\\])', r"\\\1", str(text)))
+
+
+def to_expression(
+    triggers: List[str], excludes: List[str] = (), expressions: List[str] = ()
+) -> str:
+    """Combine triggers, excludes and expressions into a single expression.
+
+    The expression matches the same lines as compile_predicate() with the
+    same arguments. This allows several sets of triggers, each with its own
+    excludes, to be evaluated by one predicate.
+
+    :param triggers: substrings to search for.
+    :type triggers: List[str]
+    :param excludes: lines containing one of these substrings are dropped.
+    :type excludes: List[str]
+    :param expressions: trigger expressions, see parse_expression().
+    :type expressions: List[str]
+    :return: the expression, empty if no line matches.
+    :rtype: str
+    """
+    include = [_quote(trigger) for trigger in triggers]
+    include += ["({})".format(expression) for expression in expressions]
+    if not include:
+        return ""
+    text = "(" + " OR ".join(include) + ")"
+    if excludes:
+        text += " AND NOT (" + " OR ".join(_quote(exclude) for exclude in excludes) + ")"
+    return text
@@ -0,0 +1,89 @@
+# coding=utf-8
+"""Matching lines with their origin."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from pathlib import Path
+from typing import Dict
+
+# pylint: disable=too-few-public-methods
+
+
+class Match:
+    """A matching line with the logfile and byte offset it was read from.
+
+    One instance is created per delivered line, __slots__ keep it small.
+    The logfile and the trigger are references to objects shared by all
+    matches, not copies.
+    """
+
+    __slots__ = ("line", "logfile", "offset", "time", "trigger")
+
+    def __init__(self, line: str, logfile: Path = None, offset: int = None,
+                 read_time: float = None, trigger: str = None):
+        """Initialize instance.
+
+        :param line: the matching line.
+        :type line: str
+        :param logfile: logfile the line was read from.
+        :type logfile: Path
+        :param offset: byte offset of the line in the logfile, None if unknown.
+        :type offset: int
+        :param read_time: time the line was read in seconds since the epoch.
+        :type read_time: float
+        :param trigger: first trigger found in the line, None if it was
+        matched otherwise, e.g. by an expression.
+        :type trigger: str
+        """
+        self.line = line
+        self.logfile = logfile
+        self.offset = offset
+        self.time = read_time
+        self.trigger = trigger
+
+    def __str__(self) -> str:
+        return self.line
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Match):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def _key(self) -> tuple:
+        return self.line, self.logfile, self.offset
+
+    def __repr__(self) -> str:
+        return "Match({!r}, {!r}, {!r})".format(self.line, self.logfile, self.offset)
+
+    def label(self, labels: Dict[Path, str]) -> str:
+        """Label of the logfile of the match.
+
+        :param labels: labels of logfiles, e.g. their keys in the configuration.
+        :type labels: Dict[Path, str]
+        :return: the label, the name of the logfile if it has none.
+        :rtype: str
+        """
+        if self.logfile is None:
+            return ""
+        return labels.get(self.logfile) or Path(self.logfile).name
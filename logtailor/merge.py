@@ -0,0 +1,181 @@
+# coding=utf-8
+"""Timestamp ordered merge of logfiles."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import heapq
+import re
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from .processors import LogProcessor
+from .reader import LineReader
+
+# Timestamps like 2021-04-17 10:15:00.123 or 2021.04.17T10:15:00,123.
+# Custom patterns need the named groups Y, m, d, H, M, S and optionally f.
+TIMESTAMP_PATTERN = (
+    r"(?P<Y>\d{4})[-./](?P<m>\d{2})[-./](?P<d>\d{2})[ T]"
+    r"(?P<H>\d{2}):(?P<M>\d{2}):(?P<S>\d{2})(?:[.,](?P<f>\d{1,9}))?"
+)
+
+REORDER_WINDOW = 2.0  # seconds a line is held back for reordering when tailing.
+
+POLL_INTERVAL = 0.1  # seconds between polls when tailing.
+
+Entry = Tuple[str, int, float, Path, str, Optional[int]]
+
+
+class TimestampParser:
+    """Extract a sortable key from the timestamp of a log line.
+
+    The key is a string of digits, so keys compare like the timestamps
+    without converting them into datetime objects.
+    """
+
+    def __init__(self, pattern: str = TIMESTAMP_PATTERN):
+        """Initialize instance.
+
+        :param pattern: regular expression with named groups Y, m, d, H, M,
+        S and optionally f for fractions of a second.
+        :type pattern: str
+        """
+        self.regex = re.compile(pattern)
+
+    def __call__(self, line: str) -> Optional[str]:
+        """Sortable key of the timestamp in line or None."""
+        match = self.regex.search(line)
+        if match is None:
+            return None
+        parts = match.groupdict()
+        return "{Y}{m}{d}{H}{M}{S}.".format(**parts) + (parts.get("f") or "").ljust(9, "0")
+
+
+class MergingProcessor(LogProcessor):
+    """Process all logfiles and deliver matches ordered by their timestamp.
+
+    History is merged with a streaming k-way merge holding one line per
+    logfile. When tailing, new matches are held back for reorder_window
+    seconds and delivered in timestamp order. Matches without timestamp
+    get the timestamp of the previous match of their logfile.
+    """
+
+    def __init__(self, *args, reorder_window: float = REORDER_WINDOW,
+                 timestamp_pattern: str = TIMESTAMP_PATTERN, **kwargs):
+        """Initialize instance.
+
+        :param reorder_window: seconds to hold back new lines when tailing.
+        :type reorder_window: float
+        :param timestamp_pattern: regular expression matching timestamps.
+        :type timestamp_pattern: str
+        Other parameters see LogProcessor.
+        """
+        super().__init__(*args, **kwargs)
+        self.reorder_window = reorder_window
+        self.timestamp = TimestampParser(timestamp_pattern)
+        self.seq = 0
+        self.last_keys = {}
+
+    def _entry(self, logfile: Path, line: str, offset: int = None) -> Entry:
+        """Create a heap entry for a matching line."""
+        key = self.timestamp(line)
+        if key is None:
+            key = self.last_keys.get(logfile, "")
+        else:
+            self.last_keys[logfile] = key
+        self.seq += 1
+        return key, self.seq, time.monotonic(), logfile, line, offset
+
+    def _matches(self, logfile: Path, reader: LineReader, final: bool) -> Iterator[Entry]:
+        """Yield entries for matching lines up to the current end of logfile.
+
+        Lines are read in batches, so memory is bounded like for the other
+        processors. An incomplete last line is held back unless final.
+        """
+        while True:
+            lines = self._read_batch(logfile, reader)
+            more = len(lines) == self.batch_size
+            if not more and final:
+                lines.extend(reader.flush())
+            yield from self._match_lines(logfile, lines, reader.offsets)
+            if not more:
+                return
+
+    def _match_lines(self, logfile: Path, lines: List[str],
+                     offsets: List[int]) -> List[Entry]:
+        """Entries for the matching lines of a batch."""
+        return [
+            self._entry(logfile, line, offset)
+            for line, offset in self._filter(logfile, lines, offsets)
+        ]
+
+    def _emit(self, entry: Entry):
+        """Store and deliver a match."""
+        if self.store is not None:
+            self.store.add(entry[3], entry[5], entry[4])
+        self._deliver(entry[3], entry[4], entry[5])
+
+    @logger.catch
+    def run(self):
+        """Merge all logfiles."""
+        logger.trace("--> MergingProcessor.run({})", self.logfiles)
+        logfiles = [log for log in self.logfiles if log.exists()]
+        with ExitStack() as stack:
+            files = [
+                (log, LineReader(
+                    stack.enter_context(log.open("rb")), self.encoding,
+                    max_line_length=self.max_line_length
+                ))
+                for log in logfiles
+            ]
+            if self.start_clean:
+                for _, reader in files:
+                    reader.skip_to_end()
+            else:
+                streams = [
+                    self._matches(log, reader, not self.tailing) for log, reader in files
+                ]
+                for entry in heapq.merge(*streams):
+                    if self.cancel.is_set():
+                        return
+                    self._emit(entry)
+            if self.tailing:
+                self._tail(files)
+
+    def _tail(self, files: List[Tuple[Path, LineReader]]):
+        """Read new lines and deliver them after the reorder window."""
+        pending: List[Entry] = []
+        while not self.cancel.is_set():
+            for log, reader in files:
+                for entry in self._matches(log, reader, False):
+                    heapq.heappush(pending, entry)
+            due = time.monotonic() - self.reorder_window
+            while pending and pending[0][2] <= due:
+                entry = heapq.heappop(pending)
+                self._emit(entry)
+            self.cancel.wait(POLL_INTERVAL)
+        while pending:
+            entry = heapq.heappop(pending)
+            self._emit(entry)
+        logger.trace("MergingProcessor canceled -->")
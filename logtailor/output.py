@@ -0,0 +1,284 @@
+# coding=utf-8
+"""Trace file output."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import errno
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = [COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_ZSTD]
+
+SUFFIXES = {COMPRESSION_NONE: "", COMPRESSION_GZIP: ".gz", COMPRESSION_ZSTD: ".zst"}
+
+FLUSH_INTERVAL = 1.0  # seconds between flushes of compressed output.
+
+ROTATED_STAMP = "%Y%m%d-%H%M%S"
+
+COPY_CHUNK = 1 << 20  # bytes per read when data has to pass through Python.
+
+# Errors telling that a kernel copy is not supported for a pair of files.
+UNSUPPORTED = (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EOPNOTSUPP)
+
+
+def write_all(fd: int, data: bytes):
+    """Write all data to a file descriptor."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def copy_range(src: int, dst: int, offset: int, count: int) -> int:
+    """Copy a byte range of one file to the position of another file.
+
+    The data is copied by the kernel with copy_file_range() or sendfile()
+    without passing through Python. If neither supports the pair of files,
+    e.g. a terminal or a file opened for appending, it is read and written.
+
+    :param src: file descriptor to copy from.
+    :type src: int
+    :param dst: file descriptor to copy to.
+    :type dst: int
+    :param offset: start of the range in src.
+    :type offset: int
+    :param count: number of bytes to copy.
+    :type count: int
+    :return: number of bytes copied, less than count if src is shorter.
+    :rtype: int
+    """
+    start, end = offset, offset + count
+    for name in ("copy_file_range", "sendfile"):
+        if not hasattr(os, name):
+            continue
+        try:
+            while offset < end:
+                if name == "copy_file_range":
+                    sent = os.copy_file_range(src, dst, end - offset, offset)
+                else:
+                    sent = os.sendfile(dst, src, offset, end - offset)
+                if not sent:
+                    return offset - start
+                offset += sent
+            return count
+        except OSError as exc:
+            if exc.errno not in UNSUPPORTED:
+                raise
+    while offset < end:
+        data = os.pread(src, min(COPY_CHUNK, end - offset), offset)
+        if not data:
+            break
+        write_all(dst, data)
+        offset += len(data)
+    return offset - start
+
+
+class TraceWriter:
+    """Write the trace file with optional compression and rotation.
+
+    The trace file is rotated when it exceeds max_bytes or is older than
+    rotate_interval seconds. Rotated files get a timestamp in their name,
+    e.g. trace.txt.20210417-101500.gz, and only the newest backups are kept.
+    Closing rotated files and removing old ones is done in a background
+    thread, so writing is not stalled by rotation.
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(
+        self,
+        path: Path,
+        append: bool = False,
+        compression: str = COMPRESSION_NONE,
+        max_bytes: int = 0,
+        rotate_interval: int = 0,
+        backups: int = 5,
+        encoding: str = "utf-8",
+    ):
+        """Initialize instance and open the trace file.
+
+        :param path: path to the trace file without compression suffix.
+        :type path: Path
+        :param append: append to an existing trace file.
+        :type append: bool
+        :param compression: one of 'none', 'gzip' or 'zstd'.
+        :type compression: str
+        :param max_bytes: rotate when the file exceeds this size. 0 disables.
+        :type max_bytes: int
+        :param rotate_interval: rotate after this many seconds. 0 disables.
+        :type rotate_interval: int
+        :param backups: number of rotated files to keep.
+        :type backups: int
+        :param encoding: encoding of the trace file.
+        :type encoding: str
+        :raise ValueError: if the compression is unknown or not available.
+        """
+        compression = compression or COMPRESSION_NONE
+        if compression not in SUFFIXES:
+            raise ValueError("Unknown compression '{}'.".format(compression))
+        if compression == COMPRESSION_ZSTD and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package.")
+        self.base = Path(path)
+        self.compression = compression
+        self.suffix = SUFFIXES[compression]
+        self.path = Path(str(self.base) + self.suffix)
+        self.max_bytes = int(max_bytes or 0)
+        self.rotate_interval = int(rotate_interval or 0)
+        self.backups = int(backups)
+        self.encoding = encoding
+        self.executor = None
+        self.stream = None
+        self.raw = None
+        self.last_flush = time.monotonic()
+        self._open("ab" if append else "wb")
+
+    def _open(self, file_mode: str):
+        """Open the active trace file."""
+        self.raw = open(self.path, file_mode)  # pylint: disable=consider-using-with
+        if self.compression == COMPRESSION_GZIP:
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode=file_mode)
+        elif self.compression == COMPRESSION_ZSTD:
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.raw)
+        else:
+            self.stream = self.raw
+        self.opened = time.time()
+
+    def write(self, text: str):
+        """Write text to the trace file.
+
+        :param text: the text.
+        :type text: str
+        """
+        self.write_bytes(text.encode(self.encoding, "replace"))
+
+    def write_bytes(self, data: bytes):
+        """Write encoded data to the trace file.
+
+        :param data: the data.
+        :type data: bytes
+        """
+        self.stream.write(data)
+        if self.stream is self.raw:
+            self.raw.flush()
+        else:
+            now = time.monotonic()
+            if now - self.last_flush >= FLUSH_INTERVAL:
+                self.stream.flush()
+                self.last_flush = now
+        if self._rotation_due():
+            self.rotate()
+
+    def copy_from(self, fd: int, offset: int, count: int):
+        """Append a byte range of another file to the trace file.
+
+        Without compression the range is copied by the kernel, see copy_range().
+
+        :param fd: file descriptor of the file to copy from.
+        :type fd: int
+        :param offset: start of the range.
+        :type offset: int
+        :param count: number of bytes to copy.
+        :type count: int
+        """
+        if self.stream is not self.raw:
+            end = offset + count
+            while offset < end:
+                data = os.pread(fd, min(COPY_CHUNK, end - offset), offset)
+                if not data:
+                    return
+                self.write_bytes(data)
+                offset += len(data)
+            return
+        self.raw.flush()
+        copy_range(fd, self.raw.fileno(), offset, count)
+        if self._rotation_due():
+            self.rotate()
+
+    def flush(self):
+        """Flush buffered data to the trace file."""
+        self.stream.flush()
+
+    def _rotation_due(self) -> bool:
+        """Check size and age of the active trace file."""
+        if self.max_bytes and self.raw.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self.opened >= self.rotate_interval
+
+    def _rotated_path(self) -> Path:
+        """Unused name for the rotated trace file."""
+        stamp = time.strftime(ROTATED_STAMP)
+        rotated = Path("{}.{}{}".format(self.base, stamp, self.suffix))
+        num = 1
+        while rotated.exists():
+            rotated = Path("{}.{}-{}{}".format(self.base, stamp, num, self.suffix))
+            num += 1
+        return rotated
+
+    def rotate(self):
+        """Move the active trace file aside and start a new one."""
+        rotated = self._rotated_path()
+        self.path.rename(rotated)
+        stream, raw = self.stream, self.raw
+        self._open("wb")
+        logger.trace("Rotated {} to {}", self.path, rotated)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.executor.submit(self._retire, stream, raw)
+
+    @logger.catch
+    def _retire(self, stream, raw):
+        """Close a rotated file and drop backups exceeding the retention count."""
+        stream.close()
+        if not raw.closed:
+            raw.close()
+        pattern = "{}.[0-9]*{}".format(self.base.name, self.suffix)
+        rotated = sorted(
+            self.base.parent.glob(pattern), key=lambda p: (p.stat().st_mtime, p.name)
+        )
+        for path in rotated[:max(len(rotated) - self.backups, 0)]:
+            logger.trace("Remove backup {}", path)
+            path.unlink()
+
+    def close(self):
+        """Close the trace file and wait for pending rotations."""
+        self.stream.close()
+        if not self.raw.closed:
+            self.raw.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,168 @@
+# coding=utf-8
+"""Unfiltered copying of logfiles to the output."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+from pathlib import Path
+from threading import Event, Lock
+from typing import IO, Dict, List
+
+from loguru import logger
+
+from .output import COPY_CHUNK, TraceWriter, copy_range, write_all
+from .processors import ParallelProcessor, POLL_INTERVAL
+
+SCAN_SIZE = 1 << 16  # bytes read at once when searching the last line end.
+
+
+def _line_end(fd: int, start: int, end: int) -> int:
+    """Position after the last newline between start and end, start if none."""
+    while end > start:
+        begin = max(start, end - SCAN_SIZE)
+        pos = os.pread(fd, end - begin, begin).rfind(b"\n")
+        if pos >= 0:
+            return begin + pos + 1
+        end = begin
+    return start
+
+
+class PassthroughProcessor(ParallelProcessor):
+    """Copy the data of the logfiles unchanged to the trace file.
+
+    Used if filtering is disabled. Appended data is not decoded and split
+    into lines but copied by the kernel from the logfile to the trace file
+    and to the console, see copy_range(). While tailing, only complete
+    lines are copied, so lines of different logfiles are not mixed.
+
+    With labels, each line is prefixed with the label of its logfile. The
+    data then passes through Python but is still not decoded.
+    """
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(self, log_files: List[Path], writer: TraceWriter, cancel: Event,
+                 history: bool, tailing: bool, labels: Dict[Path, str] = None,
+                 echo: IO = None, encoding: str = "utf-8"):
+        """Initialize instance.
+
+        :param log_files: logfiles to copy.
+        :type log_files: List[Path]
+        :param writer: the trace file.
+        :type writer: TraceWriter
+        :param cancel: stop copying when set.
+        :type cancel: Event
+        :param history: copy the existing data of the logfiles, too.
+        :type history: bool
+        :param tailing: keep waiting for more data at eof.
+        :type tailing: bool
+        :param labels: prefix lines with the label of their logfile, the name
+        of the logfile if it has none.
+        :type labels: Dict[Path, str]
+        :param echo: also copy the data to this file, e.g. the console.
+        :type echo: IO
+        :param encoding: encoding of the labels.
+        :type encoding: str
+        """
+        super().__init__(log_files, [], None, cancel, history, encoding, tailing)
+        self.filtered = False
+        self.writer = writer
+        self.labels = labels
+        self.echo = echo
+        self.write_lock = Lock()
+
+    def _prefix(self, logfile: Path) -> bytes:
+        """Encoded label of logfile, empty without labels."""
+        if self.labels is None:
+            return b""
+        label = self.labels.get(logfile) or Path(logfile).name
+        return "[{}] ".format(label).encode(self.encoding, "replace")
+
+    def _copy(self, fd: int, offset: int, count: int, prefix: bytes):
+        """Copy a range of complete lines to the outputs."""
+        with self.write_lock:
+            if self.echo is not None:
+                self.echo.flush()
+            if not prefix:
+                self.writer.copy_from(fd, offset, count)
+                if self.echo is not None:
+                    copy_range(fd, self.echo.fileno(), offset, count)
+                return
+            end = offset + count
+            line_start = True
+            while offset < end:
+                data = os.pread(fd, min(COPY_CHUNK, end - offset), offset)
+                if not data:
+                    return
+                offset += len(data)
+                text = data.replace(b"\n", b"\n" + prefix)
+                if data.endswith(b"\n"):
+                    text = text[:-len(prefix)]
+                if line_start:
+                    text = prefix + text
+                line_start = data.endswith(b"\n")
+                self.writer.write_bytes(text)
+                if self.echo is not None:
+                    write_all(self.echo.fileno(), text)
+
+    @logger.catch
+    def _process_logfile(self, logfile: Path, keep_tailing: bool, from_end: bool = None):
+        """Copy one logfile.
+
+        :param logfile: the log file to copy.
+        :type logfile: Path
+        :param keep_tailing: true to keep waiting for more data at eof.
+        :type keep_tailing: bool
+        :param from_end: skip existing data. Default is not history.
+        :type from_end: bool
+        """
+        logger.trace("--> {}.process_logfile({})", self.__class__.__name__, logfile)
+        if not logfile.exists():
+            logger.warning("log {} not found -->", logfile)
+            return
+        prefix = self._prefix(logfile)
+        try:
+            with logfile.open("rb") as f_in:
+                fd = f_in.fileno()
+                pos = 0
+                if self.start_clean if from_end is None else from_end:
+                    logger.info("{}({}) drop history", self.__class__.__name__, logfile)
+                    pos = os.fstat(fd).st_size
+                while not self._stopped(logfile):
+                    size = os.fstat(fd).st_size
+                    # At the end, an incomplete last line is copied, too.
+                    end = _line_end(fd, pos, size) if keep_tailing else size
+                    if end > pos:
+                        self._copy(fd, pos, end - pos, prefix)
+                        pos = end
+                    if not keep_tailing:
+                        break
+                    self.cancel.wait(POLL_INTERVAL)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Copying of logfile {} failed with {}", logfile, exc)
+
+    def run(self):
+        """Copy the logfiles, one after the other unless tailing."""
+        if self.tailing:
+            super().run()
+            return
+        for logfile in self.logfiles:
+            self._process_logfile(logfile, False)
@@ -20,26 +20,87 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import bisect
+import select
 import time
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
 from queue import Queue
-from threading import Event
+from threading import Event, Lock, Thread
 import concurrent
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
 
 from loguru import logger
 
+from .matchers import compile_predicate
+from .matches import Match
+from .records import RecordAssembler
+from .scheduler import FairQueue
+from .reader import (
+    LineReader, LongLine, BATCH_SIZE, MAX_LINE_LENGTH, is_stream, open_stream
+)
+
 # pylint: disable=too-few-public-methods
 
+POLL_INTERVAL = 1.0  # seconds to wait for new data at eof.
+
+
+class Criteria(NamedTuple):
+    """Match criteria of a processor with their compiled predicate.
+
+    The criteria are replaced as a whole, never modified. Readers fetch
+    them once and use them for a complete batch, so a batch is never
+    checked against a mix of old and new criteria.
+    """
+
+    triggers: Tuple[str, ...]
+    excludes: Tuple[str, ...]
+    expressions: Tuple[str, ...]
+    json_filters: Mapping[Path, Callable[[str], bool]]
+    predicate: Callable[[str], bool]
+
+    @classmethod
+    def compile(cls, triggers: List[str], excludes: List[str] = (),
+                expressions: List[str] = (),
+                json_filters: Dict[Path, Callable[[str], bool]] = None) -> "Criteria":
+        """Compile the predicate of the criteria.
+
+        :param triggers: search the logfiles for these triggers.
+        :type triggers: List[str]
+        :param excludes: drop lines containing one of these strings.
+        :type excludes: List[str]
+        :param expressions: trigger expressions combining terms with AND, OR, NOT.
+        :type expressions: List[str]
+        :param json_filters: field filters for logfiles written as JSON lines.
+        :type json_filters: Dict[Path, Callable[[str], bool]]
+        :return: the criteria.
+        :rtype: Criteria
+        :raise ValueError: if an expression is malformed.
+        """
+        return cls(
+            tuple(triggers), tuple(excludes), tuple(expressions),
+            MappingProxyType(dict(json_filters or {})),
+            compile_predicate(triggers, excludes, expressions),
+        )
+
+    def line_predicate(self, logfile: Path) -> Callable[[str], bool]:
+        """Provide the predicate to apply to lines of given logfile.
+
+        Lines of a logfile with a JSON filter are selected by the filter
+        instead of the triggers, so text merely containing a trigger does
+        not match.
+        """
+        return self.json_filters.get(logfile, self.predicate)
+
 
 class LogProcessor(ABC):
     """Process one or more logs."""
     # pylint: disable=too-many-instance-attributes
 
     logfiles: List[Path]
-    triggers: List[str]
+    criteria: Criteria
     cancel: Event
     log_queue: Queue
     start_clean: bool
@@ -54,7 +115,16 @@ class LogProcessor(ABC):
         cancel: Event,
         history: bool,
         encoding: str,
-        tailing: bool = False
+        tailing: bool = False,
+        json_filters: Dict[Path, Callable[[str], bool]] = None,
+        excludes: List[str] = (),
+        expressions: List[str] = (),
+        counter=None,
+        batch_size: int = BATCH_SIZE,
+        max_line_length: int = MAX_LINE_LENGTH,
+        records: Dict[Path, Callable[[], RecordAssembler]] = None,
+        store=None,
+        index=None
     ):
         """Initialize instance.
 
@@ -62,7 +132,8 @@ class LogProcessor(ABC):
         :type log_files: List[Path]
         :param triggers: search the logfiles for these triggers.
         :type triggers: List[str]
-        :param log_queue: deliver filtered lines in this queue.
+        :param log_queue: deliver filtered lines in this queue. A FairQueue
+        delivers the lines of all logfiles in fair shares.
         :type log_queue: Queue
         :param cancel: trigger to cancel logfile processing.
         :type cancel: Event
@@ -72,9 +143,29 @@ class LogProcessor(ABC):
         :type encoding: str
         :param tailing: True to keep reading after eof, waiting for more data.
         :type tailing: bool
+        :param json_filters: field filters for logfiles written as JSON lines.
+        :type json_filters: Dict[Path, Callable[[str], bool]]
+        :param excludes: drop lines containing one of these strings.
+        :type excludes: List[str]
+        :param expressions: trigger expressions combining terms with AND, OR, NOT.
+        :type expressions: List[str]
+        :param counter: count matching lines instead of delivering them.
+        :type counter: TriggerCounter
+        :param batch_size: maximum number of lines read at once.
+        :type batch_size: int
+        :param max_line_length: truncate lines longer than this many bytes.
+        :type max_line_length: int
+        :param records: factories of record assemblers for logfiles with
+        multi-line records.
+        :type records: Dict[Path, Callable[[], RecordAssembler]]
+        :param store: also store matches in this database.
+        :type store: MatchStore
+        :param index: read only the blocks of the history which may contain
+        a trigger according to this index.
+        :type index: BlockIndex
         """
         self.logfiles = log_files
-        self.triggers = triggers
+        self.criteria = Criteria.compile(triggers, excludes, expressions, json_filters)
         self.log_queue = log_queue
         self.cancel = cancel
         self.verbose = False
@@ -82,6 +173,12 @@ class LogProcessor(ABC):
         self.filtered = True
         self.encoding = encoding
         self.tailing = tailing
+        self.counter = counter
+        self.batch_size = batch_size
+        self.max_line_length = max_line_length
+        self.records = records or {}
+        self.store = store
+        self.index = index
         if self.verbose:
             logger.info(
                 "{}({}) Triggers: {}", self.__class__.__name__, log_files, triggers
@@ -91,54 +188,278 @@ class LogProcessor(ABC):
     def run(self):
         """Process log files."""
 
-    def _predicate(self, line: str):
-        """Check line for triggers."""
-        for trigger in self.triggers:
-            if trigger in line:
-                return True
-        return False
+    @property
+    def triggers(self) -> List[str]:
+        """Triggers to search for."""
+        return list(self.criteria.triggers)
+
+    @triggers.setter
+    def triggers(self, triggers: List[str]):
+        """Set triggers and compile the predicate."""
+        criteria = self.criteria
+        self.criteria = Criteria.compile(
+            triggers, criteria.excludes, criteria.expressions, criteria.json_filters
+        )
+
+    @property
+    def excludes(self) -> List[str]:
+        """Drop lines containing one of these strings."""
+        return list(self.criteria.excludes)
+
+    @excludes.setter
+    def excludes(self, excludes: List[str]):
+        """Set excludes and compile the predicate."""
+        criteria = self.criteria
+        self.criteria = Criteria.compile(
+            criteria.triggers, excludes, criteria.expressions, criteria.json_filters
+        )
+
+    @property
+    def expressions(self) -> List[str]:
+        """Trigger expressions."""
+        return list(self.criteria.expressions)
+
+    @expressions.setter
+    def expressions(self, expressions: List[str]):
+        """Set expressions and compile the predicate."""
+        criteria = self.criteria
+        self.criteria = Criteria.compile(
+            criteria.triggers, criteria.excludes, expressions, criteria.json_filters
+        )
+
+    @property
+    def json_filters(self) -> Mapping[Path, Callable[[str], bool]]:
+        """Field filters for logfiles written as JSON lines."""
+        return self.criteria.json_filters
+
+    @json_filters.setter
+    def json_filters(self, json_filters: Dict[Path, Callable[[str], bool]]):
+        """Set the JSON filters."""
+        self.criteria = self.criteria._replace(
+            json_filters=MappingProxyType(dict(json_filters or {}))
+        )
+
+    @property
+    def _predicate(self) -> Callable[[str], bool]:
+        """Predicate of the triggers, excludes and expressions."""
+        return self.criteria.predicate
+
+    def update_triggers(
+        self,
+        triggers: List[str],
+        excludes: List[str] = (),
+        expressions: List[str] = (),
+        json_filters: Dict[Path, Callable[[str], bool]] = None,
+    ):
+        """Replace the match criteria of the running processor.
+
+        The new predicate is compiled before it replaces the old one. Lines
+        are checked against the new criteria starting with the next read.
+
+        :param triggers: search the logfiles for these triggers.
+        :type triggers: List[str]
+        :param excludes: drop lines containing one of these strings.
+        :type excludes: List[str]
+        :param expressions: trigger expressions combining terms with AND, OR, NOT.
+        :type expressions: List[str]
+        :param json_filters: field filters for logfiles written as JSON lines.
+        :type json_filters: Dict[Path, Callable[[str], bool]]
+        :raise ValueError: if an expression is malformed.
+        """
+        self.criteria = Criteria.compile(triggers, excludes, expressions, json_filters)
+        logger.info("{} triggers updated: {}", self.__class__.__name__, triggers)
+
+    def update_logfiles(self, log_files: List[Path]):
+        """Replace the logfiles of the running processor.
+
+        Only supported by processors tailing logfiles in parallel.
+
+        :param log_files: logfiles to process.
+        :type log_files: List[Path]
+        """
+        if set(log_files) != set(self.logfiles):
+            logger.warning("{} cannot change logfiles while running",
+                           self.__class__.__name__)
+
+    def _line_predicate(self, logfile: Path, criteria: Criteria) -> Callable[[str], bool]:
+        """Provide the predicate of criteria to apply to lines of given logfile."""
+        return criteria.line_predicate(logfile)
+
+    def _deliver(self, logfile: Path, line: str, offset: int = None):
+        """Deliver a matching line to the queue or count it in summary mode.
+
+        Lines are delivered as Match with their logfile, byte offset, the
+        time they were read and the first trigger they contain.
+        """
+        if self.counter is not None:
+            self.counter.count(logfile, line)
+            return
+        logger.trace("Put: >{}<", line)
+        triggers = self.criteria.triggers
+        trigger = next((trigger for trigger in triggers if trigger in line), None)
+        self._put(logfile, Match(line, logfile, offset, time.time(), trigger))
+        time.sleep(0.0001)
+
+    def _put(self, logfile: Path, item):
+        """Put item into the queue, into the share of logfile if it is fair."""
+        if isinstance(self.log_queue, FairQueue):
+            self.log_queue.put(item, source=logfile)
+        else:
+            self.log_queue.put(item)
+
+    def _filter(self, logfile: Path, lines: List[str],
+                offsets: List[int] = None) -> Iterator[Tuple[str, Optional[int]]]:
+        """Yield the matching lines of a batch with their byte offsets."""
+        criteria = self.criteria
+        predicate = self._line_predicate(logfile, criteria)
+        for num, line in enumerate(lines):
+            if isinstance(line, LongLine):
+                # Matched against the triggers while it was read. Truncated
+                # JSON cannot be parsed and never matches a JSON filter.
+                matched = not self.filtered or (
+                    line.matched and logfile not in criteria.json_filters
+                )
+            else:
+                line = line.strip()
+                logger.trace("Read: >{}<", line)
+                matched = not self.filtered or predicate(line)
+            if matched:
+                yield line, offsets[num] if offsets else None
+
+    def _process_lines(self, logfile: Path, lines: List[str], offsets: List[int] = None):
+        """Deliver the matching lines of a batch.
+
+        Matches are stored with their byte offsets if a store is configured.
+        """
+        store = self.store
+        for line, offset in self._filter(logfile, lines, offsets):
+            if store is not None:
+                store.add(logfile, offset, line)
+            self._deliver(logfile, line, offset)
+
+    def _read_batch(self, logfile: Path, reader: LineReader) -> List[str]:  # pylint: disable=unused-argument
+        """Read the next batch of lines of logfile."""
+        return reader.read_lines(self.batch_size, self._predicate)
+
+    def _process_indexed(self, logfile: Path, reader: LineReader):
+        """Process the indexed history of logfile.
+
+        Only blocks which may contain a trigger are read. Afterwards reader
+        is positioned at the end of the indexed data. Nothing is done if the
+        index cannot be used for the criteria or the logfile.
+        """
+        criteria = self.criteria
+        if not self.filtered or criteria.expressions or logfile in criteria.json_filters \
+                or logfile in self.records:
+            return
+        found = self.index.candidates(logfile, list(criteria.triggers), self.encoding)
+        if found is None:
+            return
+        blocks, indexed = found
+        logger.info("{}({}) reading {} indexed blocks", self.__class__.__name__,
+                    logfile, len(blocks))
+        for start, end in blocks:
+            reader.seek(start)
+            while not self._stopped(logfile):
+                lines = self._read_batch(logfile, reader)
+                count = bisect.bisect_left(reader.offsets, end)
+                self._process_lines(logfile, lines[:count], reader.offsets[:count])
+                if count < len(lines) or len(lines) < self.batch_size:
+                    break
+        reader.seek(indexed)
+
+    def _stopped(self, logfile: Path) -> bool:  # pylint: disable=unused-argument
+        """Check whether processing of logfile shall stop."""
+        return self.cancel.is_set()
 
     @logger.catch
-    def _process_logfile(self, logfile: Path, keep_tailing: bool):
+    def _process_logfile(self, logfile: Path, keep_tailing: bool, from_end: bool = None):
         """Process one logfile.
 
         :param logfile: the log file to process.
         :type logfile: Path
         :param keep_tailing: true to keep waiting for more data at eof.
         :type keep_tailing: bool
+        :param from_end: skip existing lines. Default is not history.
+        :type from_end: bool
         """
         logger.trace("--> {}.process_logfile({})", self.__class__.__name__, logfile)
-        if not logfile.exists():
+        stream = is_stream(logfile)
+        if not stream and not logfile.exists():
             logger.warning("log {} not found -->", logfile)
             return
         try:
-            with logfile.open("r", encoding=self.encoding) as f_in:
-                if self.start_clean:
-                    # read and drop existing lines
-                    logger.info("{}({}) drop history", self.__class__.__name__, logfile)
-                    f_in.readlines()
-                while True:
-                    if self.cancel.is_set():
-                        logger.trace(
-                            "{}({}) canceled -->", self.__class__.__name__, logfile
-                        )
-                        return
-                    for line in f_in.readlines():
-                        line = line.strip()
-                        logger.trace("Read: >{}<", line)
-                        if not self.filtered or self._predicate(line):
-                            logger.trace("Put: >{}<", line)
-                            self.log_queue.put(line)
-                            time.sleep(0.0001)
-                    if not keep_tailing:
-                        logger.trace(
-                            "{}({}) finished -->", self.__class__.__name__, logfile
-                        )
-                        return
-                    time.sleep(1)
+            with open_stream(logfile) if stream else logfile.open("rb") as f_in:
+                reader = LineReader(
+                    f_in, self.encoding, max_line_length=self.max_line_length
+                )
+                if not stream:
+                    self._process_history(logfile, reader, from_end)
+                self._process_new_lines(logfile, f_in, reader, stream, keep_tailing)
         except Exception as exc:  # pylint: disable=broad-except
             logger.error("Processing of logfile {} failed with {}", logfile, exc)
 
+    def _process_history(self, logfile: Path, reader: LineReader, from_end: bool = None):
+        """Skip the existing lines of logfile or process them using the index."""
+        if self.start_clean if from_end is None else from_end:
+            # skip existing lines
+            logger.info("{}({}) drop history", self.__class__.__name__, logfile)
+            reader.skip_to_end()
+        elif self.index is not None:
+            self._process_indexed(logfile, reader)
+
+    # pylint: disable=too-many-arguments
+    def _process_new_lines(self, logfile: Path, f_in, reader: LineReader, stream: bool,
+                           keep_tailing: bool):
+        """Read and process batches until the logfile ends or processing stops."""
+        assembler = self.records[logfile]() if logfile in self.records else None
+        more = False
+        while not self._stopped(logfile):
+            if stream and not more:
+                # Wake up as soon as data arrives. A named pipe
+                # without writer yet is not ready.
+                if not select.select([f_in], [], [], POLL_INTERVAL)[0]:
+                    continue
+            lines = self._read_batch(logfile, reader)
+            more = len(lines) == self.batch_size
+            if stream:
+                # A stream ends when the writer closes it.
+                ended = reader.eof and not reader.would_block
+            else:
+                ended = not keep_tailing
+            if not more and ended:
+                lines.extend(reader.flush())
+            offsets = reader.offsets
+            if assembler is not None:
+                lines, offsets = _assemble(assembler, lines, offsets, more, ended)
+            self._process_lines(logfile, lines, offsets)
+            if more:
+                continue
+            if ended:
+                logger.trace("{}({}) finished -->", self.__class__.__name__, logfile)
+                return
+            if not stream:
+                self.cancel.wait(POLL_INTERVAL)
+        if assembler is not None:
+            self._process_lines(logfile, *assembler.flush())
+        logger.trace("{}({}) canceled -->", self.__class__.__name__, logfile)
+
+
+def _assemble(assembler: RecordAssembler, lines: List[str], offsets: List[int],
+              more: bool, ended: bool) -> Tuple[List[str], List[int]]:
+    """Group the lines of a batch into records with their offsets.
+
+    Unless more lines are available, the last record is completed once its
+    timeout expired or the logfile ended.
+    """
+    lines, offsets = assembler.feed(lines, offsets)
+    if not more:
+        # While tailing the last record waits for its timeout.
+        last, last_offsets = assembler.flush(force=ended)
+        lines.extend(last)
+        offsets.extend(last_offsets)
+    return lines, offsets
+
 
 class SerialProcessor(LogProcessor):
     """Process one log after the other"""
@@ -151,23 +472,84 @@ class SerialProcessor(LogProcessor):
 
 
 class ParallelProcessor(LogProcessor):
-    """Processes all logfiles in parallel."""
+    """Processes all logfiles in parallel.
+
+    Each logfile is processed in its own thread, as it is tailed until the
+    processor stops. Logfiles may be attached and detached while running.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize instance. Parameters see LogProcessor."""
+        super().__init__(*args, **kwargs)
+        self.lock = Lock()
+        self.running = False
+        self.futures = {}
+        self.detached = set()
+
+    def _stopped(self, logfile: Path) -> bool:
+        """Check whether processing of logfile shall stop."""
+        return self.cancel.is_set() or logfile in self.detached
+
+    def _start(self, logfile: Path, from_end: bool = None):
+        """Start processing of logfile in a new thread. Caller holds the lock."""
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def work():
+            try:
+                future.set_result(self._process_logfile(logfile, self.tailing, from_end))
+            except BaseException as exc:  # pylint: disable=broad-except
+                future.set_exception(exc)
+
+        self.futures[logfile] = future
+        Thread(target=work, name="logtailor {}".format(logfile), daemon=True).start()
+
+    def update_logfiles(self, log_files: List[Path]):
+        """Attach new and detach removed logfiles.
+
+        Logfiles processed before keep their position. Attached logfiles
+        are read from their end, detached ones are closed.
+
+        :param log_files: logfiles to process.
+        :type log_files: List[Path]
+        """
+        with self.lock:
+            for log in set(self.logfiles) - set(log_files):
+                logger.info("ParallelProcessor --> detach {}", log)
+                self.detached.add(log)
+            for log in log_files:
+                if log in self.detached:
+                    self.detached.discard(log)
+                    if not self.futures[log].done():
+                        continue
+                elif log in self.futures and not self.futures[log].done():
+                    continue
+                if self.running:
+                    logger.info("ParallelProcessor --> attach {}", log)
+                    self._start(log, from_end=True)
+            self.logfiles = list(log_files)
 
     @logger.catch
     def run(self):
         """Processes all logfiles in parallel."""
         logger.trace("--> ParallelProcessor.run({})", self.logfiles)
-        num_workers = len(self.logfiles)
-        if not num_workers:
+        if not self.logfiles:
             return
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            future_log = {
-                executor.submit(self._process_logfile, log, self.tailing): log
-                for log in self.logfiles
-            }
-            logger.info("ParallelProcessor --> workers started: {}", future_log)
-            for future in concurrent.futures.as_completed(future_log):
-                log = future_log[future]
+        with self.lock:
+            self.running = True
+            for log in self.logfiles:
+                self._start(log)
+            logger.info("ParallelProcessor --> workers started: {}", self.futures)
+        while True:
+            with self.lock:
+                pending = [f for f in self.futures.values() if not f.done()]
+                if not pending:
+                    # Logfiles attached from now on are not started.
+                    self.running = False
+                    break
+            concurrent.futures.wait(pending, timeout=1)
+        with self.lock:
+            for log, future in self.futures.items():
                 try:
                     future.result()
                 except Exception as exc:  # pylint: disable=broad-except
@@ -0,0 +1,130 @@
+# coding=utf-8
+"""Trigger profiles routing matches to their own outputs."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from .matchers import compile_predicate, to_expression
+
+# pylint: disable=too-few-public-methods
+
+PROFILE_KEYS = ("triggers", "excludes", "expressions", "output")
+
+
+class Profile:
+    """Named set of triggers, excludes and expressions with its own output."""
+
+    def __init__(self, name: str, triggers: List[str], excludes: List[str] = (),
+                 expressions: List[str] = (), output: Path = None):
+        """Initialize instance.
+
+        :param name: name of the profile.
+        :type name: str
+        :param triggers: substrings to search for.
+        :type triggers: List[str]
+        :param excludes: lines containing one of these substrings are dropped.
+        :type excludes: List[str]
+        :param expressions: trigger expressions.
+        :type expressions: List[str]
+        :param output: path to the output of the profile, default is <name>.txt.
+        :type output: Path
+        :raise ValueError: if an expression is malformed.
+        """
+        self.name = name
+        self.triggers = list(triggers)
+        self.excludes = list(excludes)
+        self.expressions = list(expressions)
+        self.output = Path(output) if output else Path("{}.txt".format(name))
+        self.predicate = compile_predicate(self.triggers, self.excludes, self.expressions)
+
+    @property
+    def expression(self) -> str:
+        """Single expression matching the lines of the profile.
+
+        :return: the expression, empty if no line matches.
+        :rtype: str
+        """
+        return to_expression(self.triggers, self.excludes, self.expressions)
+
+
+class _Outputs:
+    """Write to several outputs at once."""
+
+    def __init__(self, outputs: list):
+        self.outputs = outputs
+
+    def write(self, text: str):
+        """Write text to all outputs."""
+        for output in self.outputs:
+            output.write(text)
+
+
+class ProfileRouter:
+    """Write each line to the outputs of all profiles it matches.
+
+    The processors match a line if it matches one of the profiles or the
+    regular triggers, see union(). The router is called with the regular
+    output and a matched line, finds the profiles it belongs to and writes
+    it once to all their outputs. Lines matching no profile were matched by
+    the regular triggers or a JSON filter and go to the regular output.
+    """
+
+    def __init__(self, predicate: Callable[[str], bool],
+                 routes: List[Tuple[Callable[[str], bool], object]],
+                 write: Callable):
+        """Initialize instance.
+
+        :param predicate: predicate of the regular triggers.
+        :type predicate: Callable[[str], bool]
+        :param routes: predicate and output of each profile.
+        :type routes: List[Tuple[Callable[[str], bool], object]]
+        :param write: function writing a line to an output.
+        :type write: Callable
+        """
+        self.predicate = predicate
+        self.routes = routes
+        self.write = write
+
+    def __call__(self, f_out, line: str):
+        """Write line to the matching outputs.
+
+        :param f_out: the regular output.
+        :param line: the matched line.
+        :type line: Union[str, Match]
+        """
+        text = str(line)
+        outputs = [output for predicate, output in self.routes if predicate(text)]
+        if not outputs or self.predicate(text):
+            outputs.insert(0, f_out)
+        self.write(outputs[0] if len(outputs) == 1 else _Outputs(outputs), line)
+
+
+def union(profiles: List[Profile]) -> List[str]:
+    """Expressions matching a line if one of the profiles matches it.
+
+    :param profiles: the profiles.
+    :type profiles: List[Profile]
+    :return: one expression per profile matching any line.
+    :rtype: List[str]
+    """
+    return [profile.expression for profile in profiles if profile.expression]
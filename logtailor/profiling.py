@@ -0,0 +1,213 @@
+# coding=utf-8
+"""Profiling of the processing stages."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import functools
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List
+
+SAMPLE_INTERVAL = 0.005  # seconds between two samples of all threads.
+
+TOP_FUNCTIONS = 15  # functions listed in the report of the sampler.
+
+STAGES = ("read", "match", "deliver", "write")
+
+# Methods of the log processors implementing the stages. The merging
+# processor matches batches in _match_lines instead of _process_lines.
+PROBES = {
+    "_read_batch": "read",
+    "_process_lines": "match",
+    "_match_lines": "match",
+    "_deliver": "deliver",
+}
+
+
+class StageProfiler:
+    """Record wall clock and CPU time per processing stage and logfile.
+
+    Stages are measured by wrapping the functions implementing them, see
+    instrument(). Unless profiling is requested nothing is wrapped, so
+    there is no cost at all when it is off.
+
+    read: reading and decoding a batch of lines.
+    match: checking lines against the filter, delivery excluded.
+    deliver: putting matches into the queue, including waits while the
+    queue is full, or counting them in summary mode.
+    write: writing a line to the output.
+    """
+
+    def __init__(self):
+        # (stage, key) -> [calls, wall, cpu]
+        self.stats: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        self.started = time.perf_counter()
+        self.local = threading.local()
+
+    def wrap(self, stage: str, func: Callable, key: str = None) -> Callable:
+        """Measure each call of func.
+
+        :param stage: name of the stage.
+        :type stage: str
+        :param func: function to measure.
+        :type func: Callable
+        :param key: key of the measurement. Default is the first argument of
+        the call, i.e. the logfile.
+        :type key: str
+        :return: the wrapped function.
+        :rtype: Callable
+        """
+        stats = self.stats
+        local = self.local
+
+        @functools.wraps(func)
+        def measured(*args, **kwargs):
+            # Time of measured calls nested in this one, e.g. delivery
+            # called from matching, is counted for the nested stage only.
+            outer = getattr(local, "nested", None)
+            nested = local.nested = [0.0, 0.0]
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall = time.perf_counter() - wall
+                cpu = time.thread_time() - cpu
+                local.nested = outer
+                if outer is not None:
+                    outer[0] += wall
+                    outer[1] += cpu
+                entry = stats[stage, args[0] if key is None else key]
+                entry[0] += 1
+                entry[1] += wall - nested[0]
+                entry[2] += cpu - nested[1]
+
+        return measured
+
+    def instrument(self, processor):
+        """Measure the stages of a log processor.
+
+        :param processor: the processor.
+        :type processor: LogProcessor
+        """
+        for name, stage in PROBES.items():
+            method = getattr(processor, name, None)
+            if method is not None:
+                setattr(processor, name, self.wrap(stage, method))
+
+    def report(self) -> str:
+        """Summarize the measurements.
+
+        :return: table of calls, wall and CPU time per stage and logfile.
+        :rtype: str
+        """
+        stats = {key: list(value) for key, value in self.stats.items()}
+        lines = [
+            "Profile of {:.1f}s run time".format(time.perf_counter() - self.started),
+            "{:8s} {:>10s} {:>10s} {:>10s}  {}".format(
+                "stage", "calls", "wall [s]", "cpu [s]", "source"
+            ),
+        ]
+        order = {stage: num for num, stage in enumerate(STAGES)}
+        for stage, key in sorted(stats, key=lambda sk: (order.get(sk[0]), str(sk[1]))):
+            calls, wall, cpu = stats[stage, key]
+            lines.append("{:8s} {:10d} {:10.3f} {:10.3f}  {}".format(
+                stage, calls, wall, cpu, key
+            ))
+        return "\n".join(lines) + "\n"
+
+
+class Sampler:
+    """Sampling profiler for all threads of the process.
+
+    A background thread records the call stacks of all other threads in
+    regular intervals. Functions running while many samples were taken
+    are where the time goes.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """Initialize instance.
+
+        :param interval: seconds between two samples.
+        :type interval: float
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+
+    def start(self):
+        """Start sampling."""
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{}:{}:{}".format(
+                        Path(code.co_filename).name, code.co_firstlineno, code.co_name
+                    ))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def write(self, path: Path):
+        """Write the samples as collapsed stacks, e.g. for flame graphs.
+
+        :param path: the output file.
+        :type path: Path
+        """
+        with open(path, "w") as f_out:
+            for stack, count in self.stacks.most_common():
+                f_out.write("{} {}\n".format(";".join(stack), count))
+
+    def report(self, top: int = TOP_FUNCTIONS) -> str:
+        """Summarize the samples.
+
+        :param top: number of functions to list.
+        :type top: int
+        :return: functions with the most samples, own and including callees.
+        :rtype: str
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        samples = sum(self.stacks.values()) or 1
+        lines = ["{:>7s} {:>7s}  {}".format("own %", "total %", "function")]
+        for function, count in own.most_common(top):
+            lines.append("{:7.1f} {:7.1f}  {}".format(
+                100.0 * count / samples, 100.0 * total[function] / samples, function
+            ))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,311 @@
+# coding=utf-8
+"""Bounded reading of logfiles."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import codecs
+import io
+import os
+import stat
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, List
+
+CHUNK_SIZE = 64 * 1024  # bytes read from a logfile at once.
+
+BATCH_SIZE = 1000  # lines handed out at once.
+
+MAX_LINE_LENGTH = 1024 * 1024  # bytes of a line kept in memory.
+
+STDIN = "-"  # name of the logfile reading standard input.
+
+TRUNCATED = " [... {} bytes truncated]"
+
+
+class LongLine(str):
+    """Line exceeding the maximum line length, truncated with a marker.
+
+    matched tells whether the complete line matched the predicate.
+    """
+
+    matched = False
+
+
+class _LongLineScanner:
+    """Match a line too long to be kept in memory piece by piece.
+
+    The line is decoded incrementally. Each piece is searched for the terms
+    of the predicate together with the end of the previous piece, so terms
+    spanning two pieces are found.
+    """
+
+    def __init__(self, head: bytes, encoding: str, predicate: Callable = None,
+                 offset: int = 0):
+        self.head = head
+        self.offset = offset
+        self.encoding = encoding
+        self.predicate = predicate
+        self.length = 0
+        self.decoder = codecs.getincrementaldecoder(encoding)("replace")
+        self.terms = getattr(predicate, "terms", [])
+        self.found = [False] * len(self.terms)
+        self.overlap = max((len(term) for term in self.terms), default=1) - 1
+        self.carry = ""
+
+    def feed(self, data):
+        """Scan the next piece of the line."""
+        self.length += len(data)
+        if self.terms:
+            self._scan(self.decoder.decode(data))
+
+    def _scan(self, text: str):
+        text = self.carry + text
+        for num, term in enumerate(self.terms):
+            if not self.found[num] and term in text:
+                self.found[num] = True
+        self.carry = text[-self.overlap:] if self.overlap else ""
+
+    def finish(self) -> LongLine:
+        """Complete the line.
+
+        :return: the truncated line.
+        :rtype: LongLine
+        """
+        if self.terms:
+            self._scan(self.decoder.decode(b"", True))
+        head = self.head.decode(self.encoding, "replace")
+        line = LongLine(head + TRUNCATED.format(self.length - len(self.head)))
+        if self.predicate is not None:
+            line.matched = self.predicate.evaluate(self.found)
+        return line
+
+
+class LineReader:
+    """Read lines from a binary file in chunks of fixed size.
+
+    Chunks are read into a buffer which is reused for all reads. Only
+    complete lines are returned; an incomplete last line is kept until the
+    rest of it has been written, or returned by flush().
+
+    Lines longer than max_line_length bytes are returned as LongLine,
+    truncated with a marker. Only their beginning is kept in memory, the
+    rest is matched against the predicate while it is read.
+
+    After each read, offsets holds the byte offsets of the returned lines.
+    """
+
+    def __init__(self, f_in: BinaryIO, encoding: str, chunk_size: int = CHUNK_SIZE,
+                 max_line_length: int = MAX_LINE_LENGTH):
+        """Initialize instance.
+
+        :param f_in: file opened in binary mode.
+        :type f_in: BinaryIO
+        :param encoding: encoding of the file.
+        :type encoding: str
+        :param chunk_size: bytes read at once.
+        :type chunk_size: int
+        :param max_line_length: lines longer than this are truncated.
+        :type max_line_length: int
+        """
+        self.f_in = f_in
+        self.encoding = encoding
+        self.chunk = bytearray(chunk_size)
+        self.view = memoryview(self.chunk)
+        self.pending = bytearray()
+        self.pos = 0
+        self.base = 0  # offset of pending[0] in the file.
+        self.offsets: List[int] = []
+        self.eof = False
+        self.would_block = False
+        self.max_line_length = max_line_length
+        self.scanner = None
+
+    def skip_to_end(self):
+        """Skip all data written so far."""
+        self.seek(0, 2)
+
+    def seek(self, offset: int, whence: int = 0):
+        """Continue reading at offset, see io.IOBase.seek()."""
+        self.base = self.f_in.seek(offset, whence)
+        del self.pending[:]
+        self.pos = 0
+        self.scanner = None
+
+    def _read_chunk(self) -> int:
+        """Read the next chunk into the buffer.
+
+        :return: number of bytes read, 0 at end of file.
+        """
+        num = self.f_in.readinto(self.chunk)
+        # Non-blocking streams return None if no data is available.
+        self.would_block = num is None
+        self.eof = not num
+        return num or 0
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the pending data.
+
+        :return: False at end of file.
+        """
+        if self.pos:
+            del self.pending[:self.pos]
+            self.base += self.pos
+            self.pos = 0
+        num = self._read_chunk()
+        if not num:
+            return False
+        self.pending += self.view[:num]
+        return True
+
+    def _start_long_line(self, end: int, predicate: Callable):
+        """Hand the pending part of a long line up to end to a scanner."""
+        head = bytes(self.pending[self.pos:self.pos + self.max_line_length])
+        self.scanner = _LongLineScanner(
+            head, self.encoding, predicate, self.base + self.pos
+        )
+        self.scanner.feed(self._pending_view(end))
+
+    def _pending_view(self, end: int) -> memoryview:
+        """Pending data from current position up to end."""
+        return memoryview(self.pending)[self.pos:end]
+
+    def _continue_long_line(self) -> LongLine:
+        """Scan the rest of a long line.
+
+        :return: the line or None if the end of the line was not yet written.
+        """
+        while True:
+            num = self._read_chunk()
+            if not num:
+                return None
+            end = self.chunk.find(b"\n", 0, num)
+            if end < 0:
+                self.scanner.feed(self.view[:num])
+                continue
+            self.scanner.feed(self.view[:end])
+            self.pending += self.view[end + 1:num]
+            self.base = self.scanner.offset + self.scanner.length + 1
+            line, self.scanner = self.scanner.finish(), None
+            return line
+
+    def read_lines(self, max_lines: int = BATCH_SIZE, predicate: Callable = None) -> List[str]:
+        """Read up to max_lines complete lines.
+
+        Fewer lines are returned at end of file, see eof.
+
+        :param max_lines: maximum number of lines to return.
+        :type max_lines: int
+        :param predicate: predicate for long lines, see compile_predicate().
+        :type predicate: Callable[[str], bool]
+        :return: lines without line end.
+        :rtype: List[str]
+        """
+        lines = []
+        offsets = self.offsets = []
+        pending = self.pending
+        search = self.pos
+        while len(lines) < max_lines:
+            if self.scanner is not None:
+                offset = self.scanner.offset
+                line = self._continue_long_line()
+                if line is None:
+                    break
+                offsets.append(offset)
+                lines.append(line)
+                search = self.pos
+                continue
+            end = pending.find(b"\n", search)
+            if end < 0:
+                if len(pending) - self.pos > self.max_line_length:
+                    self._start_long_line(len(pending), predicate)
+                    self.base += len(pending)
+                    del pending[:]
+                    self.pos = 0
+                    continue
+                scanned = len(pending) - self.pos
+                if not self._fill():
+                    break
+                search = scanned
+                continue
+            offsets.append(self.base + self.pos)
+            if end - self.pos > self.max_line_length:
+                self._start_long_line(end, predicate)
+                lines.append(self.scanner.finish())
+                self.scanner = None
+            else:
+                lines.append(pending[self.pos:end].decode(self.encoding, "replace"))
+            self.pos = search = end + 1
+        return lines
+
+    def flush(self) -> List[str]:
+        """Return the incomplete last line, if any.
+
+        Its offset is appended to offsets.
+        """
+        if self.scanner is not None:
+            self.offsets.append(self.scanner.offset)
+            self.base = self.scanner.offset + self.scanner.length
+            line, self.scanner = self.scanner.finish(), None
+            return [line]
+        if self.pos >= len(self.pending):
+            return []
+        self.offsets.append(self.base + self.pos)
+        line = self.pending[self.pos:].decode(self.encoding, "replace")
+        self.base += len(self.pending)
+        del self.pending[:]
+        self.pos = 0
+        return [line]
+
+
+def is_stream(logfile: Path) -> bool:
+    """Check whether logfile is standard input or a named pipe."""
+    if str(logfile) == STDIN:
+        return True
+    try:
+        return stat.S_ISFIFO(os.stat(str(logfile)).st_mode)
+    except (OSError, ValueError):
+        return False
+
+
+@contextmanager
+def open_stream(logfile: Path) -> Iterator[io.FileIO]:
+    """Open standard input or a named pipe for non-blocking reads.
+
+    Opening a named pipe does not wait for a writer. Standard input is
+    switched back to blocking mode when the stream is closed.
+
+    :param logfile: '-' for standard input or the path of a named pipe.
+    :type logfile: Path
+    :return: context manager providing the stream in binary mode. Reads
+    return None if no data is available.
+    :rtype: Iterator[io.FileIO]
+    """
+    if str(logfile) == STDIN:
+        fd = os.dup(sys.stdin.fileno())
+    else:
+        fd = os.open(str(logfile), os.O_RDONLY | os.O_NONBLOCK)
+    os.set_blocking(fd, False)
+    with io.FileIO(fd, "rb") as f_in:
+        try:
+            yield f_in
+        finally:
+            os.set_blocking(fd, True)
@@ -0,0 +1,105 @@
+# coding=utf-8
+"""Assembly of multi-line records."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import re
+import time
+from typing import List, Pattern, Tuple, Union
+
+MAX_RECORD_LINES = 200  # lines per record, further lines start a new record.
+
+RECORD_TIMEOUT = 1.0  # seconds to wait for more lines of the last record.
+
+
+class RecordAssembler:
+    """Group continuation lines with the line starting their record.
+
+    A record starts with a line matching the start pattern, e.g. a leading
+    timestamp. All following lines not matching it, e.g. the lines of a
+    stack trace, belong to the same record. Records are returned as a
+    single string with the lines separated by newlines.
+
+    A record is complete when the next record starts or when it reaches
+    max_lines. While tailing, the last record is completed if no lines
+    were added for timeout seconds.
+    """
+
+    def __init__(self, start: Union[str, Pattern], max_lines: int = MAX_RECORD_LINES,
+                 timeout: float = RECORD_TIMEOUT):
+        """Initialize instance.
+
+        :param start: regular expression matching the first line of a record.
+        :type start: Union[str, Pattern]
+        :param max_lines: maximum number of lines per record.
+        :type max_lines: int
+        :param timeout: seconds after which the last record is complete.
+        :type timeout: float
+        :raise re.error: if start is not a valid regular expression.
+        """
+        self.start = re.compile(start)
+        self.max_lines = max_lines
+        self.timeout = timeout
+        self.lines = []
+        self.offset = None
+        self.updated = 0.0
+
+    def _pop(self) -> str:
+        record = "\n".join(self.lines)
+        self.lines = []
+        return record
+
+    def feed(self, lines: List[str], offsets: List[int] = None) -> Tuple[List[str], List[int]]:
+        """Add lines.
+
+        :param lines: lines without line end.
+        :type lines: List[str]
+        :param offsets: byte offsets of the lines.
+        :type offsets: List[int]
+        :return: the completed records and their offsets.
+        :rtype: Tuple[List[str], List[int]]
+        """
+        records = []
+        record_offsets = []
+        for num, line in enumerate(lines):
+            if self.lines and (self.start.match(line) or len(self.lines) >= self.max_lines):
+                record_offsets.append(self.offset)
+                records.append(self._pop())
+            if not self.lines:
+                self.offset = offsets[num] if offsets else None
+            self.lines.append(line)
+        if lines:
+            self.updated = time.monotonic()
+        return records, record_offsets
+
+    def flush(self, force: bool = True) -> Tuple[List[str], List[int]]:
+        """Complete the last record.
+
+        :param force: complete it regardless of the timeout.
+        :type force: bool
+        :return: the record if it is complete and its offset.
+        :rtype: Tuple[List[str], List[int]]
+        """
+        if not self.lines:
+            return [], []
+        if not force and time.monotonic() - self.updated < self.timeout:
+            return [], []
+        return [self._pop()], [self.offset]
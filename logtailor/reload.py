@@ -0,0 +1,93 @@
+# coding=utf-8
+"""Reload of the configuration file."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import signal
+from pathlib import Path
+from threading import Event
+from typing import Callable
+
+from loguru import logger
+
+WATCH_INTERVAL = 1.0  # seconds between checks of the configuration file.
+
+
+class ConfigWatcher:
+    """Call a function when the configuration file changed or on SIGHUP."""
+
+    def __init__(self, path: Path, on_change: Callable[[], None], cancel: Event,
+                 interval: float = WATCH_INTERVAL):
+        """Initialize instance.
+
+        :param path: the configuration file.
+        :type path: Path
+        :param on_change: called to reload the configuration.
+        :type on_change: Callable[[], None]
+        :param cancel: stop watching.
+        :type cancel: Event
+        :param interval: seconds between checks of the configuration file.
+        :type interval: float
+        """
+        self.path = Path(path)
+        self.on_change = on_change
+        self.cancel = cancel
+        self.interval = interval
+        self.requested = Event()
+        self.stamp = self._stamp()
+
+    def _stamp(self):
+        """Modification time and size of the configuration file."""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def request(self, *_):
+        """Request a reload. Safe to be used as signal handler."""
+        self.requested.set()
+
+    def install_signal_handler(self):
+        """Reload on SIGHUP. Must be called from the main thread."""
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.request)
+
+    def check(self) -> bool:
+        """Reload if requested or the configuration file changed.
+
+        :return: True if the configuration was reloaded.
+        :rtype: bool
+        """
+        stamp = self._stamp()
+        if not self.requested.is_set() and stamp == self.stamp:
+            return False
+        self.requested.clear()
+        self.stamp = stamp
+        logger.info("Reload configuration {}", self.path)
+        self.on_change()
+        return True
+
+    @logger.catch
+    def run(self):
+        """Watch the configuration file until canceled."""
+        while not self.cancel.wait(self.interval):
+            self.check()
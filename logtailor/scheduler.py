@@ -0,0 +1,115 @@
+# coding=utf-8
+"""Fair scheduling of matches of several logfiles."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from collections import deque
+from queue import Full, Queue
+from typing import Dict, Hashable
+
+DEFAULT_WEIGHT = 1  # lines per round of logfiles without priority.
+
+
+class FairQueue(Queue):
+    """Queue delivering the lines of several logfiles in fair shares.
+
+    Each source, usually a logfile, has its own sub-queue holding at most
+    maxsize lines. A source filling its sub-queue blocks only itself, the
+    other sources can still put their lines.
+
+    Lines are taken by weighted round robin: in its turn a source delivers
+    up to its weight lines, then the next source with pending lines follows.
+    A line of a quiet source therefore waits for at most one turn of each
+    other source instead of behind all lines of a flooding one.
+
+    Lines put without source share the sub-queue of source None.
+    """
+
+    def __init__(self, maxsize: int = 0, weights: Dict[Hashable, int] = None):
+        """Initialize instance.
+
+        :param maxsize: maximum number of lines per source, 0 is unbounded.
+        :type maxsize: int
+        :param weights: lines per turn of each source, default is 1.
+        :type weights: Dict[Hashable, int]
+        """
+        self.weights = dict(weights or {})
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.queues = {}
+        self.active = deque()  # sources with pending lines in turn order.
+        self.turn = 0  # lines left in the turn of the first active source.
+        self.size = 0
+
+    def _qsize(self):
+        return self.size
+
+    def _full(self, source) -> bool:
+        pending = self.queues.get(source)
+        return 0 < self.maxsize <= len(pending or ())
+
+    def put(self, item, block=True, timeout=None, source=None):
+        """Put a line into the sub-queue of its source.
+
+        :param item: the line.
+        :param block: wait for free space if the sub-queue is full.
+        :type block: bool
+        :param timeout: seconds to wait for free space, None waits forever.
+        :type timeout: float
+        :param source: the source of the line, usually its logfile.
+        :type source: Hashable
+        :raise queue.Full: if no space became free.
+        """
+        with self.not_full:
+            if not self.not_full.wait_for(lambda: not self._full(source),
+                                          timeout if block else 0):
+                raise Full
+            self._put((source, item))
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _put(self, item):
+        source, line = item
+        pending = self.queues.get(source)
+        if not pending:
+            pending = self.queues[source] = deque()
+            self.active.append(source)
+        pending.append(line)
+        self.size += 1
+
+    def _get(self):
+        source = self.active[0]
+        if self.turn <= 0:
+            self.turn = self.weights.get(source, DEFAULT_WEIGHT)
+        pending = self.queues[source]
+        item = pending.popleft()
+        self.size -= 1
+        self.turn -= 1
+        if not pending:
+            del self.queues[source]
+            self.active.popleft()
+            self.turn = 0
+        elif self.turn <= 0:
+            self.active.rotate(-1)
+        # Producers wait for different sub-queues, wake all of them.
+        self.not_full.notify_all()
+        return item
@@ -0,0 +1,376 @@
+# coding=utf-8
+"""Shared tail session served over a Unix domain socket."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+from pathlib import Path
+from queue import Queue, Empty, Full
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterator, List
+
+from loguru import logger
+
+from .matchers import compile_predicate
+from .processors import Criteria, ParallelProcessor
+
+# pylint: disable=too-few-public-methods
+
+MAX_CLIENT_BUFFER = 10000  # lines buffered per client before dropping.
+
+POLL_INTERVAL = 0.1  # seconds between checks for cancellation.
+
+
+class Subscriber:
+    """A client connected to the tail server.
+
+    Lines are buffered in a bounded queue. If the client does not keep up,
+    new lines are dropped and the number of dropped lines is reported to
+    the client as soon as it catches up.
+    """
+
+    def __init__(self, predicate: Callable[[str], bool] = None,
+                 buffer_size: int = MAX_CLIENT_BUFFER):
+        """Initialize instance.
+
+        :param predicate: extra triggers of the client, None for none.
+        :type predicate: Callable[[str], bool]
+        :param buffer_size: maximum number of buffered lines.
+        :type buffer_size: int
+        """
+        self.predicate = predicate
+        self.buffer = Queue(buffer_size)
+        self.dropped = 0
+
+    def offer(self, line: str):
+        """Buffer line without blocking. Drop it if the buffer is full."""
+        try:
+            self.buffer.put_nowait(line)
+        except Full:
+            self.dropped += 1
+
+    def take(self, timeout: float) -> List[str]:
+        """Take buffered lines, waiting up to timeout for the first one."""
+        lines = []
+        try:
+            lines.append(self.buffer.get(timeout=timeout))
+            while True:
+                lines.append(self.buffer.get_nowait())
+        except Empty:
+            pass
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.append("[logtailor] {} lines dropped".format(dropped))
+        return lines
+
+
+class TailServer:
+    """Publish matches of a single tail session to local clients.
+
+    Clients connect to a Unix domain socket and send one line of JSON with
+    their extra 'triggers', 'excludes' and 'expressions' (or an empty line).
+    They receive all lines matching the configured triggers, plus the lines
+    matching their own triggers.
+    """
+
+    def __init__(self, path: Path, log_queue: Queue, cancel: Event,
+                 buffer_size: int = MAX_CLIENT_BUFFER):
+        """Initialize instance.
+
+        :param path: path of the Unix domain socket.
+        :type path: Path
+        :param log_queue: queue of (is_base_match, line) tuples.
+        :type log_queue: Queue
+        :param cancel: stop serving.
+        :type cancel: Event
+        :param buffer_size: maximum number of buffered lines per client.
+        :type buffer_size: int
+        :raise ValueError: if path exists and is not a socket or another
+        server is listening on it.
+        """
+        self.path = Path(path)
+        _stale_socket(self.path)
+        self.log_queue = log_queue
+        self.cancel = cancel
+        self.buffer_size = buffer_size
+        self.lock = Lock()
+        self.subscribers: List[Subscriber] = []
+        self.extras: List[Callable[[str], bool]] = []
+
+    def subscribe(self, request: Dict[str, List[str]]) -> Subscriber:
+        """Register a client.
+
+        :param request: extra 'triggers', 'excludes' and 'expressions'.
+        :type request: Dict[str, List[str]]
+        :return: the subscriber.
+        :rtype: Subscriber
+        :raise ValueError: if an expression is malformed.
+        """
+        predicate = None
+        if request.get("triggers") or request.get("expressions"):
+            predicate = compile_predicate(
+                request.get("triggers", []),
+                request.get("excludes", []),
+                request.get("expressions", []),
+            )
+        subscriber = Subscriber(predicate, self.buffer_size)
+        with self.lock:
+            self.subscribers = self.subscribers + [subscriber]
+            self._update_extras()
+        logger.info("Client subscribed: {}", request)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a client."""
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscriber]
+            self._update_extras()
+        logger.info("Client unsubscribed")
+
+    def _update_extras(self):
+        """Collect extra predicates of all clients. Lists are replaced, never
+        modified, so readers can use them without locking."""
+        self.extras = [s.predicate for s in self.subscribers if s.predicate is not None]
+
+    def publish(self, is_base: bool, line: str):
+        """Hand line to all clients interested in it."""
+        for subscriber in self.subscribers:
+            if is_base or (subscriber.predicate is not None and subscriber.predicate(line)):
+                subscriber.offer(line)
+
+    @logger.catch
+    def run(self):
+        """Serve clients and publish lines until canceled."""
+        if _stale_socket(self.path):
+            self.path.unlink()
+        server = _UnixServer(str(self.path), _SubscriptionHandler)
+        server.tail_server = self
+        thread = Thread(target=server.serve_forever, args=(POLL_INTERVAL,), daemon=True)
+        thread.start()
+        logger.info("Serving on {}", self.path)
+        try:
+            while not (self.cancel.is_set() and self.log_queue.empty()):
+                try:
+                    is_base, line = self.log_queue.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    continue
+                self.publish(is_base, line)
+                self.log_queue.task_done()
+        finally:
+            server.shutdown()
+            server.server_close()
+            if _is_socket(self.path):
+                self.path.unlink()
+            logger.trace("TailServer.run() --> canceled")
+
+
+def _is_socket(path: Path) -> bool:
+    """Check whether path is a Unix domain socket."""
+    try:
+        return stat.S_ISSOCK(path.lstat().st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def _stale_socket(path: Path) -> bool:
+    """Check whether path is a socket left behind by a server which is gone.
+
+    :param path: path of the Unix domain socket.
+    :type path: Path
+    :return: True if the socket may be removed, False if path does not exist.
+    :rtype: bool
+    :raise ValueError: if path is not a socket or a server is listening on it.
+    """
+    if not _is_socket(path):
+        if os.path.lexists(path):
+            raise ValueError("{} exists and is not a socket.".format(path))
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.fspath(path))
+    except OSError as exc:
+        if exc.errno == errno.ECONNREFUSED:
+            return True
+        raise ValueError("Cannot check socket {}: {}".format(path, exc)) from exc
+    finally:
+        sock.close()
+    raise ValueError("Another server is already serving on {}.".format(path))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix domain socket server."""
+
+    daemon_threads = True
+    tail_server: TailServer
+
+
+class _SubscriptionHandler(socketserver.StreamRequestHandler):
+    """Serve one client."""
+
+    def handle(self):
+        tail_server = self.server.tail_server
+        raw = self.rfile.readline()
+        if not raw:
+            # Closed without a request, e.g. by a server checking the path.
+            return
+        request = raw.decode("utf-8").strip()
+        try:
+            subscriber = tail_server.subscribe(json.loads(request) if request else {})
+        except ValueError as exc:
+            self.wfile.write("[logtailor] {}\n".format(exc).encode("utf-8"))
+            return
+        try:
+            while not tail_server.cancel.is_set():
+                lines = subscriber.take(POLL_INTERVAL)
+                if lines:
+                    self.wfile.write("".join(ln + "\n" for ln in lines).encode("utf-8"))
+        except OSError:
+            pass
+        finally:
+            tail_server.unsubscribe(subscriber)
+
+
+class PublishingProcessor(ParallelProcessor):
+    """Process logfiles in parallel for a TailServer.
+
+    Lines matching the configured triggers or the extra triggers of any
+    client are put into the queue as (is_base_match, line) tuples.
+    """
+
+    server: TailServer
+
+    def __init__(self, server: TailServer, *args, **kwargs):
+        """Initialize instance.
+
+        :param server: the server publishing the lines.
+        :type server: TailServer
+        Other parameters see LogProcessor.
+        """
+        super().__init__(*args, **kwargs)
+        self.server = server
+        self.base_predicates: Dict[Path, Callable[[str], bool]] = {}
+
+    def _line_predicate(self, logfile: Path, criteria: Criteria) -> Callable[[str], bool]:
+        """Extend the predicate with the extra triggers of all clients."""
+        base = super()._line_predicate(logfile, criteria)
+        self.base_predicates[logfile] = base
+        extras = self.server.extras
+        if not extras:
+            return base
+        return lambda line: base(line) or any(extra(line) for extra in extras)
+
+    def _is_base(self, logfile: Path, line: str) -> bool:
+        """Check whether line matches the configured triggers."""
+        if not self.filtered or not self.server.extras:
+            return True
+        return self.base_predicates[logfile](line)
+
+    def _process_lines(self, logfile: Path, lines: List[str], offsets: List[int] = None):
+        """Publish the matching lines of a batch.
+
+        Only lines matching the configured triggers are stored, not those
+        matched by the extra triggers of a client.
+        """
+        store = self.store
+        for line, offset in self._filter(logfile, lines, offsets):
+            is_base = self._is_base(logfile, line)
+            if is_base and store is not None:
+                store.add(logfile, offset, line)
+            self._put(logfile, (is_base, line))
+
+    def _deliver(self, logfile: Path, line: str, offset: int = None):  # pylint: disable=unused-argument
+        """Deliver line with a flag telling whether it matched the triggers."""
+        self._put(logfile, (self._is_base(logfile, line), line))
+
+
+def _connect(path: Path, request: Dict[str, List[str]]) -> socket.socket:
+    """Connect to a tail server and send the subscription request."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.fspath(path))
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def subscribe(path: Path, triggers: List[str] = (), excludes: List[str] = (),
+              expressions: List[str] = ()) -> Iterator[str]:
+    """Connect to a tail server and yield the lines it publishes.
+
+    :param path: path of the Unix domain socket.
+    :type path: Path
+    :param triggers: extra triggers evaluated by the server.
+    :type triggers: List[str]
+    :param excludes: excludes applied to the extra triggers.
+    :type excludes: List[str]
+    :param expressions: extra trigger expressions evaluated by the server.
+    :type expressions: List[str]
+    :return: iterator over published lines.
+    :rtype: Iterator[str]
+    """
+    request = {
+        "triggers": list(triggers),
+        "excludes": list(excludes),
+        "expressions": list(expressions),
+    }
+    with _connect(path, request) as sock:
+        with sock.makefile("r", encoding="utf-8") as f_in:
+            for line in f_in:
+                yield line.rstrip("\n")
+
+
+@logger.catch
+def render_subscription(path: Path, request: Dict[str, List[str]], f_out,
+                        cancel: Event, write):
+    """Render lines published by a tail server until canceled.
+
+    :param path: path of the Unix domain socket.
+    :type path: Path
+    :param request: extra 'triggers', 'excludes' and 'expressions'.
+    :type request: Dict[str, List[str]]
+    :param f_out: output file.
+    :param cancel: stop rendering.
+    :type cancel: Event
+    :param write: function writing a line to f_out.
+    """
+    logger.trace("render_subscription() started")
+    with _connect(path, request) as sock:
+        sock.settimeout(POLL_INTERVAL)
+        pending = b""
+        while not cancel.is_set():
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not data:
+                logger.info("Server closed connection")
+                break
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                write(f_out, line.decode("utf-8", "replace"))
+    logger.trace("render_subscription() --> canceled")
@@ -0,0 +1,203 @@
+# coding=utf-8
+"""Store matches in an SQLite database."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import re
+import sqlite3
+import time
+from pathlib import Path
+from queue import Queue, Empty
+from threading import Event
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from .matchers import compile_predicate
+from .merge import TIMESTAMP_PATTERN
+
+BATCH_SIZE = 10000  # matches inserted in one transaction.
+
+FLUSH_INTERVAL = 1.0  # seconds a match waits at most before it is inserted.
+
+MAX_QUEUE_SIZE = 100000  # matches waiting to be inserted.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    time TEXT NOT NULL,
+    source TEXT NOT NULL,
+    offset INTEGER,
+    trigger TEXT,
+    line TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_time ON matches (time);
+CREATE INDEX IF NOT EXISTS matches_trigger ON matches (trigger, time);
+"""
+
+INSERT = "INSERT INTO matches (time, source, offset, trigger, line) VALUES (?, ?, ?, ?, ?)"
+
+
+class MatchStore:
+    """Store matches in an SQLite database for later queries.
+
+    Each match is stored with its timestamp, the key of its logfile, its
+    byte offset in the logfile, the first trigger or expression it matches
+    and the line. The timestamp is taken from the line, lines without
+    timestamp get the time they were read. Times are stored as
+    'YYYY-MM-DD HH:MM:SS.ffffff', so SQLite's date functions apply.
+
+    add() only puts the match into a queue. A background thread inserts
+    the matches in large transactions, so the processors are not slowed
+    down by the database.
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(
+        self,
+        path: Path,
+        sources: Dict[Path, str] = None,
+        triggers: List[str] = (),
+        excludes: List[str] = (),
+        expressions: List[str] = (),
+        timestamp_pattern: str = TIMESTAMP_PATTERN,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        """Initialize instance.
+
+        :param path: the database file. It is created if it does not exist.
+        :type path: Path
+        :param sources: keys of configured logfiles. Other logfiles are
+        stored with their path.
+        :type sources: Dict[Path, str]
+        :param triggers: triggers recorded for the matches.
+        :type triggers: List[str]
+        :param excludes: excludes of the triggers.
+        :type excludes: List[str]
+        :param expressions: expressions recorded for the matches.
+        :type expressions: List[str]
+        :param timestamp_pattern: regular expression matching timestamps.
+        :type timestamp_pattern: str
+        :param batch_size: maximum number of matches per transaction.
+        :type batch_size: int
+        :param flush_interval: maximum seconds before a match is inserted.
+        :type flush_interval: float
+        """
+        self.path = path
+        self.sources = {Path(log): key for log, key in (sources or {}).items()}
+        self.timestamp = re.compile(timestamp_pattern)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(MAX_QUEUE_SIZE)
+        self.stop = Event()
+        self.labels = []
+        self.update_triggers(triggers, excludes, expressions)
+        # Fail early on an unusable database.
+        self._connect().close()
+
+    def update_triggers(
+        self, triggers: List[str], excludes: List[str] = (), expressions: List[str] = ()
+    ):
+        """Replace the triggers recorded for the matches.
+
+        :param triggers: triggers recorded for the matches.
+        :type triggers: List[str]
+        :param excludes: excludes of the triggers.
+        :type excludes: List[str]
+        :param expressions: expressions recorded for the matches.
+        :type expressions: List[str]
+        :raise ValueError: if an expression is malformed.
+        """
+        self.labels = [
+            (str(trigger), compile_predicate([trigger], excludes)) for trigger in triggers
+        ] + [
+            (str(expression), compile_predicate([], excludes, [expression]))
+            for expression in expressions
+        ]
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.path))
+        # Allow queries while matches are inserted.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def add(self, logfile: Path, offset: Optional[int], line: str):
+        """Queue a match for insertion.
+
+        :param logfile: the logfile the line was read from.
+        :type logfile: Path
+        :param offset: byte offset of the line in the logfile.
+        :type offset: int
+        :param line: the line.
+        :type line: str
+        """
+        self.queue.put((logfile, offset, line, time.time()))
+
+    def _row(self, logfile: Path, offset: Optional[int], line: str, read: float) -> tuple:
+        """Create the database row of a match."""
+        match = self.timestamp.search(line)
+        if match is None:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(read))
+            fraction = "{:06d}".format(int(read % 1 * 1000000))
+        else:
+            parts = match.groupdict()
+            stamp = "{Y}-{m}-{d} {H}:{M}:{S}".format(**parts)
+            fraction = (parts.get("f") or "")[:6].ljust(6, "0")
+        trigger = next((label for label, matches in self.labels if matches(line)), None)
+        source = self.sources.get(logfile, str(logfile))
+        return stamp + "." + fraction, source, offset, trigger, line
+
+    def _take(self) -> List[tuple]:
+        """Take the next batch of matches from the queue."""
+        rows = []
+        deadline = None
+        while len(rows) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(self._row(*self.queue.get(timeout=timeout)))
+            except Empty:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return rows
+
+    @logger.catch
+    def run(self):
+        """Insert queued matches until closed."""
+        connection = self._connect()
+        try:
+            while not (self.stop.is_set() and self.queue.empty()):
+                rows = self._take()
+                if rows:
+                    with connection:
+                        connection.executemany(INSERT, rows)
+                    logger.trace("MatchStore inserted {} matches", len(rows))
+        finally:
+            connection.close()
+
+    def close(self):
+        """Stop run() after the queued matches are inserted."""
+        self.stop.set()
@@ -0,0 +1,168 @@
+# coding=utf-8
+"""Trigger statistics."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import time
+from collections import Counter
+from pathlib import Path
+from threading import Event, Lock
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from .matchers import compile_predicate
+
+TOTAL = "total"
+
+
+class TriggerCounter:
+    """Count matching lines per logfile and trigger in fixed time buckets.
+
+    Each line passing the processor's predicate is counted as 'total'.
+    Additionally it is counted for each trigger and expression it matches.
+    """
+
+    def __init__(
+        self,
+        triggers: List[str],
+        excludes: List[str] = (),
+        expressions: List[str] = (),
+        interval: int = 60,
+    ):
+        """Initialize instance.
+
+        :param triggers: count lines containing these triggers.
+        :type triggers: List[str]
+        :param excludes: lines containing one of these strings are not counted.
+        :type excludes: List[str]
+        :param expressions: count lines matching these expressions.
+        :type expressions: List[str]
+        :param interval: length of a time bucket in seconds.
+        :type interval: int
+        """
+        self.interval = interval
+        self.labels = []
+        self.update_triggers(triggers, excludes, expressions)
+        self.buckets: Dict[int, Counter] = {}
+        self.lock = Lock()
+
+    def update_triggers(
+        self, triggers: List[str], excludes: List[str] = (), expressions: List[str] = ()
+    ):
+        """Replace the triggers lines are counted for.
+
+        :param triggers: count lines containing these triggers.
+        :type triggers: List[str]
+        :param excludes: lines containing one of these strings are not counted.
+        :type excludes: List[str]
+        :param expressions: count lines matching these expressions.
+        :type expressions: List[str]
+        :raise ValueError: if an expression is malformed.
+        """
+        self.labels = [
+            (str(trigger), compile_predicate([trigger], excludes)) for trigger in triggers
+        ] + [
+            (str(expression), compile_predicate([], excludes, [expression]))
+            for expression in expressions
+        ]
+
+    def _bucket(self, timestamp: float) -> int:
+        """Start of the bucket containing timestamp."""
+        return int(timestamp // self.interval) * self.interval
+
+    def count(self, logfile: Path, line: str, timestamp: float = None):
+        """Count a matching line.
+
+        :param logfile: the logfile the line was read from.
+        :type logfile: Path
+        :param line: the line.
+        :type line: str
+        :param timestamp: time the line was read. Default is now.
+        :type timestamp: float
+        """
+        keys = [(str(logfile), TOTAL)]
+        keys.extend((str(logfile), label) for label, matches in self.labels if matches(line))
+        bucket = self._bucket(time.time() if timestamp is None else timestamp)
+        with self.lock:
+            counter = self.buckets.get(bucket)
+            if counter is None:
+                counter = self.buckets[bucket] = Counter()
+            counter.update(keys)
+
+    def collect(self, final: bool = False, now: float = None) -> List[Tuple[int, Counter]]:
+        """Remove and return completed buckets.
+
+        :param final: also return the current, incomplete bucket.
+        :type final: bool
+        :param now: current time. Default is now.
+        :type now: float
+        :return: list of (bucket start, counts) tuples, oldest first.
+        :rtype: List[Tuple[int, Counter]]
+        """
+        current = self._bucket(time.time() if now is None else now)
+        with self.lock:
+            done = sorted(b for b in self.buckets if final or b < current)
+            return [(bucket, self.buckets.pop(bucket)) for bucket in done]
+
+
+def format_summary(bucket: int, counts: Counter) -> List[str]:
+    """Format the counts of a bucket, one line per logfile.
+
+    :param bucket: start of the bucket.
+    :type bucket: int
+    :param counts: counts per (logfile, label).
+    :type counts: Counter
+    :return: summary lines.
+    :rtype: List[str]
+    """
+    stamp = time.strftime("%Y.%m.%d %H:%M:%S", time.localtime(bucket))
+    per_file: Dict[str, List[str]] = {}
+    for (logfile, label), count in counts.items():
+        per_file.setdefault(logfile, []).append((label != TOTAL, label, count))
+    return [
+        "{} {} {}".format(
+            stamp, logfile, " ".join("{}={}".format(l, c) for _, l, c in sorted(items))
+        )
+        for logfile, items in sorted(per_file.items())
+    ]
+
+
+@logger.catch
+def render_summary(counter: TriggerCounter, f_out, cancel: Event, write):
+    """Periodically render the completed buckets of counter.
+
+    :param counter: the counter.
+    :type counter: TriggerCounter
+    :param f_out: output file.
+    :param cancel: stop rendering. Buckets not yet complete are rendered then.
+    :type cancel: Event
+    :param write: function writing a line to f_out.
+    """
+    logger.trace("render_summary() started")
+    while not cancel.wait(1):
+        for bucket, counts in counter.collect():
+            for line in format_summary(bucket, counts):
+                write(f_out, line)
+    for bucket, counts in counter.collect(final=True):
+        for line in format_summary(bucket, counts):
+            write(f_out, line)
+    logger.trace("render_summary() --> canceled")
@@ -20,6 +20,7 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import io
 from queue import Queue
 from threading import Event
 
@@ -70,7 +71,10 @@ class PathM:
     # pylint: disable=no-self-use
     # pylint: disable=too-many-arguments
     def open(self, mode="r", buffering=-1, encoding=None, errors=None, newline=None):
-        return self
+        text = "".join(line + "\n" for line in self.text_to_provide)
+        if "b" in mode:
+            return io.BytesIO(text.encode(encoding or "utf-8"))
+        return io.StringIO(text)
 
     def exists(self):
         return True
@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Test asyncio interface."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import asyncio
+
+import pytest
+
+from logtailor import aio
+from logtailor.matches import Match
+
+
+def collect(files, **kwargs):
+    """Collect all matches without following."""
+
+    async def run():
+        return [m async for m in aio.aiter_matches(files, follow=False, **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_history(tmp_path, monkeypatch):
+    """Lines spanning chunks and a last line without newline are found."""
+    monkeypatch.setattr(aio, "CHUNK_SIZE", 8)
+    log = tmp_path / "app.log"
+    log.write_text("INFO start\nERROR long line\nERROR last")
+    assert collect([log], triggers=["ERROR"]) == [
+        Match("ERROR long line", log, 11),
+        Match("ERROR last", log, 27),
+    ]
+
+
+def test_long_lines_are_truncated(tmp_path, monkeypatch):
+    """Long lines are truncated and matched while they are read."""
+    monkeypatch.setattr(aio, "CHUNK_SIZE", 8)
+    log = tmp_path / "app.log"
+    log.write_text("x" * 100 + " ERROR\nERROR short\n" + "y" * 50)
+    matches = collect([log], triggers=["ERROR"], max_line_length=12)
+    assert [match.line for match in matches] == [
+        "xxxxxxxxxxxx [... 94 bytes truncated]", "ERROR short"
+    ]
+    assert [match.offset for match in matches] == [0, 107]
+
+
+def test_follow_and_cancel(tmp_path):
+    """New lines are delivered, cancellation closes the iterator."""
+    logs = [tmp_path / "a.log", tmp_path / "b.log"]
+    for log in logs:
+        log.write_text("old ERROR\n")
+
+    async def run():
+        received = []
+
+        async def consume():
+            async for match in aio.aiter_matches(logs, ["ERROR"], history=False,
+                                                 poll_interval=0.05):
+                received.append(match.line)
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)
+        with logs[1].open("a") as f_out:
+            f_out.write("new ERROR\n")
+        for _ in range(100):
+            if received:
+                break
+            await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return received
+
+    assert asyncio.run(run()) == ["new ERROR"]
@@ -0,0 +1,102 @@
+# coding=utf-8
+"""Test library interface."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+
+import logtailor
+from logtailor.matches import Match
+
+
+def test_iter_matches_with_offsets(tmp_path):
+    """Matches carry logfile and byte offset."""
+    log = tmp_path / "app.log"
+    log.write_bytes(b"INFO start\nERROR \xc3\xa4\nERROR skip\nERROR last")
+    matches = list(logtailor.iter_matches([log], ["ERROR"], ["skip"]))
+    assert matches == [
+        logtailor.Match("ERROR ä", log, 11),
+        logtailor.Match("ERROR last", log, 31),
+    ]
+
+
+def test_iter_matches_stops_early(tmp_path):
+    """The caller may stop before all lines are read."""
+    logs = [tmp_path / "a.log", tmp_path / "b.log"]
+    for log in logs:
+        log.write_text("line\n" * 100)
+    matches = logtailor.iter_matches(logs, filtered=False)
+    assert next(matches).offset == 0
+    assert next(matches).offset == 5
+    matches.close()
+
+
+def test_iter_matches_follow(tmp_path):
+    """Following waits for complete lines."""
+    log = tmp_path / "app.log"
+    log.write_text("old ERROR\n")
+    matches = logtailor.iter_matches([log], ["ERROR"], history=False, follow=True,
+                                     poll_interval=0.01)
+    with log.open("a") as f_out:
+        f_out.write("new ERROR\npartial ERROR")
+    assert next(matches) == logtailor.Match("new ERROR", log, 10)
+    with log.open("a") as f_out:
+        f_out.write(" done\n")
+    assert next(matches) == logtailor.Match("partial ERROR done", log, 20)
+    matches.close()
+
+
+def test_iter_matches_yields_processor_matches(tmp_path):
+    """The API and the processors deliver the same Match type."""
+    log = tmp_path / "app.log"
+    log.write_text("ERROR\n")
+    match = next(logtailor.iter_matches([log], ["ERROR"]))
+    assert logtailor.Match is Match
+    assert str(match) == "ERROR" and match.label({}) == "app.log"
+    assert match != Match("ERROR", log, 1)
+
+
+def test_iter_matches_truncates_long_lines(tmp_path):
+    """Long lines are truncated and still matched completely."""
+    log = tmp_path / "app.log"
+    log.write_text("x" * 100 + " ERROR\nshort\n")
+    matches = list(logtailor.iter_matches([log], ["ERROR"], max_line_length=10))
+    assert [match.line for match in matches] == ["xxxxxxxxxx [... 96 bytes truncated]"]
+    assert matches[0].offset == 0
+
+
+def test_iter_matches_opens_logfiles_lazily(tmp_path):
+    """An iterator closed before the first next() leaves no logfile open."""
+    log = tmp_path / "app.log"
+    log.write_text("ERROR\n")
+
+    def open_logfiles():
+        fds = os.listdir("/proc/self/fd")
+        return [fd for fd in fds if os.path.realpath("/proc/self/fd/" + fd) == os.path.realpath(log)]
+
+    matches = logtailor.iter_matches([log], ["ERROR"])
+    assert not open_logfiles()
+    matches.close()
+    matches = logtailor.iter_matches([log], ["ERROR"], follow=True)
+    assert next(matches).line == "ERROR"
+    assert open_logfiles()
+    matches.close()
+    assert not open_logfiles()
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Test the block index."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from queue import Queue
+
+from logtailor import index
+
+
+def write_log(path, lines):
+    with open(str(path), "a") as f_out:
+        f_out.write("".join(line + "\n" for line in lines))
+
+
+def test_trigrams():
+    """Trigrams are taken from the words."""
+    assert index.trigrams(b"abcd ab abc") == {b"abc", b"bcd"}
+
+
+def test_candidates_and_incremental_update(tmp_path, monkeypatch):
+    """Only blocks containing the trigrams of a trigger are candidates."""
+    monkeypatch.setattr(index, "BLOCK_SIZE", 64)
+    log = tmp_path / "app.log"
+    write_log(log, ["info request {}".format(num) for num in range(20)] + ["payment failed"])
+    block_index = index.BlockIndex(tmp_path / "index")
+    size = log.stat().st_size
+    assert block_index.update(log) == size
+    blocks, indexed = block_index.candidates(log, ["payment"], "utf-8")
+    assert indexed == size
+    assert len(blocks) == 1 and blocks[0][1] == size
+    assert block_index.candidates(log, ["a"], "utf-8") is None
+    write_log(log, ["payment failed again"])
+    assert block_index.update(log) == 21
+    blocks, indexed = block_index.candidates(log, ["payment"], "utf-8")
+    assert blocks[-1][1] == indexed == size + 21
+
+
+def test_replaced_logfile_is_reindexed(tmp_path):
+    """A replaced logfile is not searched with the old index."""
+    log = tmp_path / "app.log"
+    write_log(log, ["old content"])
+    block_index = index.BlockIndex(tmp_path / "index")
+    block_index.update(log)
+    log.write_text("new\n")
+    assert block_index.candidates(log, ["new"], "utf-8") is None
+    assert block_index.update(log) == 4
+    assert block_index.candidates(log, ["new"], "utf-8") == ([(0, 4)], 4)
+
+
+def test_processor_reads_indexed_blocks(ser_processor, tmp_path, monkeypatch):
+    """The processor finds matches in the indexed blocks and after them."""
+    monkeypatch.setattr(index, "BLOCK_SIZE", 64)
+    log = tmp_path / "app.log"
+    write_log(log, ["info request {}".format(num) for num in range(20)] + ["payment 1"])
+    ser_processor.index = index.BlockIndex(tmp_path / "index")
+    ser_processor.index.update(log)
+    write_log(log, ["payment 2"])
+    queue = Queue()
+    ser_processor.logfiles = [log]
+    ser_processor.triggers = ["payment"]
+    ser_processor.start_clean = False
+    ser_processor.log_queue = queue
+    ser_processor.run()
+    assert [queue.get().line, queue.get().line] == ["payment 1", "payment 2"]
+    assert queue.empty()
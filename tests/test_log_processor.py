@@ -20,6 +20,7 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import os
 import time
 from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
@@ -27,6 +28,10 @@ from threading import Event
 
 import pytest
 
+from logtailor import processors
+from logtailor.records import RecordAssembler
+from logtailor.scheduler import FairQueue
+
 # pylint: disable=protected-access
 
 
@@ -134,3 +139,123 @@ def test_multi_parallel_processing(par_processor, single_log):
         tpex.submit(par_processor.run)
         tpex.submit(stop_threads())
     assert queue.qsize() == 6
+
+
+def test_many_parallel_logfiles(tmp_path):
+    """Each logfile gets its own thread, there is no limit."""
+    logs = []
+    for num in range(300):
+        logs.append(tmp_path / "{}.log".format(num))
+        logs[-1].write_text("line {}\n".format(num))
+    queue = Queue()
+    processor = processors.ParallelProcessor(logs, [], queue, Event(), True, "utf-8", False)
+    processor.filtered = False
+    processor.run()
+    assert queue.qsize() == 300
+
+
+def test_json_filter_processing(ser_processor, single_log):
+    """Lines of logfiles with JSON filter are checked against the filter only."""
+    queue = Queue()
+    single_log.text_to_provide = ['{"level": "ERROR"}', '{"level": "INFO"}', "ERROR"]
+    ser_processor.logfiles = [single_log]
+    ser_processor.triggers = ["ERROR", "INFO"]
+
+    def json_filter(line):
+        return line.startswith("{") and "ERROR" in line
+
+    ser_processor.json_filters = {single_log: json_filter}
+    ser_processor.log_queue = queue
+    ser_processor.run()
+    assert queue.qsize() == 1
+    assert queue.get().line == '{"level": "ERROR"}'
+
+
+def test_excludes_and_expressions(ser_processor):
+    """Excludes and expressions are part of the predicate."""
+    ser_processor.excludes = ["health"]
+    ser_processor.expressions = ["billing AND failed"]
+    ser_processor.triggers = ["ERROR"]
+    assert ser_processor._predicate("ERROR")
+    assert ser_processor._predicate("billing failed")
+    assert not ser_processor._predicate("billing")
+    assert not ser_processor._predicate("ERROR health")
+
+
+def test_record_processing(ser_processor, single_log):
+    """Continuation lines are matched and delivered with their record."""
+    queue = Queue()
+    single_log.text_to_provide = [
+        "10:00 ERROR failed", "  at main()", "10:01 INFO ok", "  at ERROR()", "10:02 INFO"
+    ]
+    ser_processor.logfiles = [single_log]
+    ser_processor.triggers = ["ERROR"]
+    ser_processor.records = {single_log: lambda: RecordAssembler(r"\d\d:\d\d ")}
+    ser_processor.log_queue = queue
+    ser_processor.run()
+    assert queue.get().line == "10:00 ERROR failed\n  at main()"
+    assert queue.get().line == "10:01 INFO ok\n  at ERROR()"
+    assert queue.empty()
+
+
+def test_fair_queue_processing(ser_processor, single_log):
+    """Lines are put into the share of their logfile of a fair queue."""
+    queue = FairQueue()
+    ser_processor.logfiles = [single_log]
+    ser_processor.triggers = ["02"]
+    ser_processor.log_queue = queue
+    ser_processor.run()
+    assert list(queue.queues) == [single_log]
+    assert queue.get().line == "single 02"
+
+
+def test_matches_are_stored_with_offsets(ser_processor, single_log):
+    """Matches are passed to the store with their byte offsets."""
+    stored = []
+
+    class Store:
+        def add(self, logfile, offset, line):
+            stored.append((logfile, offset, line))
+
+    ser_processor.logfiles = [single_log]
+    ser_processor.triggers = ["02", "03"]
+    ser_processor.store = Store()
+    ser_processor.run()
+    assert stored == [(single_log, 10, "single 02"), (single_log, 20, "single 03")]
+
+
+def test_matches_carry_origin(ser_processor, single_log):
+    """Delivered lines know their logfile, offset and trigger."""
+    queue = Queue()
+    ser_processor.logfiles = [single_log]
+    ser_processor.triggers = ["03", "single"]
+    ser_processor.log_queue = queue
+    ser_processor.run()
+    matches = [queue.get() for _ in range(queue.qsize())]
+    assert [match.offset for match in matches] == [0, 10, 20]
+    assert [match.trigger for match in matches] == ["single", "single", "03"]
+    assert all(match.logfile is single_log and match.time for match in matches)
+
+
+def test_named_pipe_processing(ser_processor, tmp_path):
+    """Named pipes are read until the writer closes them."""
+    fifo = tmp_path / "pipe"
+    os.mkfifo(str(fifo))
+    queue = Queue()
+    ser_processor.logfiles = [fifo]
+    ser_processor.triggers = ["ERROR"]
+    ser_processor.log_queue = queue
+
+    def write():
+        time.sleep(0.2)
+        with open(str(fifo), "w") as f_out:
+            f_out.write("ERROR 1\nINFO 2\n")
+            f_out.flush()
+            time.sleep(0.2)
+            f_out.write("ERROR 3")
+
+    with ThreadPoolExecutor(max_workers=1) as tpex:
+        tpex.submit(write)
+        ser_processor.run()
+    assert [queue.get().line, queue.get().line] == ["ERROR 1", "ERROR 3"]
+    assert queue.empty()
@@ -20,9 +20,16 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from queue import Queue
+from threading import Event
 
 from logtailor import logtailor
+from logtailor.matches import Match
+from logtailor.scheduler import FairQueue
 
 
 def test_unknown_config_file():
@@ -59,8 +66,142 @@ def test_validate_valid_logfile():
     assert result == [Path(log_file)]
 
 
+def test_validate_stdin():
+    """'-' reads standard input."""
+    assert logtailor.validate_log(False, "-", {}) == [Path("-")]
+
+
 def test_validate_logkey():
     """Call validate with a log key."""
     log_dict = {"l1": Path("./app1.log"), "l2": Path("./custom/appl.log")}
     result = logtailor.validate_log(False, "l2", log_dict)
     assert result == [Path("./custom/appl.log")]
+
+
+def test_json_filter_config():
+    """Read JSON filters from configuration."""
+    cfg = logtailor.Configuration("scratch/test.ini")
+    assert cfg.json_filters == {"log_2": ["level=ERROR", "service=billing"]}
+    assert cfg.json_parser == "auto"
+    filters = logtailor.create_json_filters(cfg)
+    assert list(filters) == [Path("application_2.log")]
+
+
+def test_record_config():
+    """Read record start patterns from configuration."""
+    cfg = logtailor.Configuration("scratch/test.ini")
+    assert cfg.records == {"log_3": r"\d{4}-\d\d-\d\d"}
+    assert cfg.record_max_lines == 200
+    records = logtailor.create_records(cfg)
+    assembler = records[Path("application_3.log")]()
+    assert assembler.feed(["2021-04-17 a", "b", "2021-04-18 c"])[0] == ["2021-04-17 a\nb"]
+
+
+def test_profile_config():
+    """Read trigger profiles from configuration."""
+    cfg = logtailor.Configuration("scratch/test.ini")
+    assert cfg.profiles["security"]["output"] == "security.txt"
+    payments, security = logtailor.create_profiles(cfg)
+    assert payments.name == "payments"
+    assert payments.output == Path("payments.txt")
+    assert security.triggers == ["login failed", "sudo"]
+    assert security.excludes == ["test"]
+    assert security.predicate("sudo: root")
+    assert not security.predicate("sudo: test")
+
+
+def test_priority_config():
+    """Read priorities of logfiles from configuration."""
+    cfg = logtailor.Configuration("scratch/test.ini")
+    assert cfg.priorities == {"log_1": 5}
+    assert logtailor.create_priorities(cfg) == {Path("application_1.log"): 5}
+
+
+def test_serial_processing_keeps_file_order(tmp_path):
+    """Without tailing the lines are written logfile by logfile."""
+    log_a, log_b = tmp_path / "a.log", tmp_path / "b.log"
+    log_a.write_text("a1 hit\na2\na3 hit\n")
+    log_b.write_text("b1 hit\nb2 hit\n")
+    cfg = logtailor.Configuration("scratch/test.ini")
+    queue = logtailor.create_log_queue(cfg, False)
+    assert not isinstance(queue, FairQueue)
+    processor = logtailor.processor_factory(
+        [log_a, log_b], ["hit"], queue, Event(), False, True, "utf-8"
+    )
+    processor.run()
+    lines = []
+    while not queue.empty():
+        lines.append(queue.get().line)
+    assert lines == ["a1 hit", "a3 hit", "b1 hit", "b2 hit"]
+    assert isinstance(logtailor.create_log_queue(cfg, True), FairQueue)
+
+
+def test_out_with_labels(capsys):
+    """Matches are prefixed with the label of their logfile."""
+    f_out = io.StringIO()
+    labels = {Path("application_1.log"): "log_1"}
+    logtailor.out(f_out, Match("hit ", Path("application_1.log")), labels)
+    logtailor.out(f_out, Match("hit", Path("other/application_2.log")), labels)
+    logtailor.out(f_out, Match("hit", Path("application_1.log")))
+    assert f_out.getvalue() == "[log_1] hit\n\r[application_2.log] hit\n\rhit\n\r"
+    assert capsys.readouterr().out == f_out.getvalue()
+
+
+def test_shutdown_drains_queue(tmp_path):
+    """Pending lines are written before shutdown completes."""
+    queue = Queue()
+    for num in range(3):
+        queue.put("line {}".format(num))
+    cancel, abort = Event(), Event()
+    with open(tmp_path / "trace.txt", "w") as f_out:
+        with ThreadPoolExecutor(max_workers=1) as tpex:
+            future = tpex.submit(logtailor.render_log, queue, f_out, cancel, abort)
+            assert logtailor.shutdown(cancel, abort, [future], queue, 5) == 0
+    assert not abort.is_set()
+    assert (tmp_path / "trace.txt").read_text().count("line") == 3
+
+
+def test_shutdown_reports_lines_in_flight():
+    """Lines not written within the deadline are dropped and counted."""
+    queue = Queue()
+    for num in range(3):
+        queue.put("line {}".format(num))
+    cancel, abort = Event(), Event()
+    with ThreadPoolExecutor(max_workers=1) as tpex:
+        future = tpex.submit(abort.wait)
+        assert logtailor.shutdown(cancel, abort, [future], queue, 0.1) == 3
+    assert cancel.is_set() and abort.is_set()
+
+
+def test_shutdown_writes_lines_delivered_after_cancel(tmp_path):
+    """The renderer keeps writing until the processor delivered its last line."""
+    queue = Queue()
+    cancel, abort, finished = Event(), Event(), Event()
+
+    def produce():
+        cancel.wait()
+        for num in range(50):
+            queue.put("line {}".format(num))
+            time.sleep(0.001)
+
+    with open(tmp_path / "trace.txt", "w") as f_out:
+        with ThreadPoolExecutor(max_workers=2) as tpex:
+            future_render = tpex.submit(
+                logtailor.render_log, queue, f_out, cancel, abort, None, finished
+            )
+            future_processor = tpex.submit(produce)
+            future_processor.add_done_callback(lambda _: finished.set())
+            dropped = logtailor.shutdown(
+                cancel, abort, [future_processor, future_render], queue, 5
+            )
+    assert dropped == 0
+    assert (tmp_path / "trace.txt").read_text().count("line") == 50
+
+
+def test_shutdown_counts_lines_left_in_queue():
+    """Lines left in the queue after the renderer stopped are reported."""
+    queue = Queue()
+    cancel, abort = Event(), Event()
+    with ThreadPoolExecutor(max_workers=1) as tpex:
+        future = tpex.submit(lambda: [queue.put(num) for num in range(4)])
+        assert logtailor.shutdown(cancel, abort, [future], queue, 5) == 4
@@ -0,0 +1,126 @@
+# coding=utf-8
+"""Test line matchers."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import json
+
+import pytest
+
+from logtailor import matchers
+
+# pylint: disable=protected-access
+
+
+def test_json_filter_match():
+    """All fields match."""
+    json_filter = matchers.JsonFilter({"level": "ERROR", "service": "billing"})
+    assert json_filter('{"level": "ERROR", "service": "billing", "msg": "x"}')
+    assert not json_filter('{"level": "ERROR", "service": "shop"}')
+    assert not json_filter('{"level": "ERROR"}')
+
+
+def test_json_filter_nested_and_typed_fields():
+    """Nested fields and non string values."""
+    json_filter = matchers.JsonFilter.from_config(["http.status=500", "retry=true"])
+    assert json_filter('{"http": {"status": 500}, "retry": true}')
+    assert not json_filter('{"http": {"status": 404}, "retry": true}')
+    assert not json_filter('{"http": 500, "retry": true}')
+
+
+def test_json_filter_prefilter_skips_parser():
+    """Lines lacking a filter value are not parsed."""
+    parsed = []
+
+    def parser(line):
+        parsed.append(line)
+        return json.loads(line)
+
+    json_filter = matchers.JsonFilter({"level": "ERROR"}, parser)
+    assert not json_filter('{"level": "INFO"}')
+    assert not json_filter("no json ERROR")
+    assert parsed == ["no json ERROR"]
+
+
+def test_json_filter_escaped_slash():
+    """Values with slashes match lines written with escaped slashes."""
+    json_filter = matchers.JsonFilter({"path": "/api/v1"})
+    assert json_filter.tokens == []
+    assert json_filter('{"path": "\\/api\\/v1"}')
+
+
+def test_json_filter_invalid_entry():
+    """Entries must have the form field=value."""
+    with pytest.raises(ValueError):
+        matchers.JsonFilter.from_config(["level"])
+
+
+def test_load_json_parser():
+    """Standard library is the fallback."""
+    assert matchers.load_json_parser("json") is json.loads
+    assert matchers.load_json_parser("not_a_json_library") is json.loads
+    assert matchers.load_json_parser()('{"a": 1}') == {"a": 1}
+
+
+def test_compile_predicate_triggers_and_excludes():
+    """Triggers are OR-ed, excludes drop lines."""
+    predicate = matchers.compile_predicate(["ERROR", "WARN"], ["health"])
+    assert predicate("ERROR in billing")
+    assert predicate("WARN in billing")
+    assert not predicate("ERROR in health check")
+    assert not predicate("INFO in billing")
+    assert not matchers.compile_predicate([], ["health"])("ERROR")
+
+
+def test_compile_predicate_expressions():
+    """Expressions with AND, OR, NOT and parentheses."""
+    predicate = matchers.compile_predicate(
+        [], expressions=['billing AND ("time out" OR refused) AND NOT debug']
+    )
+    assert predicate("billing: time out")
+    assert predicate("billing: connection refused")
+    assert not predicate("billing: time")
+    assert not predicate("debug billing: time out")
+
+
+def test_compile_predicate_evaluate():
+    """The predicate can be evaluated from flags of found terms."""
+    predicate = matchers.compile_predicate(["a"], ["x"], ["q AND NOT r"])
+    assert predicate.terms == ["x", "a", "q", "r"]
+    assert predicate.evaluate([False, True, False, False])
+    assert predicate.evaluate([False, False, True, False])
+    assert not predicate.evaluate([True, True, False, False])
+    assert not predicate.evaluate([False, False, True, True])
+
+
+def test_expression_optimization():
+    """Nested junctions are flattened, longer terms go first in AND."""
+    node = matchers._optimize(matchers.parse_expression("a AND (bb AND ccc) AND NOT NOT a"))
+    assert node.source() == "('ccc' in line and 'bb' in line and 'a' in line)"
+
+
+@pytest.mark.parametrize(
+    "expression", ["", "a AND", "(a OR b", "a b", "NOT", "a )", "a AND \"foo", "'b"]
+)
+def test_invalid_expression(expression):
+    """Malformed expressions are rejected."""
+    with pytest.raises(ValueError):
+        matchers.parse_expression(expression)
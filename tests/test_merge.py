@@ -0,0 +1,96 @@
+# coding=utf-8
+"""Test merging of logfiles."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Event
+
+from logtailor import merge
+
+
+def test_timestamp_key():
+    """Keys of different formats compare like the timestamps."""
+    parse = merge.TimestampParser()
+    first = parse("2021-04-17 10:15:00.5 - ERROR")
+    second = parse("2021.04.17T10:15:00,123456 - ERROR")
+    third = parse("x 2021-04-17 10:15:01 ERROR")
+    assert first > second
+    assert first < third
+    assert parse("no timestamp") is None
+
+
+def test_merge_history(tmp_path):
+    """Lines of all logfiles are delivered ordered by timestamp."""
+    log_a = tmp_path / "a.log"
+    log_b = tmp_path / "b.log"
+    log_a.write_text("2021-04-17 10:00:01 a1\n2021-04-17 10:00:03 a2\ncontinued a2\n")
+    log_b.write_text("2021-04-17 10:00:02 b1\n2021-04-17 10:00:04 b2\n")
+    queue = Queue()
+    processor = merge.MergingProcessor(
+        [log_a, log_b], [], queue, Event(), True, "utf-8"
+    )
+    processor.filtered = False
+    processor.run()
+    lines = [queue.get().line for _ in range(queue.qsize())]
+    assert [line[-2:] for line in lines] == ["a1", "b1", "a2", "a2", "b2"]
+
+
+def test_merge_reads_in_bounded_batches(tmp_path):
+    """Long lines are truncated and still matched, offsets are kept."""
+    log_a = tmp_path / "a.log"
+    log_b = tmp_path / "b.log"
+    log_a.write_text("2021-04-17 10:00:01 a1\n2021-04-17 10:00:03 " + "x" * 500 + " ERROR\n")
+    log_b.write_text("2021-04-17 10:00:02 ERROR b1\n2021-04-17 10:00:04 b2")
+    queue = Queue()
+    processor = merge.MergingProcessor(
+        [log_a, log_b], ["ERROR"], queue, Event(), True, "utf-8",
+        batch_size=1, max_line_length=100
+    )
+    processor.run()
+    matches = [queue.get() for _ in range(queue.qsize())]
+    assert [match.line[20:22] for match in matches] == ["ER", "xx"]
+    assert [match.offset for match in matches] == [0, 23]
+    assert len(matches[1].line) < 200
+
+
+def test_merge_tail_holds_back_incomplete_line(tmp_path):
+    """While tailing, a half-written last line is not delivered."""
+    log = tmp_path / "a.log"
+    log.write_text("2021-04-17 10:00:01 a1\n2021-04-17 10:00:02 a2")
+    queue = Queue()
+    cancel = Event()
+    processor = merge.MergingProcessor(
+        [log], [], queue, cancel, True, "utf-8", True, reorder_window=0
+    )
+    processor.filtered = False
+    with ThreadPoolExecutor(max_workers=1) as tpex:
+        future = tpex.submit(processor.run)
+        time.sleep(0.3)
+        assert [queue.get().line for _ in range(queue.qsize())] == ["2021-04-17 10:00:01 a1"]
+        with log.open("a") as f_log:
+            f_log.write(" done\n")
+        time.sleep(0.3)
+        cancel.set()
+        future.result(timeout=5)
+    assert queue.get().line == "2021-04-17 10:00:02 a2 done"
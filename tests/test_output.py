@@ -0,0 +1,66 @@
+# coding=utf-8
+"""Test trace file output."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import gzip
+
+import pytest
+
+from logtailor import output
+
+
+def test_plain_append(tmp_path):
+    """Plain output appends if requested."""
+    path = tmp_path / "trace.txt"
+    with output.TraceWriter(path) as writer:
+        writer.write("first\n")
+    with output.TraceWriter(path, append=True) as writer:
+        writer.write("second\n")
+    assert path.read_text() == "first\nsecond\n"
+
+
+def test_gzip_output(tmp_path):
+    """Compressed output gets a suffix."""
+    path = tmp_path / "trace.txt"
+    with output.TraceWriter(path, compression=output.COMPRESSION_GZIP) as writer:
+        writer.write("line\n")
+    with gzip.open(tmp_path / "trace.txt.gz", "rt") as f_in:
+        assert f_in.read() == "line\n"
+
+
+def test_rotation_by_size(tmp_path):
+    """Rotated files are kept up to the number of backups."""
+    path = tmp_path / "trace.txt"
+    with output.TraceWriter(path, max_bytes=10, backups=2) as writer:
+        for num in range(5):
+            writer.write("line {:04d}\n".format(num))
+    rotated = sorted(p.name for p in tmp_path.glob("trace.txt.*"))
+    assert len(rotated) == 2
+    assert path.read_text() == ""
+    contents = sorted((tmp_path / name).read_text() for name in rotated)
+    assert contents == ["line 0003\n", "line 0004\n"]
+
+
+def test_unknown_compression(tmp_path):
+    """Unknown compression is rejected."""
+    with pytest.raises(ValueError):
+        output.TraceWriter(tmp_path / "trace.txt", compression="lzma")
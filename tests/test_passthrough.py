@@ -0,0 +1,95 @@
+# coding=utf-8
+"""Test unfiltered copying of logfiles."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import gzip
+import threading
+import time
+
+from logtailor.output import TraceWriter, copy_range
+from logtailor.passthrough import PassthroughProcessor
+
+
+def test_copy_range(tmp_path):
+    """Byte ranges are copied to the position of the target file."""
+    source = tmp_path / "source.log"
+    source.write_bytes(b"0123456789")
+    target = tmp_path / "target.txt"
+    target.write_bytes(b"ab")
+    with source.open("rb") as f_in, target.open("ab") as f_out:
+        assert copy_range(f_in.fileno(), f_out.fileno(), 2, 3) == 3
+        assert copy_range(f_in.fileno(), f_out.fileno(), 8, 5) == 2
+    assert target.read_bytes() == b"ab23489"
+
+
+def test_history_is_copied_unchanged(tmp_path):
+    """Without tailing, the logfiles are copied one after the other."""
+    log_a, log_b = tmp_path / "a.log", tmp_path / "b.log"
+    log_a.write_bytes(b"a1\n\xff a2\n")
+    log_b.write_bytes(b"b1\nb2")
+    trace = tmp_path / "trace.txt"
+    with TraceWriter(trace) as writer:
+        PassthroughProcessor([log_a, log_b], writer, threading.Event(), True, False).run()
+    assert trace.read_bytes() == b"a1\n\xff a2\nb1\nb2"
+
+
+def test_labels(tmp_path):
+    """Lines are prefixed with the label of their logfile, also if compressed."""
+    log_a, log_b = tmp_path / "a.log", tmp_path / "b.log"
+    log_a.write_bytes(b"a1\na2\n")
+    log_b.write_bytes(b"b1\n")
+    trace = tmp_path / "trace.txt"
+    with TraceWriter(trace, compression="gzip") as writer:
+        processor = PassthroughProcessor(
+            [log_a, log_b], writer, threading.Event(), True, False, labels={log_a: "app"}
+        )
+        processor.run()
+    with TraceWriter(tmp_path / "plain.txt") as writer:
+        processor.writer = writer
+        processor.run()
+    expected = b"[app] a1\n[app] a2\n[b.log] b1\n"
+    assert gzip.decompress((tmp_path / "trace.txt.gz").read_bytes()) == expected
+    assert (tmp_path / "plain.txt").read_bytes() == expected
+
+
+def test_tailing_copies_complete_lines(tmp_path, monkeypatch):
+    """While tailing, an incomplete last line waits until it is complete."""
+    monkeypatch.setattr("logtailor.passthrough.POLL_INTERVAL", 0.05)
+    log = tmp_path / "app.log"
+    log.write_bytes(b"old\n")
+    trace = tmp_path / "trace.txt"
+    cancel = threading.Event()
+    with TraceWriter(trace) as writer:
+        processor = PassthroughProcessor([log], writer, cancel, False, True)
+        thread = threading.Thread(target=processor.run)
+        thread.start()
+        time.sleep(0.2)
+        with log.open("ab") as f_log:
+            f_log.write(b"new 1\nnew")
+            f_log.flush()
+            time.sleep(0.2)
+            assert trace.read_bytes() == b"new 1\n"
+            f_log.write(b" 2\n")
+        time.sleep(0.2)
+        cancel.set()
+        thread.join(timeout=5)
+    assert trace.read_bytes() == b"new 1\nnew 2\n"
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Test trigger profiles."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import io
+
+import pytest
+
+from logtailor import matchers, profiles
+
+LINES = [
+    "ERROR payment declined",
+    "ERROR payment test",
+    "sudo: root",
+    "login failed for test",
+    "INFO payment",
+    'quoted "ERROR" \\ line',
+]
+
+
+@pytest.mark.parametrize(
+    "triggers, excludes, expressions",
+    [
+        (["ERROR"], [], []),
+        (["ERROR", "sudo"], ["test"], []),
+        ([], ["test"], ["payment AND NOT INFO"]),
+        (['"ERROR"', "\\"], [], ["sudo"]),
+        ([], [], []),
+    ],
+)
+def test_expression_matches_like_predicate(triggers, excludes, expressions):
+    """The combined expression matches the same lines as the predicate."""
+    predicate = matchers.compile_predicate(triggers, excludes, expressions)
+    expression = matchers.to_expression(triggers, excludes, expressions)
+    combined = matchers.compile_predicate([], expressions=[expression] if expression else [])
+    assert [combined(line) for line in LINES] == [predicate(line) for line in LINES]
+
+
+def test_union_of_profiles():
+    """The union matches a line if one of the profiles matches it."""
+    security = profiles.Profile("security", ["sudo", "login failed"], ["test"])
+    payments = profiles.Profile("payments", [], expressions=["payment AND ERROR"])
+    empty = profiles.Profile("", [])
+    union = matchers.compile_predicate([], expressions=profiles.union([empty, security, payments]))
+    assert [union(line) for line in LINES] == [True, True, True, False, False, False]
+
+
+def write(f_out, line):
+    """Write line like the renderer does."""
+    f_out.write(line + "\n")
+
+
+def test_router_writes_to_matching_outputs():
+    """Each line is written once to every output whose profile matches it."""
+    security = profiles.Profile("security", ["sudo", "ERROR"])
+    payments = profiles.Profile("payments", ["payment"])
+    regular = profiles.Profile("", ["ERROR"])
+    outputs = {name: io.StringIO() for name in ("regular", "security", "payments")}
+    router = profiles.ProfileRouter(
+        regular.predicate,
+        [(security.predicate, outputs["security"]), (payments.predicate, outputs["payments"])],
+        write,
+    )
+    for line in ["ERROR payment declined", "sudo: root", "json line"]:
+        router(outputs["regular"], line)
+    assert outputs["regular"].getvalue() == "ERROR payment declined\njson line\n"
+    assert outputs["security"].getvalue() == "ERROR payment declined\nsudo: root\n"
+    assert outputs["payments"].getvalue() == "ERROR payment declined\n"
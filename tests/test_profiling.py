@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Test profiling of the processing stages."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import threading
+import time
+from queue import Queue
+from threading import Event
+
+from logtailor import merge, profiling
+
+
+def test_stage_profiler_instrument(ser_processor, single_log):
+    """Stages of a processor are measured per logfile."""
+    profiler = profiling.StageProfiler()
+    ser_processor.logfiles = [single_log]
+    ser_processor.filtered = False
+    ser_processor.log_queue = Queue()
+    profiler.instrument(ser_processor)
+    ser_processor.run()
+    assert profiler.stats["deliver", single_log][0] == 3
+    assert profiler.stats["read", single_log][0] >= 1
+    report = profiler.report()
+    assert "deliver" in report and str(single_log) in report
+
+
+def test_stage_profiler_instrument_merge(tmp_path):
+    """Reading and matching of merged logfiles are measured."""
+    log = tmp_path / "app.log"
+    log.write_text("2021-04-17 10:00:01 ERROR\n2021-04-17 10:00:02 INFO\n")
+    profiler = profiling.StageProfiler()
+    processor = merge.MergingProcessor([log], ["ERROR"], Queue(), Event(), True, "utf-8")
+    profiler.instrument(processor)
+    processor.run()
+    assert profiler.stats["read", log][0] >= 1
+    assert profiler.stats["match", log][0] >= 1
+    assert profiler.stats["deliver", log][0] == 1
+
+
+def test_match_excludes_deliver():
+    """Time spent in delivery is not counted for matching."""
+    profiler = profiling.StageProfiler()
+    deliver = profiler.wrap("deliver", lambda key: time.sleep(0.05))
+    match = profiler.wrap("match", deliver)
+    match("log")
+    line = [ln for ln in profiler.report().splitlines() if ln.startswith("match")][0]
+    assert float(line.split()[2]) < 0.04
+
+
+def test_sampler():
+    """Call stacks of busy threads are sampled."""
+    stop = threading.Event()
+
+    def busy():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy)
+    sampler = profiling.Sampler(0.001)
+    worker.start()
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+    assert any("busy" in stack[-1] for stack in sampler.stacks)
+    assert "busy" in sampler.report()
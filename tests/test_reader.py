@@ -0,0 +1,99 @@
+# coding=utf-8
+"""Test bounded reading."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import io
+
+from logtailor import matchers, reader
+
+
+def test_lines_across_chunks():
+    """Lines spanning several chunks are assembled."""
+    line_reader = reader.LineReader(io.BytesIO(b"first line\nsecond\nthird"), "utf-8", 4)
+    assert line_reader.read_lines() == ["first line", "second"]
+    assert line_reader.eof
+    assert line_reader.flush() == ["third"]
+    assert line_reader.flush() == []
+
+
+def test_batches():
+    """No more than max_lines lines are returned at once."""
+    line_reader = reader.LineReader(io.BytesIO(b"1\n2\n3\n4\n5\n"), "utf-8", 3)
+    assert line_reader.read_lines(2) == ["1", "2"]
+    assert line_reader.read_lines(2) == ["3", "4"]
+    assert line_reader.read_lines(2) == ["5"]
+    assert line_reader.read_lines(2) == []
+
+
+def test_incomplete_line_waits_for_rest():
+    """An incomplete line is returned when it is complete."""
+    f_in = io.BytesIO()
+    line_reader = reader.LineReader(f_in, "utf-8", 8)
+    f_in.write(b"partial")
+    f_in.seek(0)
+    assert line_reader.read_lines() == []
+    f_in.write(b" line\n")
+    f_in.seek(7)
+    assert line_reader.read_lines() == ["partial line"]
+    assert len(line_reader.chunk) == 8
+
+
+def test_skip_to_end():
+    """Existing data is skipped."""
+    line_reader = reader.LineReader(io.BytesIO(b"old\n"), "latin1")
+    line_reader.skip_to_end()
+    assert line_reader.read_lines() == []
+
+
+def test_long_line_is_truncated_and_matched():
+    """Long lines are truncated; terms beyond the kept part still match."""
+    predicate = matchers.compile_predicate(["needle"], ["hay"])
+    data = b"x" * 50 + b"need" + b"le" + b"y" * 50 + b"\nshort\n"
+    line_reader = reader.LineReader(io.BytesIO(data), "utf-8", 8, max_line_length=10)
+    long_line, short = line_reader.read_lines(predicate=predicate)
+    assert isinstance(long_line, reader.LongLine)
+    assert long_line == "x" * 10 + reader.TRUNCATED.format(96)
+    assert long_line.matched
+    assert short == "short"
+    assert len(line_reader.pending) < 20
+
+
+def test_long_line_excluded_and_flushed():
+    """Excludes apply to long lines, an unfinished long line is flushed."""
+    predicate = matchers.compile_predicate(["needle"], ["hay"])
+    data = b"needle " + b"x" * 100 + b" hay"
+    line_reader = reader.LineReader(io.BytesIO(data), "utf-8", 16, max_line_length=10)
+    assert line_reader.read_lines(predicate=predicate) == []
+    long_line, = line_reader.flush()
+    assert long_line.startswith("needle xxx")
+    assert not long_line.matched
+
+
+def test_offsets():
+    """Byte offsets of the lines are provided, also for long lines."""
+    data = b"ab\n" + b"x" * 50 + b"\ncd\nend"
+    line_reader = reader.LineReader(io.BytesIO(data), "utf-8", 8, max_line_length=20)
+    assert len(line_reader.read_lines(2)) == 2
+    assert line_reader.offsets == [0, 3]
+    line_reader.read_lines()
+    line_reader.flush()
+    assert line_reader.offsets == [54, 57]
@@ -0,0 +1,53 @@
+# coding=utf-8
+"""Test assembly of multi-line records."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import time
+
+from logtailor import records
+
+
+def test_continuation_lines_are_grouped():
+    """Lines not matching the start pattern belong to the previous record."""
+    assembler = records.RecordAssembler(r"\d{4}-")
+    assert assembler.feed(["2021-04-17 ERROR", "Traceback:", "  File x"], [0, 17, 28]) == ([], [])
+    assert assembler.feed(["2021-04-18 INFO"], [37]) == (
+        ["2021-04-17 ERROR\nTraceback:\n  File x"], [0]
+    )
+    assert assembler.flush() == (["2021-04-18 INFO"], [37])
+    assert assembler.flush() == ([], [])
+
+
+def test_max_lines():
+    """A full record is completed, further lines start a new one."""
+    assembler = records.RecordAssembler("start", max_lines=2)
+    assert assembler.feed(["start", "1", "2", "3"])[0] == ["start\n1"]
+    assert assembler.flush()[0] == ["2\n3"]
+
+
+def test_timeout():
+    """While tailing the last record is completed after the timeout."""
+    assembler = records.RecordAssembler("start", timeout=0.05)
+    assembler.feed(["start", "more"])
+    assert assembler.flush(force=False) == ([], [])
+    time.sleep(0.1)
+    assert assembler.flush(force=False)[0] == ["start\nmore"]
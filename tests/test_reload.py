@@ -0,0 +1,105 @@
+# coding=utf-8
+"""Test reload of configuration."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Event
+
+import pytest
+
+from logtailor import processors, reload
+
+# pylint: disable=protected-access
+
+
+def wait_for(condition, timeout=5):
+    """Wait until condition is met."""
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_watcher_detects_change(tmp_path):
+    """Changes of the file and requests trigger a reload."""
+    path = tmp_path / "test.ini"
+    path.write_text("[global]\n")
+    calls = []
+    watcher = reload.ConfigWatcher(path, lambda: calls.append(1), Event())
+    assert not watcher.check()
+    path.write_text("[global]\ntriggers =\n    x\n")
+    os.utime(path, ns=(0, 1))
+    assert watcher.check()
+    assert not watcher.check()
+    watcher.request()
+    assert watcher.check()
+    assert len(calls) == 2
+
+
+def test_update_triggers(ser_processor):
+    """The predicate is replaced."""
+    ser_processor.update_triggers(["new"], ["skip"])
+    assert ser_processor.triggers == ["new"]
+    assert ser_processor._predicate("new line")
+    assert not ser_processor._predicate("new line to skip")
+
+
+def test_update_triggers_swaps_criteria(ser_processor, tmp_path):
+    """All criteria are replaced at once, the old ones stay unchanged."""
+    logfile = tmp_path / "app.log"
+    old = ser_processor.criteria
+    ser_processor.update_triggers(["new"], json_filters={logfile: lambda line: False})
+    new = ser_processor.criteria
+    assert new is not old
+    assert logfile not in old.json_filters and old.triggers == ()
+    assert new.triggers == ("new",) and not new.line_predicate(logfile)("new")
+    with pytest.raises(TypeError):
+        new.json_filters[logfile] = None
+
+
+def test_attach_and_detach_logfiles(tmp_path):
+    """Attached logfiles are tailed from their end, others keep going."""
+    log_a = tmp_path / "a.log"
+    log_b = tmp_path / "b.log"
+    log_a.write_text("old a\n")
+    log_b.write_text("old b\n")
+    queue = Queue()
+    cancel = Event()
+    processor = processors.ParallelProcessor(
+        [log_a], ["a", "b"], queue, cancel, True, "utf-8", True
+    )
+    with ThreadPoolExecutor(max_workers=1) as tpex:
+        future = tpex.submit(processor.run)
+        assert wait_for(lambda: queue.qsize() == 1)
+        processor.update_logfiles([log_a, log_b])
+        time.sleep(0.2)
+        with log_b.open("a") as f_out:
+            f_out.write("new b\n")
+        assert wait_for(lambda: queue.qsize() == 2)
+        processor.update_logfiles([log_b])
+        assert wait_for(lambda: processor.futures[log_a].done())
+        cancel.set()
+        future.result(timeout=5)
+    assert [queue.get().line for _ in range(queue.qsize())] == ["old a", "new b"]
@@ -0,0 +1,83 @@
+# coding=utf-8
+"""Test fair scheduling of matches."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import queue
+import threading
+
+import pytest
+
+from logtailor.scheduler import FairQueue
+
+
+def drain(fair_queue):
+    """Take all lines from the queue."""
+    lines = []
+    while not fair_queue.empty():
+        lines.append(fair_queue.get())
+        fair_queue.task_done()
+    return lines
+
+
+def test_round_robin():
+    """A quiet source does not wait behind all lines of a flooding one."""
+    fair_queue = FairQueue()
+    for num in range(5):
+        fair_queue.put("noise {}".format(num), source="noisy")
+    fair_queue.put("alert", source="quiet")
+    assert drain(fair_queue) == ["noise 0", "alert", "noise 1", "noise 2", "noise 3", "noise 4"]
+
+
+def test_weights():
+    """A source delivers up to its weight lines per turn."""
+    fair_queue = FairQueue(weights={"a": 2})
+    for num in range(4):
+        fair_queue.put("a{}".format(num), source="a")
+        fair_queue.put("b{}".format(num), source="b")
+    assert drain(fair_queue) == ["a0", "a1", "b0", "a2", "a3", "b1", "b2", "b3"]
+
+
+def test_full_source_blocks_only_itself():
+    """A full sub-queue does not keep other sources from putting lines."""
+    fair_queue = FairQueue(2)
+    fair_queue.put(1, source="noisy")
+    fair_queue.put(2, source="noisy")
+    with pytest.raises(queue.Full):
+        fair_queue.put(3, source="noisy", block=False)
+    with pytest.raises(queue.Full):
+        fair_queue.put(3, source="noisy", timeout=0.01)
+    fair_queue.put("alert", source="quiet", block=False)
+    assert fair_queue.qsize() == 3
+
+
+def test_blocked_source_resumes():
+    """A blocked producer continues when its sub-queue has space again."""
+    fair_queue = FairQueue(1)
+    fair_queue.put(1, source="a")
+    producer = threading.Thread(target=fair_queue.put, args=(2,), kwargs={"source": "a"})
+    producer.start()
+    assert fair_queue.get(timeout=1) == 1
+    producer.join(timeout=1)
+    assert not producer.is_alive()
+    assert fair_queue.get(timeout=1) == 2
+    with pytest.raises(queue.Empty):
+        fair_queue.get(timeout=0.01)
@@ -0,0 +1,137 @@
+# coding=utf-8
+"""Test tail server."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Event
+
+import pytest
+
+from logtailor import server
+
+
+def test_publish_base_and_extra_matches():
+    """Clients get base matches and matches of their own triggers."""
+    tail_server = server.TailServer("unused.sock", Queue(), Event())
+    plain = tail_server.subscribe({})
+    extra = tail_server.subscribe({"triggers": ["billing"], "excludes": ["debug"]})
+    assert len(tail_server.extras) == 1
+    tail_server.publish(True, "ERROR")
+    tail_server.publish(False, "billing failed")
+    tail_server.publish(False, "billing debug")
+    assert plain.take(0) == ["ERROR"]
+    assert extra.take(0) == ["ERROR", "billing failed"]
+    tail_server.unsubscribe(extra)
+    assert not tail_server.extras
+
+
+def test_slow_subscriber_drops_lines():
+    """Full client buffers drop lines instead of blocking."""
+    subscriber = server.Subscriber(buffer_size=2)
+    for num in range(5):
+        subscriber.offer(str(num))
+    assert subscriber.take(0) == ["0", "1", "[logtailor] 3 lines dropped"]
+    assert subscriber.take(0) == []
+
+
+def test_serve_and_subscribe(tmp_path):
+    """A client receives lines published by the server."""
+    path = tmp_path / "lt.sock"
+    queue = Queue()
+    cancel = Event()
+    tail_server = server.TailServer(path, queue, cancel)
+    with ThreadPoolExecutor(max_workers=2) as tpex:
+        future = tpex.submit(tail_server.run)
+        while not path.exists():
+            time.sleep(0.01)
+        lines = server.subscribe(path, triggers=["extra"])
+        received = tpex.submit(lambda: [next(lines), next(lines)])
+        while not tail_server.subscribers:
+            time.sleep(0.01)
+        queue.put((True, "base line"))
+        queue.put((False, "not for anybody"))
+        queue.put((False, "extra line"))
+        assert received.result(timeout=5) == ["base line", "extra line"]
+        cancel.set()
+        future.result(timeout=5)
+        lines.close()
+    assert not path.exists()
+
+
+def test_serve_refuses_regular_file(tmp_path):
+    """An existing file which is not a socket is not replaced."""
+    path = tmp_path / "trace.txt"
+    path.write_text("keep")
+    with pytest.raises(ValueError):
+        server.TailServer(path, Queue(), Event())
+    assert path.read_text() == "keep"
+
+
+def test_only_base_matches_are_stored(tmp_path):
+    """Lines matched only by the triggers of a client are not stored."""
+    log = tmp_path / "app.log"
+    log.write_text("ERROR base\nbilling only\nother\n")
+    stored = []
+
+    class Store:
+        def add(self, logfile, offset, line):
+            stored.append((logfile, offset, line))
+
+    queue = Queue()
+    tail_server = server.TailServer(tmp_path / "lt.sock", queue, Event())
+    tail_server.subscribe({"triggers": ["billing"]})
+    processor = server.PublishingProcessor(
+        tail_server, [log], ["ERROR"], queue, Event(), True, "utf-8", False,
+        store=Store()
+    )
+    processor.run()
+    assert stored == [(log, 0, "ERROR base")]
+    published = []
+    while not queue.empty():
+        published.append(queue.get())
+    assert published == [(True, "ERROR base"), (False, "billing only")]
+
+
+def test_serve_refuses_running_server(tmp_path):
+    """The socket of a running server is not taken over, a stale one is."""
+    path = tmp_path / "lt.sock"
+    cancel = Event()
+    tail_server = server.TailServer(path, Queue(), cancel)
+    with ThreadPoolExecutor(max_workers=1) as tpex:
+        future = tpex.submit(tail_server.run)
+        while not path.exists():
+            time.sleep(0.01)
+        with pytest.raises(ValueError, match="already serving"):
+            server.TailServer(path, Queue(), Event())
+        assert not tail_server.subscribers
+        cancel.set()
+        future.result(timeout=5)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+    stopped = Event()
+    stopped.set()
+    server.TailServer(path, Queue(), stopped).run()
+    assert not path.exists()
@@ -0,0 +1,59 @@
+# coding=utf-8
+"""Test the SQLite match store."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import sqlite3
+from pathlib import Path
+from threading import Thread
+
+from logtailor import store
+
+
+def test_store_matches(tmp_path):
+    """Matches are stored with time, source, offset and trigger."""
+    path = tmp_path / "matches.db"
+    match_store = store.MatchStore(
+        path, {Path("app.log"): "app"}, ["ERROR"], expressions=["x AND y"],
+        flush_interval=0.05
+    )
+    writer = Thread(target=match_store.run)
+    writer.start()
+    match_store.add(Path("app.log"), 10, "2021-04-17 10:15:00.123 ERROR boom")
+    match_store.add(Path("other.log"), None, "x y")
+    match_store.close()
+    writer.join()
+    rows = sqlite3.connect(str(path)).execute("SELECT * FROM matches").fetchall()
+    assert rows[0] == (
+        "2021-04-17 10:15:00.123000", "app", 10, "ERROR", "2021-04-17 10:15:00.123 ERROR boom"
+    )
+    assert rows[1][1:] == ("other.log", None, "x AND y", "x y")
+
+
+def test_query_uses_index(tmp_path):
+    """Queries by trigger and time are answered from an index."""
+    path = tmp_path / "matches.db"
+    store.MatchStore(path)
+    plan = sqlite3.connect(str(path)).execute(
+        "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM matches "
+        "WHERE trigger = 'ERROR' AND time > '2021-04-17'"
+    ).fetchall()
+    assert "matches_trigger" in str(plan)
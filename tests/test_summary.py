@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Test summary mode."""
+# Copyright (c) 2018 Stefan Braun
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from pathlib import Path
+from queue import Queue
+
+from logtailor import summary
+
+
+def test_count_per_trigger():
+    """Lines are counted per logfile and trigger."""
+    counter = summary.TriggerCounter(["ERROR", "WARN"], ["health"], ["db AND slow"], 60)
+    log = Path("app.log")
+    counter.count(log, "ERROR db slow", timestamp=10)
+    counter.count(log, "WARN", timestamp=20)
+    counter.count(log, "ERROR health", timestamp=30)
+    counter.count(Path("other.log"), "ERROR", timestamp=70)
+    buckets = counter.collect(final=True)
+    assert [bucket for bucket, _ in buckets] == [0, 60]
+    counts = buckets[0][1]
+    assert counts[("app.log", summary.TOTAL)] == 3
+    assert counts[("app.log", "ERROR")] == 1
+    assert counts[("app.log", "WARN")] == 1
+    assert counts[("app.log", "db AND slow")] == 1
+    assert buckets[1][1] == {("other.log", summary.TOTAL): 1, ("other.log", "ERROR"): 1}
+    assert not counter.collect(final=True)
+
+
+def test_collect_completed_buckets():
+    """Only completed buckets are collected."""
+    counter = summary.TriggerCounter(["ERROR"], interval=60)
+    counter.count(Path("app.log"), "ERROR", timestamp=10)
+    counter.count(Path("app.log"), "ERROR", timestamp=70)
+    assert [bucket for bucket, _ in counter.collect(now=90)] == [0]
+    assert [bucket for bucket, _ in counter.collect(now=90)] == []
+    assert [bucket for bucket, _ in counter.collect(now=120)] == [60]
+
+
+def test_format_summary():
+    """One line per logfile, total first."""
+    lines = summary.format_summary(
+        0, {("b.log", "total"): 2, ("b.log", "ERROR"): 2, ("a.log", "total"): 1}
+    )
+    assert lines[0].endswith(" a.log total=1")
+    assert lines[1].endswith(" b.log total=2 ERROR=2")
+
+
+def test_processor_counts_instead_of_queueing(ser_processor, single_log):
+    """In summary mode no lines are queued."""
+    queue = Queue()
+    counter = summary.TriggerCounter(["single"])
+    ser_processor.logfiles = [single_log]
+    ser_processor.log_queue = queue
+    ser_processor.counter = counter
+    ser_processor.triggers = ["single"]
+    ser_processor.run()
+    assert queue.empty()
+    (_, counts), = counter.collect(final=True)
+    assert counts[(str(single_log), "single")] == 3